@@ -0,0 +1,392 @@
+# This file builds and searches an approximate nearest neighbour (ANN) index over
+# an exported persona, so queries no longer compare against every vector.
+# The index is an inverted file (IVF): spherical k-means splits the normalized
+# vectors into nlist lists around centroids, and a query only scores the vectors
+# in the nprobe lists whose centroids are closest to it.
+# It is saved next to the export in a portable, memory-mappable layout:
+# - centroids.npy:    (nlist, dimension) float32 unit-length centroids.
+# - list_offsets.npy: (nlist + 1,) int64; list i holds list_rows[offsets[i]:offsets[i + 1]].
+# - list_rows.npy:    (count,) int32 export row numbers, grouped by list.
+# - index.json:       kind, metric, count, dimension, nlist and the default nprobe.
+# Example Usage:
+# python3 ann_index.py build ./vector-store/bible_chroma_db/embeddings
+# python3 ann_index.py report ./vector-store/bible_chroma_db/embeddings --k 5 --target_recall 0.95 --save
+
+import os
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+
+ANN_INDEX_FORMAT_VERSION = 1
+ANN_INDEX_META_FILE = "index.json"
+CENTROIDS_FILE = "centroids.npy"
+LIST_OFFSETS_FILE = "list_offsets.npy"
+LIST_ROWS_FILE = "list_rows.npy"
+
+DEFAULT_NPROBE = 8
+DEFAULT_ITERATIONS = 20
+# k-means is trained on at most this many points per list, then every vector is assigned.
+TRAINING_POINTS_PER_LIST = 256
+REPORT_NPROBES = (1, 2, 4, 8, 16, 32, 64)
+
+
+def default_nlist(count):
+    """Returns the default number of lists for count vectors (about 4 * sqrt(count))."""
+    return int(max(1, min(count, round(4 * np.sqrt(count)))))
+
+
+def index_directory_for(export_path):
+    """
+    Returns where the ANN index of an export lives: an "ivf_index" directory inside a
+    binary export directory, or "<name>_ivf" next to a JSON export file.
+    """
+    if os.path.isdir(export_path):
+        return os.path.join(export_path, "ivf_index")
+    return os.path.splitext(export_path)[0] + "_ivf"
+
+
+def unit_rows(matrix, chunk_size=65536):
+    """Returns a float32 copy of matrix with unit-length rows, converted in chunks."""
+    result = np.empty(matrix.shape, dtype=np.float32)
+    for start in range(0, len(matrix), chunk_size):
+        chunk = np.asarray(matrix[start:start + chunk_size], dtype=np.float32)
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        result[start:start + chunk_size] = chunk / norms
+    return result
+
+
+def sample_queries(vectors, num_queries=200, seed=0):
+    """
+    Returns num_queries unit-length test queries: stored vectors with a little Gaussian
+    noise added, so they land near (but not exactly on) stored vectors like real questions do.
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)]
+    return unit_rows(sample + rng.normal(scale=0.5 / np.sqrt(vectors.shape[1]), size=sample.shape).astype(np.float32))
+
+
+def _assign(vectors, centroids, chunk_size=8192):
+    """Returns the index of the most similar centroid for every vector."""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        labels[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors, nlist, iterations=DEFAULT_ITERATIONS, seed=0):
+    """
+    Clusters unit-length vectors by cosine similarity.
+
+    Parameters:
+    vectors (array): (count, dimension) float32 unit-length vectors.
+    nlist (int): Number of clusters.
+    iterations (int): Lloyd iterations.
+    seed (int): Random seed for the initial centroids.
+
+    Returns:
+    array: (nlist, dimension) float32 unit-length centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=nlist)
+        # Re-seed empty lists with random vectors so every list stays in use.
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), size=len(empty), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = sums / norms
+    return centroids.astype(np.float32)
+
+
+def build_ivf_index(matrix, nlist=None, iterations=DEFAULT_ITERATIONS, seed=0):
+    """
+    Builds an IVF index over an embedding matrix.
+
+    Parameters:
+    matrix (array): (count, dimension) embeddings, any float dtype (a memory map works).
+    nlist (int): Number of lists. Defaults to default_nlist(count).
+    iterations (int): k-means iterations.
+    seed (int): Random seed.
+
+    Returns:
+    IVFIndex: The index (not yet saved).
+    """
+    count = len(matrix)
+    if count == 0:
+        raise ValueError("❌ Cannot build an ANN index over an empty export.")
+    nlist = min(nlist or default_nlist(count), count)
+    vectors = unit_rows(matrix)
+
+    rng = np.random.default_rng(seed)
+    training_size = min(count, nlist * TRAINING_POINTS_PER_LIST)
+    training = vectors if training_size == count else vectors[np.sort(rng.choice(count, size=training_size, replace=False))]
+    centroids = spherical_kmeans(training, nlist, iterations, seed)
+
+    labels = _assign(vectors, centroids)
+    list_rows = np.argsort(labels, kind="stable").astype(np.int32)
+    list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=nlist), out=list_offsets[1:])
+
+    meta = {
+        "format_version": ANN_INDEX_FORMAT_VERSION,
+        "kind": "ivf",
+        "metric": "cosine",
+        "count": int(count),
+        "dimension": int(matrix.shape[1]),
+        "nlist": int(nlist),
+        "nprobe": min(DEFAULT_NPROBE, nlist)
+    }
+    return IVFIndex(centroids, list_offsets, list_rows, meta)
+
+
+class IVFIndex:
+    """
+    An inverted file index over an exported persona.
+
+    Parameters:
+    centroids (array): (nlist, dimension) unit-length centroids.
+    list_offsets (array): (nlist + 1,) start offset of each list in list_rows.
+    list_rows (array): Export row numbers grouped by list.
+    meta (dict): The contents of index.json.
+    """
+
+    def __init__(self, centroids, list_offsets, list_rows, meta):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.meta = meta
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @property
+    def nprobe(self):
+        """The default number of lists probed per query (chosen with the recall report)."""
+        return self.meta.get("nprobe", DEFAULT_NPROBE)
+
+    def save(self, directory):
+        """Writes the index files to directory and returns its path."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, CENTROIDS_FILE), np.ascontiguousarray(self.centroids, dtype=np.float32))
+        np.save(os.path.join(directory, LIST_OFFSETS_FILE), np.ascontiguousarray(self.list_offsets, dtype=np.int64))
+        np.save(os.path.join(directory, LIST_ROWS_FILE), np.ascontiguousarray(self.list_rows, dtype=np.int32))
+        self.save_meta(directory)
+        return directory
+
+    def save_meta(self, directory):
+        with open(os.path.join(directory, ANN_INDEX_META_FILE), "w") as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Loads an index saved with save(), memory-mapping the arrays by default."""
+        with open(os.path.join(directory, ANN_INDEX_META_FILE), "r") as f:
+            meta = json.load(f)
+        if meta.get("kind") != "ivf":
+            raise ValueError(f"❌ Unsupported ANN index kind '{meta.get('kind')}' in {directory}.")
+        mode = "r" if mmap else None
+        return cls(
+            np.load(os.path.join(directory, CENTROIDS_FILE), mmap_mode=mode),
+            np.load(os.path.join(directory, LIST_OFFSETS_FILE), mmap_mode=mode),
+            np.load(os.path.join(directory, LIST_ROWS_FILE), mmap_mode=mode),
+            meta
+        )
+
+    def probe_lists(self, queries, nprobe):
+        """Returns, for each unit-length query, the nprobe lists with the closest centroids."""
+        nprobe = min(nprobe, self.nlist)
+        scores = queries @ np.asarray(self.centroids).T
+        if nprobe == self.nlist:
+            return np.broadcast_to(np.arange(self.nlist), scores.shape)
+        return np.argpartition(-scores, nprobe - 1, axis=1)[:, :nprobe]
+
+    def candidates(self, lists):
+        """Returns the export rows held by the given lists."""
+        return np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists])
+
+    def search(self, matrix, queries, k=5, nprobe=None, allowed=None):
+        """
+        Approximate top-k cosine search.
+
+        Parameters:
+        matrix (array): (count, dimension) unit-length embeddings the index was built over, or a
+            quantized matrix with a score_rows(rows, query) method (see quantization.py).
+        queries (array): (num_queries, dimension) unit-length query vectors.
+        k (int): Number of results per query.
+        nprobe (int): Lists probed per query. Defaults to the index's nprobe.
+        allowed (array): Optional boolean mask of rows that may be returned (metadata filters).
+
+        Returns:
+        list: For each query, a (rows, scores) tuple of arrays, best first.
+        """
+        results = []
+        for query, lists in zip(queries, self.probe_lists(queries, nprobe or self.nprobe)):
+            rows = self.candidates(lists)
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            scores = matrix[rows] @ query if isinstance(matrix, np.ndarray) else matrix.score_rows(rows, query)
+            best = np.argsort(-scores, kind="stable")[:k] if len(rows) <= k else \
+                np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            results.append((rows[best].astype(np.int64), scores[best]))
+        return results
+
+
+def load_ivf_index(export_path, mmap=True):
+    """Returns the IVFIndex saved for an export, or None if it has none."""
+    directory = index_directory_for(export_path)
+    if not os.path.exists(os.path.join(directory, ANN_INDEX_META_FILE)):
+        return None
+    return IVFIndex.load(directory, mmap)
+
+
+def build_export_index(export_path, matrix=None, nlist=None, iterations=DEFAULT_ITERATIONS, seed=0):
+    """
+    Builds the ANN index of an export and saves it next to the export.
+
+    Parameters:
+    export_path (str): A binary export directory or an embeddings.json file.
+    matrix (array): The export's embeddings, if already loaded. Loaded from export_path otherwise.
+    nlist (int): Number of lists. Defaults to default_nlist(count).
+
+    Returns:
+    str: The index directory.
+    """
+    if matrix is None:
+        matrix = load_export_matrix(export_path)
+    started = time.perf_counter()
+    index = build_ivf_index(matrix, nlist, iterations, seed)
+    directory = index.save(index_directory_for(export_path))
+    print(f"🧭 Built IVF index ({index.nlist} lists over {len(matrix)} vectors) in "
+          f"{time.perf_counter() - started:.1f}s at {directory}")
+    return directory
+
+
+def remove_export_index(export_path):
+    """Deletes the ANN index of an export, so a re-export never leaves a stale index behind."""
+    directory = index_directory_for(export_path)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+        print(f"🗑️ Removed the ANN index at {directory} (the export was rewritten without one).")
+
+
+def load_export_matrix(export_path):
+    """Returns the embedding matrix of a binary export directory or embeddings.json file."""
+    if os.path.isdir(export_path):
+        from export_vectorstore_json import load_binary_export
+        return load_binary_export(export_path, mmap=True)[0]
+    with open(export_path, "r") as f:
+        return np.asarray(json.load(f)["embeddings"], dtype=np.float32)
+
+
+def recall_report(matrix, index, k=5, nprobes=REPORT_NPROBES, num_queries=200, seed=0, queries=None):
+    """
+    Measures recall@k and latency of the IVF index against exact search.
+    Queries default to num_queries sampled with sample_queries().
+
+    Parameters:
+    matrix (array): The export's embeddings.
+    index (IVFIndex): The index built over matrix.
+    k (int): Number of results per query.
+    nprobes (tuple): nprobe values to measure.
+    num_queries (int): Number of sampled queries.
+    seed (int): Random seed for the sampled queries.
+    queries (array): Query embeddings to use instead of sampled ones.
+
+    Returns:
+    list: One dict per setting ("exact" first) with recall_at_k, mean_ms, p95_ms and speedup.
+    """
+    vectors = unit_rows(matrix)
+    queries = sample_queries(vectors, num_queries, seed) if queries is None else unit_rows(np.atleast_2d(queries))
+
+    exact_sets = []
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        scores = vectors @ query
+        best = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        timings.append(time.perf_counter() - started)
+        exact_sets.append(set(best.tolist()))
+    exact_ms = np.asarray(timings) * 1000
+    report = [{"setting": "exact", "nprobe": None, "recall_at_k": 1.0,
+               "mean_ms": float(exact_ms.mean()), "p95_ms": float(np.percentile(exact_ms, 95)), "speedup": 1.0}]
+
+    for nprobe in sorted({min(n, index.nlist) for n in nprobes}):
+        hits = 0
+        timings = []
+        for query, exact in zip(queries, exact_sets):
+            started = time.perf_counter()
+            rows, _ = index.search(vectors, query[None, :], k, nprobe)[0]
+            timings.append(time.perf_counter() - started)
+            hits += len(exact.intersection(rows.tolist()))
+        ivf_ms = np.asarray(timings) * 1000
+        report.append({
+            "setting": f"ivf nprobe={nprobe}",
+            "nprobe": nprobe,
+            "recall_at_k": hits / (len(queries) * min(k, len(vectors))),
+            "mean_ms": float(ivf_ms.mean()),
+            "p95_ms": float(np.percentile(ivf_ms, 95)),
+            "speedup": float(exact_ms.mean() / max(ivf_ms.mean(), 1e-9))
+        })
+    return report
+
+
+def choose_nprobe(report, target_recall):
+    """Returns the smallest measured nprobe whose recall@k reaches target_recall, or None."""
+    for row in report:
+        if row["nprobe"] is not None and row["recall_at_k"] >= target_recall:
+            return row["nprobe"]
+    return None
+
+
+def print_report(report, k):
+    print(f"{'setting':<18} {f'recall@{k}':>10} {'mean ms':>10} {'p95 ms':>10} {'speedup':>9}")
+    for row in report:
+        print(f"{row['setting']:<18} {row['recall_at_k']:>10.3f} {row['mean_ms']:>10.3f} "
+              f"{row['p95_ms']:>10.3f} {row['speedup']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["build", "report"], help="build an index, or report recall vs latency.")
+    parser.add_argument("export_path", type=str, help="A binary export directory or an embeddings.json file.")
+    parser.add_argument("--nlist", type=int, default=None, help="Number of IVF lists (default: about 4 * sqrt(count)).")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="k-means iterations.")
+    parser.add_argument("--k", type=int, default=5, help="Number of results per query for the report.")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=list(REPORT_NPROBES), help="nprobe values to report.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled queries for the report.")
+    parser.add_argument("--target_recall", type=float, default=0.95, help="Recall@k the chosen nprobe must reach.")
+    parser.add_argument("--save", action="store_true", help="Store the chosen nprobe as the index default.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    matrix = load_export_matrix(args.export_path)
+    if args.command == "build":
+        build_export_index(args.export_path, matrix, args.nlist, args.iterations, args.seed)
+    else:
+        index = load_ivf_index(args.export_path)
+        if index is None:
+            print(f"No ANN index found for {args.export_path}. Building one first...")
+            build_export_index(args.export_path, matrix, args.nlist, args.iterations, args.seed)
+            index = load_ivf_index(args.export_path)
+        report = recall_report(matrix, index, args.k, args.nprobe, args.queries, args.seed)
+        print_report(report, args.k)
+        nprobe = choose_nprobe(report, args.target_recall)
+        if nprobe is None:
+            print(f"⚠️ No measured nprobe reaches recall@{args.k} >= {args.target_recall}.")
+        else:
+            print(f"✅ nprobe={nprobe} reaches recall@{args.k} >= {args.target_recall}.")
+            if args.save:
+                index.meta["nprobe"] = nprobe
+                index.save_meta(index_directory_for(args.export_path))
+                print(f"💾 Saved nprobe={nprobe} as the default for {args.export_path}.")
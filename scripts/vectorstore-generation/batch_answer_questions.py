@@ -0,0 +1,181 @@
+# This file answers many questions in one run, e.g. for nightly persona regression runs.
+# It reads a JSON Lines file of {"question", "persona", "character"} records and:
+# 1. Embeds every question of a persona in one batched embedding call.
+# 2. Retrieves context for all of them as one vectorized batch search.
+# 3. Sends the LLM calls concurrently with asyncio, at most --concurrency at a time.
+# Answers are written as JSON Lines in completion order, so they stream out as they finish.
+# "vectorstore_path" and "character" default to the persona's configuration (see persona_registry.py).
+# Records are tracked by their line number, so repeated "id"s do not collide, and malformed
+# records (invalid JSON, no "question" or "persona") are answered with an error line.
+# Example Usage:
+# python3 batch_answer_questions.py questions.jsonl answers.jsonl --concurrency 16
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from query_vectorstore import query_vectorstore_batch, BACKENDS
+from generate_llm_response import get_llm
+from persona_registry import get_registry, PERSONA_DIRECTORY
+import store_registry
+import tracing
+
+REQUIRED_KEYS = ("question", "persona")
+
+def read_questions(input_path):
+    """
+    Reads question records from a JSON Lines file.
+
+    Returns:
+    list: Record dicts with their "line" number and an "id" (the line number unless the record has one).
+        Malformed records get an "error" instead of failing the batch.
+    """
+    records = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                record = {"error": f"invalid JSON: {e}"}
+            if not isinstance(record, dict):
+                record = {"error": "the record is not a JSON object"}
+            record.setdefault("id", line_number)
+            record["line"] = line_number
+            missing = [key for key in REQUIRED_KEYS if not record.get(key)]
+            if missing and "error" not in record:
+                record["error"] = f"missing {', '.join(missing)}"
+            records.append(record)
+    return records
+
+
+def retrieve_contexts(records, backend="chroma", k=5):
+    """
+    Retrieves context for every record, one batched embedding call and one batch search
+    per (vectorstore_path, persona, character) group.
+
+    Returns:
+    dict: record line -> context string, or the Exception raised for that record's group.
+    """
+    groups = {}
+    for record in records:
+        if "error" in record:
+            continue
+        groups.setdefault((record.get("vectorstore_path"), record["persona"], record["character"]), []).append(record)
+
+    contexts = {}
+    for (path, persona, character), group in groups.items():
+        try:
+            if path is None:
+                raise ValueError(f"No vectorstore_path for persona '{persona}'.")
+            results = query_vectorstore_batch([record["question"] for record in group], path, persona, character, backend, k=k)
+            for record, docs in zip(group, results):
+                contexts[record["line"]] = "\n\n".join(doc.page_content for doc in docs)
+        except Exception as e:
+            print(f"❌ Retrieval failed for persona '{persona}' (character '{character}'): {e}", file=sys.stderr)
+            for record in group:
+                contexts[record["line"]] = e
+        print(f"🔍 Retrieved context for {len(group)} questions for persona '{persona}' (character '{character}').", file=sys.stderr)
+    return contexts
+
+
+async def answer_one(llm, prompt, record, context, semaphore):
+    """Formats one prompt and sends it to the LLM once a concurrency slot is free."""
+    result = {key: record.get(key) for key in ("id", "line", "question", "persona", "character")}
+    if "error" in record:
+        result["error"] = record["error"]
+        return result
+    if prompt is None:
+        result["error"] = f"Unknown persona '{record['persona']}'."
+        return result
+    if isinstance(context, Exception):
+        result["error"] = f"retrieval: {context}"
+        return result
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            prompt_value = prompt.invoke({"question": record["question"], "context": context})
+            response = await llm.ainvoke(prompt_value)
+            result["answer"] = response.content
+        except Exception as e:
+            result["error"] = f"llm: {type(e).__name__}: {e}"
+        result["latency_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+async def answer_questions(records, output, concurrency=8, backend="chroma", k=5, persona_directory=PERSONA_DIRECTORY):
+    """
+    Answers every question record, writing one JSON line per answer as soon as it completes.
+
+    Parameters:
+    records (list): Question records from read_questions().
+    output (file): Open text file the JSON Lines answers are written to.
+    concurrency (int): Maximum concurrent LLM calls.
+    backend (str): The retrieval backend, "chroma", "numpy", "int8", "pq" or "sharded".
+    k (int): Number of context documents per question.
+    persona_directory (str): Directory of persona configurations (see persona_registry.py).
+
+    Returns:
+    dict: Counts of answered and failed questions.
+    """
+    # Fill in the store path and character filter from each persona's configuration.
+    registry = get_registry(persona_directory)
+    prompts = {}
+    for record in records:
+        if "error" in record:
+            continue
+        persona = record["persona"]
+        if persona in registry:
+            prompts[persona] = registry.get(persona).prompt_template
+            record.setdefault("vectorstore_path", registry.get(persona).vectorstore_path)
+            record.setdefault("character", registry.get(persona).character)
+        record.setdefault("character", "None")
+
+    # 1-2. Batched embedding and vectorized retrieval (blocking, so run off the event loop).
+    contexts = await asyncio.to_thread(retrieve_contexts, records, backend, k)
+
+    # 3. Concurrent LLM calls with the personas' precompiled prompt templates.
+    llm = get_llm()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.create_task(answer_one(llm, prompts.get(record.get("persona")), record, contexts.get(record["line"]), semaphore))
+             for record in records]
+
+    summary = {"answered": 0, "failed": 0}
+    for task in asyncio.as_completed(tasks):
+        result = await task
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+        summary["failed" if "error" in result else "answered"] += 1
+    return summary
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_path", type=str, help="JSON Lines file of {question, persona, character} records.")
+    parser.add_argument("output_path", type=str, help="JSON Lines file for the answers, or - for stdout.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum concurrent LLM calls.")
+    parser.add_argument("--backend", type=str, default="chroma", choices=BACKENDS, help="The search backend.")
+    parser.add_argument("--k", type=int, default=5, help="Number of context documents per question.")
+    parser.add_argument("--persona_directory", type=str, default=PERSONA_DIRECTORY, help="Directory of persona configurations.")
+    parser.add_argument("--trace", type=str, default=None, help="Trace sinks, e.g. histogram or jsonl:traces.jsonl (see tracing.py).")
+    parser.add_argument("--openai_base_url", type=str, default=None, help="Send OpenAI requests to this URL (e.g. the local stand-in server).")
+    args = parser.parse_args()
+    if args.openai_base_url:
+        store_registry.set_openai_base_url(args.openai_base_url)
+    if args.trace:
+        tracing.configure(args.trace)
+
+    records = read_questions(args.input_path)
+    print(f"📥 Answering {len(records)} questions with up to {args.concurrency} concurrent LLM calls...", file=sys.stderr)
+    started = time.perf_counter()
+    output = sys.stdout if args.output_path == "-" else open(args.output_path, "w", encoding="utf-8")
+    try:
+        summary = asyncio.run(answer_questions(records, output, args.concurrency, args.backend, args.k, args.persona_directory))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"✅ {summary['answered']} answered, {summary['failed']} failed in {time.perf_counter() - started:.1f}s.", file=sys.stderr)
+    tracing.report()
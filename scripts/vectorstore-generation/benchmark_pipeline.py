@@ -0,0 +1,413 @@
+# This file benchmarks the vector store pipeline offline.
+# It generates synthetic corpora of configurable size (a screenplay-shaped PDF,
+# a verse-shaped TXT and a character/dialogue CSV), then measures each stage:
+# parsing, Chroma ingestion, JSON / binary export and retrieval.
+# Embeddings come from local_embeddings.HashEmbeddings, so no network is used, or with
+# --openai_base_url from the OpenAI client pointed at e.g. the local stand-in server.
+# Every stage runs in its own process so its peak RSS can be reported.
+# Results are saved as JSON and can be compared against a saved baseline.
+# Example Usage:
+# python3 benchmark_pipeline.py --output benchmark-results/baseline.json
+# python3 benchmark_pipeline.py --baseline benchmark-results/baseline.json --fail_on_regression
+
+import os
+import io
+import sys
+import csv
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import platform
+import contextlib
+import multiprocessing
+import numpy as np
+
+STAGES = ["parse_pdf", "parse_txt", "parse_csv", "ingest", "export_json", "export_binary",
+          "retrieve_chroma", "retrieve_numpy"]
+COLLECTION_NAME = "benchmark"
+RESULTS_DIRECTORY = "benchmark-results"
+
+WORDS = ("love light house dream world river night morning friend father mother child heart road "
+         "city water fire bread stone garden voice king people truth spirit time pink doughnut "
+         "beer work family dance beach party car money school promise sorry happy strange").split()
+CHARACTERS = ["BARBIE", "KEN", "GLORIA", "SASHA", "HOMER", "MARGE", "BART", "LISA"]
+LOCATIONS = ["BARBIE'S DREAMHOUSE", "BEACH", "KITCHEN", "OFFICE", "MOE'S TAVERN", "CAR"]
+BOOKS = ["Genesis", "Exodus", "Psalms", "Proverbs", "Matthew", "John"]
+
+
+def sentence(rng, min_words=6, max_words=16):
+    """Returns a random sentence built from the benchmark vocabulary."""
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    """
+    Writes a minimal text-only PDF, one page per list of lines, in Helvetica 10pt.
+
+    Parameters:
+    path (str): The output file path.
+    pages (list): A list of pages, each a list of text lines.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 12 TL 72 760 Td\n" + "".join(f"({pdf_escape(line)}) Tj T*\n" for line in lines) + "ET"
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+        xref_offset = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1"))
+
+
+def generate_corpora(directory, pages=50, verses=5000, rows=5000, seed=0):
+    """
+    Generates the synthetic benchmark corpora.
+
+    Parameters:
+    directory (str): The directory to write the corpora to.
+    pages (int): Number of screenplay PDF pages.
+    verses (int): Number of verse lines in the TXT file.
+    rows (int): Number of character/dialogue rows in the CSV file.
+    seed (int): Random seed, the same seed always produces the same corpora.
+
+    Returns:
+    dict: corpus type ("pdf", "txt", "csv") -> file path.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = {
+        "pdf": os.path.join(directory, "synthetic_screenplay.pdf"),
+        "txt": os.path.join(directory, "synthetic_verses.txt"),
+        "csv": os.path.join(directory, "synthetic_dialogue.csv")
+    }
+
+    # Screenplay: scene headings, action lines and character cues followed by dialogue.
+    screenplay = []
+    for _ in range(pages):
+        lines = []
+        while len(lines) < 50:
+            roll = rng.random()
+            if roll < 0.1:
+                lines.append(f"{rng.choice(['INT.', 'EXT.'])} {rng.choice(LOCATIONS)} - {rng.choice(['DAY', 'NIGHT'])}")
+            elif roll < 0.3:
+                lines.append(sentence(rng))
+            else:
+                cue = rng.choice(CHARACTERS)
+                lines.append(cue + (" (V.O.)" if rng.random() < 0.1 else ""))
+                lines.extend(sentence(rng, 4, 9) for _ in range(rng.randint(1, 3)))
+        screenplay.append(lines[:50])
+    write_pdf(paths["pdf"], screenplay)
+
+    # Verses: a version label, then "Book chapter:verse<TAB>text" lines.
+    with open(paths["txt"], "w", encoding="utf-8") as f:
+        f.write("Synthetic Benchmark Version\n")
+        for index in range(verses):
+            book = BOOKS[index * len(BOOKS) // max(verses, 1)]
+            f.write(f"{book} {index // 30 + 1}:{index % 30 + 1}\t{sentence(rng)}\n")
+
+    # Dialogue: character and dialogue columns, like the Simpsons dataset.
+    with open(paths["csv"], "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["character", "dialogue"])
+        for _ in range(rows):
+            writer.writerow([rng.choice(CHARACTERS).title(), sentence(rng, 3, 20)])
+
+    return paths
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3) if samples else None
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of the current process in MB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux.
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def load_corpus_documents(corpora):
+    """Parses every corpus (untimed) for the stages that need Document objects."""
+    from generate_vectorstore_chroma import load_source_documents
+    docs = []
+    for path in corpora.values():
+        docs.extend(load_source_documents(path))
+    return docs
+
+
+def query_texts(config):
+    """Returns the deterministic set of benchmark questions."""
+    rng = random.Random(config["seed"] + 1)
+    return [sentence(rng, 3, 10) for _ in range(config["queries"])]
+
+
+def benchmark_embeddings(config):
+    """Returns the local hash embeddings, or an OpenAI client for config["openai_base_url"] (e.g. the local stand-in)."""
+    if not config.get("openai_base_url"):
+        from local_embeddings import HashEmbeddings
+        return HashEmbeddings(config["dimensions"])
+    import store_registry
+    from langchain_openai.embeddings import OpenAIEmbeddings
+    store_registry.set_openai_base_url(config["openai_base_url"])
+    # Texts are sent as strings, so no tiktoken encoding has to be downloaded.
+    return OpenAIEmbeddings(model="text-embedding-3-small", dimensions=config["dimensions"],
+                            api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL"),
+                            check_embedding_ctx_length=False)
+
+
+def open_chroma(config):
+    from langchain_chroma import Chroma
+    return Chroma(
+        persist_directory=os.path.join(config["work_directory"], "chroma"),
+        collection_name=COLLECTION_NAME,
+        embedding_function=benchmark_embeddings(config)
+        )
+
+
+def bench_parse(config, kind):
+    """Times the public generate_docs_* function for one corpus."""
+    from generate_document_objects import generate_docs_from_pdf, generate_docs_from_txt, generate_docs_from_csv
+    path = config["corpora"][kind]
+    if kind == "pdf":
+        parse = lambda: generate_docs_from_pdf(path, workers=config["workers"])
+    elif kind == "txt":
+        parse = lambda: generate_docs_from_txt(path)
+    else:
+        parse = lambda: generate_docs_from_csv(path)
+    samples = []
+    for _ in range(config["repeat"]):
+        start = time.perf_counter()
+        docs = parse()
+        samples.append(time.perf_counter() - start)
+    return len(docs), samples, "run"
+
+
+def bench_ingest(config):
+    """Times ingest_documents() into a fresh Chroma collection with the benchmark embeddings."""
+    from generate_vectorstore_chroma import ingest_documents
+    docs = load_corpus_documents(config["corpora"])
+    vector_store = open_chroma(config)
+    embeddings = benchmark_embeddings(config)
+    samples = []
+    for _ in range(config["repeat"]):
+        vector_store.reset_collection()
+        start = time.perf_counter()
+        ingest_documents(vector_store, embeddings, docs, cache=None, workers=config["workers"])
+        samples.append(time.perf_counter() - start)
+    return len(docs), samples, "run"
+
+
+def bench_export(config, kind):
+    """Times export_json() or export_binary() of the ingested collection."""
+    from export_vectorstore_json import export_json, export_binary
+    # load_collection() builds an OpenAIEmbeddings client, which needs a key but makes no calls during export.
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+    vectorstore_path = os.path.join(config["work_directory"], "chroma")
+    export = export_json if kind == "json" else export_binary
+    count = open_chroma(config)._collection.count()
+    samples = []
+    for _ in range(config["repeat"]):
+        start = time.perf_counter()
+        export(vectorstore_path, COLLECTION_NAME)
+        samples.append(time.perf_counter() - start)
+    return count, samples, "run"
+
+
+def bench_retrieve(config, backend):
+    """Times top-5 retrieval for every benchmark question, one query at a time."""
+    embeddings = benchmark_embeddings(config)
+    questions = query_texts(config)
+    if backend == "chroma":
+        retriever = open_chroma(config).as_retriever(search_type="similarity", search_kwargs={"k": 5})
+        search = retriever.invoke
+    else:
+        from numpy_vectorstore import NumpyVectorStore
+        store = NumpyVectorStore.from_export(os.path.join(config["work_directory"], "chroma", "embeddings"))
+        search = lambda question: store.search(embeddings.embed_query(question), k=5)
+    samples = []
+    for question in questions:
+        start = time.perf_counter()
+        search(question)
+        samples.append(time.perf_counter() - start)
+    return len(questions), samples, "query"
+
+
+STAGE_FUNCTIONS = {
+    "parse_pdf": lambda config: bench_parse(config, "pdf"),
+    "parse_txt": lambda config: bench_parse(config, "txt"),
+    "parse_csv": lambda config: bench_parse(config, "csv"),
+    "ingest": bench_ingest,
+    "export_json": lambda config: bench_export(config, "json"),
+    "export_binary": lambda config: bench_export(config, "binary"),
+    "retrieve_chroma": lambda config: bench_retrieve(config, "chroma"),
+    "retrieve_numpy": lambda config: bench_retrieve(config, "numpy")
+}
+
+
+def run_stage(stage, config, results):
+    """
+    Child process entry point: runs one stage and puts its measurements on the results queue.
+    The stage's own progress output is discarded so it does not drown the report.
+    """
+    os.chdir(config["work_directory"])
+    os.environ["TQDM_DISABLE"] = "1"
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            items, samples, unit = STAGE_FUNCTIONS[stage](config)
+        total = sum(samples)
+        results.put({
+            "items": items,
+            "unit": unit,
+            "samples": len(samples),
+            "seconds": round(total, 6),
+            "throughput": round(items * (len(samples) if unit == "run" else 1) / total, 3) if total else None,
+            "p50_ms": percentile_ms(samples, 50),
+            "p95_ms": percentile_ms(samples, 95),
+            "p99_ms": percentile_ms(samples, 99),
+            "peak_rss_mb": peak_rss_mb()
+        })
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_benchmarks(config, stages=STAGES):
+    """
+    Runs each stage in a fresh process, in order.
+
+    Parameters:
+    config (dict): The benchmark configuration, including the corpora paths and work directory.
+    stages (list): The stages to run.
+
+    Returns:
+    dict: stage -> measurements (or {"error": ...} if the stage failed).
+    """
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for stage in stages:
+        print(f"⏱️ Running stage '{stage}'...")
+        queue = context.Queue()
+        process = context.Process(target=run_stage, args=(stage, config, queue))
+        process.start()
+        process.join()
+        result = queue.get() if not queue.empty() else {"error": f"process exited with code {process.exitcode}"}
+        results[stage] = result
+        if "error" in result:
+            print(f"❌ Stage '{stage}' failed: {result['error']}")
+        else:
+            print(f"✅ {stage}: {result['items']} items, {result['throughput']} items/s, "
+                  f"p95 {result['p95_ms']} ms, peak RSS {result['peak_rss_mb']} MB")
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=0.10):
+    """
+    Compares stage measurements against a baseline run.
+    A stage regresses if its throughput drops, or its p95 latency grows, by more than threshold.
+
+    Returns:
+    list: The names of the stages that regressed.
+    """
+    regressions = []
+    print(f"{'stage':<16} {'throughput':>12} {'baseline':>12} {'change':>8} {'p95 ms':>10} {'baseline':>10}")
+    for stage, current in results.items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or "error" in current or "error" in previous:
+            continue
+        change = current["throughput"] / previous["throughput"] - 1 if previous["throughput"] else 0.0
+        slower = change < -threshold or (previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + threshold))
+        flag = " ⚠️" if slower else ""
+        print(f"{stage:<16} {current['throughput']:>12} {previous['throughput']:>12} {change:>+8.1%} "
+              f"{current['p95_ms']:>10} {previous['p95_ms']:>10}{flag}")
+        if slower:
+            regressions.append(stage)
+    return regressions
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=50, help="Number of synthetic screenplay PDF pages.")
+    parser.add_argument("--verses", type=int, default=5000, help="Number of synthetic verse lines.")
+    parser.add_argument("--rows", type=int, default=5000, help="Number of synthetic dialogue CSV rows.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of retrieval queries.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per parse / ingest / export stage.")
+    parser.add_argument("--workers", type=int, default=4, help="Workers for PDF parsing and embedding.")
+    parser.add_argument("--dimensions", type=int, default=256, help="Dimensions of the local embeddings.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic corpora.")
+    parser.add_argument("--openai_base_url", type=str, default=None, help="Embed through the OpenAI API at this URL (e.g. the local stand-in server).")
+    parser.add_argument("--stages", nargs="*", choices=STAGES, default=STAGES, help="Stages to run.")
+    parser.add_argument("--output", type=str, default=None, help="Results file (default: benchmark-results/<timestamp>.json).")
+    parser.add_argument("--baseline", type=str, default=None, help="A saved results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown reported as a regression.")
+    parser.add_argument("--fail_on_regression", action="store_true", help="Exit with status 1 if any stage regressed.")
+    parser.add_argument("--keep", action="store_true", help="Keep the work directory with the corpora and vector store.")
+    args = parser.parse_args()
+
+    work_directory = tempfile.mkdtemp(prefix="vectorstore-benchmark-")
+    try:
+        print(f"📝 Generating synthetic corpora in {work_directory}...")
+        corpora = generate_corpora(os.path.join(work_directory, "corpora"), args.pages, args.verses, args.rows, args.seed)
+        config = {
+            "pages": args.pages,
+            "verses": args.verses,
+            "rows": args.rows,
+            "queries": args.queries,
+            "repeat": args.repeat,
+            "workers": args.workers,
+            "dimensions": args.dimensions,
+            "seed": args.seed,
+            "openai_base_url": args.openai_base_url,
+            "corpora": corpora,
+            "work_directory": work_directory
+        }
+        results = run_benchmarks(config, [stage for stage in STAGES if stage in args.stages])
+    finally:
+        if args.keep:
+            print(f"📁 Kept work directory: {work_directory}")
+        else:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": {key: value for key, value in config.items() if key not in ("corpora", "work_directory")},
+        "stages": results
+    }
+    output = args.output or os.path.join(RESULTS_DIRECTORY, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Saved benchmark results to {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"⚠️ Regressed stages: {', '.join(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print("✅ No regressions against the baseline.")
@@ -0,0 +1,214 @@
+# This file merges the one-line Document objects of the parsers into retrievable passages.
+# The Simpsons CSV gives one document per spoken line and the screenplay parser one per
+# speech, so most vectors hold a few words. Chunking merges nearby lines into windows:
+# - lines are merged only with lines that have the same group_by metadata (by default the
+#   same type and character), so character filters keep working,
+# - a line joins a window only if at most max_gap other documents were parsed since the
+#   window's last line, so a window stays within one exchange,
+# - a window never crosses a scene heading or an empty line, and holds at most max_tokens tokens.
+# Each window keeps the metadata of its first line, plus "source_doc_ids" (comma-separated
+# doc_ids of its lines), "lines", "last_page_number" and the "scene" heading when known.
+# Scene headings and empty documents are kept unchanged as documents of their own, so
+# chunking drops nothing the parser produced; drop_empty (--drop_empty) opts in to
+# dropping the empty ones.
+# Example Usage:
+# python3 chunk_documents.py source-files/simpsons_dataset.csv
+# python3 chunk_documents.py source-files/barbie_final_shooting_script.pdf --max_tokens 128
+
+import argparse
+from collections import OrderedDict
+
+DEFAULT_MAX_TOKENS = 256
+DEFAULT_MAX_GAP = 10
+DEFAULT_GROUP_BY = ("type", "character")
+SCENE_TYPES = ("scene_heading",)
+# The tokenizer of text-embedding-ada-002 and text-embedding-3.
+DEFAULT_ENCODING = "cl100k_base"
+
+
+def token_counter(encoding_name=DEFAULT_ENCODING):
+    """
+    Returns a function counting the tokens of a text with tiktoken,
+    or an estimate of 4 characters per token if encoding_name is None.
+    """
+    if encoding_name is None:
+        return lambda text: max(1, len(text) // 4)
+    import tiktoken
+    encoding = tiktoken.get_encoding(encoding_name)
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+class _Window:
+    def __init__(self, position, scene):
+        self.docs = []
+        self.scene = scene
+        self.tokens = 0
+        self.first_position = position
+        self.last_position = position
+
+
+class Chunker:
+    """
+    Merges adjacent Document objects into token-bounded windows.
+
+    Parameters:
+    max_tokens (int): Maximum tokens per window (a longer single line becomes its own window).
+    group_by (tuple): Metadata keys that must match for lines to share a window.
+    max_gap (int): Maximum number of other documents between two lines of a window.
+    count_tokens (callable): Counts the tokens of a text (see token_counter()).
+    drop_empty (bool): Drop empty documents instead of keeping them as documents of their own.
+    """
+
+    def __init__(self, max_tokens=DEFAULT_MAX_TOKENS, group_by=DEFAULT_GROUP_BY, max_gap=DEFAULT_MAX_GAP, count_tokens=None,
+                 drop_empty=False):
+        self.max_tokens = max_tokens
+        self.drop_empty = drop_empty
+        self.group_by = tuple(group_by or ())
+        self.max_gap = max_gap
+        self.count_tokens = count_tokens or token_counter()
+        # Without character in group_by, windows mix speakers, so each line is labelled.
+        self.label_speakers = "character" not in self.group_by
+        self.scene = None
+        self.position = 0
+        self.windows = []
+        self._open = OrderedDict()
+        self.stats = {"documents": 0, "windows": 0, "tokens": 0}
+
+    def _close(self, key):
+        window = self._open.pop(key)
+        self.windows.append((window.first_position, self._window_document(window)))
+
+    def _close_all(self):
+        for key in list(self._open):
+            self._close(key)
+
+    def add(self, doc):
+        """Adds the next parsed document."""
+        self.stats["documents"] += 1
+        self.position += 1
+        metadata = doc.metadata or {}
+        content = doc.page_content.strip()
+        if not content or metadata.get("type") in SCENE_TYPES:
+            # A boundary: it closes every window and is kept as a document of its own.
+            self._close_all()
+            self.scene = content or None
+            if content or not self.drop_empty:
+                self.windows.append((self.position, doc))
+                self.stats["windows"] += 1
+            return
+
+        # Close windows whose last line is too far behind (the oldest are first).
+        while self._open:
+            key, window = next(iter(self._open.items()))
+            if self.position - window.last_position - 1 <= self.max_gap:
+                break
+            self._close(key)
+
+        line = self._line(content, metadata)
+        tokens = self.count_tokens(line)
+        key = tuple(str(metadata.get(name)) for name in self.group_by)
+        window = self._open.get(key)
+        if window is not None and window.tokens + tokens > self.max_tokens:
+            self._close(key)
+            window = None
+        if window is None:
+            window = self._open[key] = _Window(self.position, self.scene)
+        window.docs.append((line, metadata))
+        window.tokens += tokens
+        window.last_position = self.position
+        self._open.move_to_end(key)
+        self.stats["tokens"] += tokens
+
+    def _line(self, content, metadata):
+        character = metadata.get("character")
+        if self.label_speakers and character and str(character).lower() not in ("none", "null"):
+            return f"{character}: {content}"
+        return content
+
+    def _window_document(self, window):
+        from langchain_core.documents import Document
+        lines = [line for line, _ in window.docs]
+        metadatas = [metadata for _, metadata in window.docs]
+        metadata = dict(metadatas[0])
+        metadata["source_doc_ids"] = ",".join(str(m.get("doc_id")) for m in metadatas)
+        metadata["lines"] = len(lines)
+        pages = [m["page_number"] for m in metadatas if m.get("page_number") is not None]
+        if pages:
+            metadata["last_page_number"] = pages[-1]
+        if window.scene:
+            metadata["scene"] = window.scene
+        if self.label_speakers:
+            characters = list(dict.fromkeys(str(m.get("character")) for m in metadatas if m.get("character") is not None))
+            if len(characters) > 1:
+                metadata["characters"] = ",".join(characters)
+        self.stats["windows"] += 1
+        return Document(page_content="\n".join(lines), metadata=metadata)
+
+    def documents(self):
+        """Closes every open window and returns the windows in the order of their first line."""
+        self._close_all()
+        return [doc for _, doc in sorted(self.windows, key=lambda window: window[0])]
+
+    def report(self):
+        """Prints how many windows the documents were merged into."""
+        stats = self.stats
+        print(f"✂️ Chunked {stats['documents']} documents into {stats['windows']} windows "
+              f"({stats['documents'] / max(stats['windows'], 1):.1f}x fewer vectors, "
+              f"{stats['tokens'] / max(stats['windows'], 1):.0f} tokens per window on average).")
+        return dict(stats)
+
+
+def chunk_documents(docs, max_tokens=DEFAULT_MAX_TOKENS, group_by=DEFAULT_GROUP_BY, max_gap=DEFAULT_MAX_GAP,
+                    encoding=DEFAULT_ENCODING, drop_empty=False):
+    """
+    Merges adjacent Document objects into token-bounded windows (see Chunker).
+
+    Parameters:
+    docs (iterable): The parsed Document objects in reading order (a list or a lazy generator).
+    max_tokens (int): Maximum tokens per window.
+    group_by (tuple): Metadata keys that must match for lines to share a window.
+    max_gap (int): Maximum number of other documents between two lines of a window.
+    encoding (str): The tiktoken encoding used to count tokens, or None to estimate them.
+    drop_empty (bool): Drop empty documents instead of keeping them as documents of their own.
+
+    Returns:
+    list: The window Document objects (and the scene headings), in the order of their first line.
+    """
+    chunker = Chunker(max_tokens, group_by, max_gap, token_counter(encoding), drop_empty)
+    for doc in docs:
+        chunker.add(doc)
+    documents = chunker.documents()
+    chunker.report()
+    return documents
+
+
+def chunk_options(setting):
+    """
+    Returns the chunk_documents() keyword arguments for a persona's "chunking" setting:
+    true for the defaults, or {"max_tokens": ..., "group_by": [...], "max_gap": ..., "drop_empty": ...}.
+    """
+    if not setting:
+        return None
+    options = dict(setting) if isinstance(setting, dict) else {}
+    if "group_by" in options:
+        options["group_by"] = tuple(options["group_by"])
+    return options
+
+
+if __name__ == "__main__":
+    from generate_document_objects import iter_docs
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_path", type=str, help="The source file to parse and chunk (PDF, TXT, or CSV).")
+    parser.add_argument("--max_tokens", type=int, default=DEFAULT_MAX_TOKENS, help="Maximum tokens per window.")
+    parser.add_argument("--group_by", nargs="*", default=list(DEFAULT_GROUP_BY), help="Metadata keys that must match within a window.")
+    parser.add_argument("--max_gap", type=int, default=DEFAULT_MAX_GAP, help="Maximum number of other documents between two lines of a window.")
+    parser.add_argument("--drop_empty", action="store_true", help="Drop empty documents instead of keeping them.")
+    parser.add_argument("--show", type=int, default=3, help="Number of windows to print.")
+    args = parser.parse_args()
+
+    documents = chunk_documents(iter_docs(args.file_path), args.max_tokens, args.group_by, args.max_gap,
+                                drop_empty=args.drop_empty)
+    for doc in documents[:args.show]:
+        print(f"--- {doc.metadata.get('character')} (doc_ids {doc.metadata.get('source_doc_ids', doc.metadata.get('doc_id'))}) ---\n{doc.page_content}")
@@ -0,0 +1,113 @@
+# This file is the thin client of the local query daemon (see query_daemon.py).
+# It only uses the standard library, so the query scripts can ask a running
+# daemon for results without importing langchain, weaviate or openai first.
+# When no daemon is listening, request() returns None and callers fall back
+# to running the query in-process.
+# Scripts that rebuild or delete a store call invalidate() so a running daemon
+# re-opens it instead of answering from stale handles.
+# Set QUERY_DAEMON_URL to change the daemon address and QUERY_DAEMON=off to never use it.
+
+import os
+import json
+import socket
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+
+DEFAULT_DAEMON_URL = os.getenv("QUERY_DAEMON_URL", "http://127.0.0.1:8765")
+CONNECT_TIMEOUT = 0.25
+
+
+def daemon_enabled():
+    """Returns False if QUERY_DAEMON is set to off."""
+    return os.getenv("QUERY_DAEMON", "on").lower() not in ("off", "0", "false")
+
+
+def is_running(url=DEFAULT_DAEMON_URL):
+    """Returns True if something is listening on the daemon's address."""
+    address = urlparse(url)
+    try:
+        with socket.create_connection((address.hostname, address.port or 80), timeout=CONNECT_TIMEOUT):
+            return True
+    except OSError:
+        return False
+
+
+def _open(path, payload, url, timeout):
+    if not daemon_enabled() or not is_running(url):
+        return None
+    request = urllib.request.Request(
+        url.rstrip("/") + path,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"}
+    )
+    try:
+        return urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", str(e))
+        except ValueError:
+            message = str(e)
+        raise RuntimeError(f"❌ Query daemon error: {message}") from None
+    except urllib.error.URLError:
+        return None
+
+
+def request(path, payload, url=DEFAULT_DAEMON_URL, timeout=600):
+    """
+    Sends a JSON request to the daemon.
+
+    Parameters:
+    path (str): The endpoint, e.g. "/query".
+    payload (dict): The JSON body.
+    url (str): The daemon's base URL.
+    timeout (float): Seconds to wait for the response.
+
+    Returns:
+    dict: The JSON response, or None if the daemon is not running.
+    """
+    response = _open(path, payload, url, timeout)
+    if response is None:
+        return None
+    with response:
+        return json.loads(response.read())
+
+
+def invalidate(vectorstore_path, persona=None, url=DEFAULT_DAEMON_URL):
+    """
+    Tells a running daemon to drop its cached handles for a rebuilt or deleted vector store
+    (see store_registry.invalidate()). Does nothing if no daemon is running.
+
+    Parameters:
+    vectorstore_path (str): The path to the vector store, sent as an absolute path.
+    persona (str): The persona (collection) to drop, or None for every persona under vectorstore_path.
+    url (str): The daemon's base URL.
+
+    Returns:
+    dict: The daemon's response, or None if the daemon is not running.
+    """
+    try:
+        return request("/invalidate", {"vectorstore_path": os.path.abspath(vectorstore_path), "persona": persona},
+                       url=url, timeout=10)
+    except RuntimeError as e:
+        print(f"⚠️ Could not invalidate {vectorstore_path} in the query daemon: {e}")
+        return None
+
+
+def stream(path, payload, url=DEFAULT_DAEMON_URL, timeout=600):
+    """
+    Sends a JSON request to a streaming endpoint that answers with JSON Lines.
+
+    Returns:
+    iterator: The parsed JSON lines as they arrive, or None if the daemon is not running.
+    """
+    response = _open(path, payload, url, timeout)
+    if response is None:
+        return None
+
+    def lines():
+        with response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+    return lines()
@@ -0,0 +1,225 @@
+# This file collapses duplicate Document objects between parsing and ingestion, so
+# repeated short lines ("D'oh!", "Hmm.", "Yeah.") are embedded, stored and searched once.
+# - exact duplicates: documents whose normalized text (lowercase, punctuation and
+#   extra whitespace removed) has the same hash.
+# - near duplicates: documents whose character 3-gram MinHash signatures agree on at
+#   least near_threshold of their values, found with LSH banding instead of comparing every pair.
+# Only documents in the same scope (by default the same character and type) are merged,
+# so character filters still work. The first occurrence is kept and records the merged
+# occurrences in its metadata: "occurrences" (a count) and comma-separated "doc_ids",
+# "pages" and, when character is not in the scope, "characters". Chunked windows (see
+# chunk_documents.py) contribute every line of their "source_doc_ids" and "characters".
+# Example Usage:
+# python3 dedupe_documents.py source-files/simpsons_dataset.csv
+# python3 dedupe_documents.py source-files/barbie_final_shooting_script.pdf --near_threshold 0.9
+
+import re
+import zlib
+import argparse
+import unicodedata
+import numpy as np
+
+DEFAULT_NEAR_THRESHOLD = 0.8
+DEFAULT_SCOPE = ("character", "type")
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+# A prime just above 2**32, so (a * x + b) fits in uint64 for 32-bit shingle hashes.
+HASH_PRIME = np.uint64(4294967311)
+
+# Metadata keys of the merged occurrences, the metadata key each one collects, and the
+# comma-separated key that replaces it on chunked windows (None if there is none).
+OCCURRENCE_KEYS = (("doc_ids", "doc_id", "source_doc_ids"), ("pages", "page_number", None),
+                   ("characters", "character", "characters"))
+
+
+def normalize_text(text):
+    """Returns text lowercased, with punctuation removed and whitespace collapsed (falls back to the stripped text)."""
+    text = unicodedata.normalize("NFKC", text).replace("’", "'").lower()
+    normalized = " ".join(re.sub(r"[^\w\s']", " ", text).split())
+    return normalized or text.strip()
+
+
+def occurrence_values(metadata, key, window_key=None):
+    """Returns the values of key in one occurrence's metadata, split from window_key when it is set."""
+    if window_key and metadata.get(window_key) is not None:
+        return str(metadata[window_key]).split(",")
+    return [str(metadata[key])] if metadata.get(key) is not None else []
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Returns the set of character n-grams of a normalized text (the text itself if it is shorter)."""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """
+    MinHash signatures of shingle sets with num_perm universal hash functions.
+    The fraction of equal values in two signatures estimates the Jaccard similarity of the sets.
+
+    Parameters:
+    num_perm (int): Signature length.
+    seed (int): Random seed of the hash functions.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=0):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+        return ((np.outer(hashes, self.a) + self.b) % HASH_PRIME).min(axis=0)
+
+
+class Deduplicator:
+    """
+    Collapses exact and near-duplicate documents as they are added, keeping the first occurrence.
+    Near duplicates are only compared against kept documents, so clusters do not chain.
+
+    Parameters:
+    near_threshold (float): Minimum estimated Jaccard similarity of near duplicates, or None for exact duplicates only.
+    scope (tuple): Metadata keys that must match for documents to be merged.
+    num_perm (int): MinHash signature length.
+    bands (int): LSH bands (num_perm must be divisible by bands).
+    """
+
+    def __init__(self, near_threshold=DEFAULT_NEAR_THRESHOLD, scope=DEFAULT_SCOPE, num_perm=NUM_PERM, bands=BANDS, seed=0):
+        if num_perm % bands:
+            raise ValueError(f"❌ num_perm ({num_perm}) must be divisible by bands ({bands}).")
+        self.near_threshold = near_threshold
+        self.scope = tuple(scope or ())
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, seed)
+        self.kept = []
+        self.occurrences = []
+        self.signatures = np.zeros((1024, num_perm), dtype=np.uint64)
+        self._exact = {}
+        self._buckets = {}
+        self.stats = {"documents": 0, "exact": 0, "near": 0, "characters_saved": 0}
+
+    def _bands(self, scope_key, signature):
+        for band in range(0, len(signature), self.rows):
+            yield (scope_key, band, signature[band:band + self.rows].tobytes())
+
+    def _nearest(self, scope_key, signature):
+        candidates = {index for key in self._bands(scope_key, signature) for index in self._buckets.get(key, ())}
+        if not candidates:
+            return None
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarities = (self.signatures[candidates] == signature).mean(axis=1)
+        best = int(np.argmax(similarities))
+        return int(candidates[best]) if similarities[best] >= self.near_threshold else None
+
+    def add(self, doc):
+        """Adds a document, merging it into a kept document if it duplicates one. Returns the kept document's index."""
+        self.stats["documents"] += 1
+        metadata = doc.metadata or {}
+        scope_key = tuple(str(metadata.get(key)) for key in self.scope)
+        normalized = normalize_text(doc.page_content)
+
+        index = self._exact.get((scope_key, normalized))
+        kind = "exact"
+        if index is None and self.near_threshold is not None:
+            signature = self.hasher.signature(shingles(normalized))
+            index = self._nearest(scope_key, signature)
+            kind = "near"
+        if index is None:
+            index = len(self.kept)
+            self.kept.append(doc)
+            self.occurrences.append([metadata])
+            if self.near_threshold is not None:
+                if index == len(self.signatures):
+                    self.signatures = np.concatenate([self.signatures, np.zeros_like(self.signatures)])
+                self.signatures[index] = signature
+                for key in self._bands(scope_key, signature):
+                    self._buckets.setdefault(key, []).append(index)
+        else:
+            self.occurrences[index].append(metadata)
+            self.stats[kind] += 1
+            self.stats["characters_saved"] += len(doc.page_content)
+        # Later copies of this exact text go straight to the kept document.
+        self._exact.setdefault((scope_key, normalized), index)
+        return index
+
+    def documents(self):
+        """Returns the kept documents, with the merged occurrences in the metadata of documents that had duplicates."""
+        from langchain_core.documents import Document
+        documents = []
+        for doc, occurrences in zip(self.kept, self.occurrences):
+            if len(occurrences) == 1:
+                documents.append(doc)
+                continue
+            metadata = dict(doc.metadata or {})
+            metadata["occurrences"] = len(occurrences)
+            for merged_key, key, window_key in OCCURRENCE_KEYS:
+                # Within one scope value every occurrence shares it, so it is not repeated.
+                if key in self.scope:
+                    continue
+                values = list(dict.fromkeys(value for occurrence in occurrences
+                                            for value in occurrence_values(occurrence, key, window_key)))
+                if values:
+                    metadata[merged_key] = ",".join(values)
+            documents.append(Document(page_content=doc.page_content, metadata=metadata))
+        return documents
+
+    def report(self):
+        """Prints how many documents were collapsed and how many embeddings that saves."""
+        stats = self.stats
+        saved = stats["exact"] + stats["near"]
+        print(f"🧹 Deduplicated {stats['documents']} documents into {len(self.kept)}: "
+              f"{stats['exact']} exact and {stats['near']} near duplicates collapsed.")
+        print(f"💰 Saved {saved} embeddings ({saved / max(stats['documents'], 1):.1%}) "
+              f"and {stats['characters_saved']} characters of embedding input.")
+        return dict(stats, kept=len(self.kept), embeddings_saved=saved)
+
+
+def dedupe_documents(docs, near_threshold=DEFAULT_NEAR_THRESHOLD, scope=DEFAULT_SCOPE):
+    """
+    Collapses exact and near-duplicate Document objects, keeping the first occurrence of each.
+
+    Parameters:
+    docs (iterable): The parsed Document objects (a list or a lazy generator).
+    near_threshold (float): Minimum estimated Jaccard similarity of near duplicates, or None for exact duplicates only.
+    scope (tuple): Metadata keys that must match for documents to be merged.
+
+    Returns:
+    list: The deduplicated Document objects, in the order of their first occurrence.
+    """
+    deduplicator = Deduplicator(near_threshold, scope)
+    for doc in docs:
+        deduplicator.add(doc)
+    deduplicator.report()
+    return deduplicator.documents()
+
+
+def dedupe_options(setting):
+    """
+    Returns the dedupe_documents() keyword arguments for a persona's "dedupe" setting:
+    true for the defaults, or {"near_threshold": ..., "scope": [...]}.
+    """
+    if not setting:
+        return None
+    options = dict(setting) if isinstance(setting, dict) else {}
+    if "scope" in options:
+        options["scope"] = tuple(options["scope"])
+    return options
+
+
+if __name__ == "__main__":
+    from generate_document_objects import iter_docs
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_path", type=str, help="The source file to parse and deduplicate (PDF, TXT, or CSV).")
+    parser.add_argument("--near_threshold", type=float, default=DEFAULT_NEAR_THRESHOLD, help="Minimum similarity of near duplicates.")
+    parser.add_argument("--exact_only", action="store_true", help="Only collapse exact duplicates.")
+    parser.add_argument("--scope", nargs="*", default=list(DEFAULT_SCOPE), help="Metadata keys that must match for documents to be merged.")
+    parser.add_argument("--show", type=int, default=5, help="Number of most duplicated documents to print.")
+    args = parser.parse_args()
+
+    documents = dedupe_documents(iter_docs(args.file_path), None if args.exact_only else args.near_threshold, args.scope)
+    for doc in sorted(documents, key=lambda doc: doc.metadata.get("occurrences", 1), reverse=True)[:args.show]:
+        print(f"{doc.metadata.get('occurrences', 1)} x {doc.page_content[:60]!r} ({doc.metadata.get('character')})")
@@ -1,9 +1,11 @@
 # This file deletes a Chroma vector store.
 # It is useful for cleaning up after tests or when you want to reset the vector store.
+# A running query daemon (see query_daemon.py) is told to drop its handles to the deleted store.
 
 import shutil
 import os
 import argparse
+import daemon_client
 
 def delete_vectorstore(vectorstore_path):
     """
@@ -15,7 +17,8 @@ def delete_vectorstore(vectorstore_path):
     if os.path.exists(vectorstore_path):
         print(f"⚠️ Deleting existing vectorstore at {vectorstore_path}")
         shutil.rmtree(vectorstore_path)
-        print(f"✅ Vector store at {args.vectorstore_path} has been deleted.")
+        daemon_client.invalidate(vectorstore_path)
+        print(f"✅ Vector store at {vectorstore_path} has been deleted.")
     else:
         print(f"❌ No vectorstore found at {vectorstore_path}, nothing to delete.")
 
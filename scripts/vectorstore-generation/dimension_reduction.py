@@ -0,0 +1,225 @@
+# This file reduces the dimensionality of exported embeddings, so search cost and
+# payload size shrink with the number of kept dimensions:
+# - truncate: for text-embedding-3 models, which are trained Matryoshka-style so the
+#   leading dimensions carry most of the meaning, keep the first n dimensions and renormalize.
+# - pca: for other models (e.g. text-embedding-ada-002), project onto the top n principal
+#   components fitted on a sample of the export, then renormalize.
+# The reduction is saved next to the export (reduction.json, plus mean.npy and
+# projection.npy for PCA) and recorded in the export's manifest. NumpyVectorStore applies
+# it to full-dimension query vectors at search time. Every fit measures recall@5 of
+# the reduced vectors against full-dimension search.
+# Example Usage:
+# python3 dimension_reduction.py ./vector-store/bible_chroma_db/embeddings --dimensions 256 512 768
+
+import os
+import json
+import shutil
+import argparse
+import numpy as np
+from ann_index import unit_rows, sample_queries, load_export_matrix
+
+REDUCTION_FORMAT_VERSION = 1
+REDUCTION_META_FILE = "reduction.json"
+MEAN_FILE = "mean.npy"
+PROJECTION_FILE = "projection.npy"
+
+# Models whose embeddings can be shortened by truncation (OpenAI's text-embedding-3 family).
+MATRYOSHKA_MODELS = ("text-embedding-3-small", "text-embedding-3-large")
+SAMPLE_SIZE = 20000
+RECALL_K = 5
+RECALL_QUERIES = 200
+
+
+def is_matryoshka(model):
+    """Returns True if embeddings of model can be truncated and renormalized."""
+    return bool(model) and model.split("@")[0] in MATRYOSHKA_MODELS
+
+
+def reduction_directory_for(export_path):
+    """
+    Returns where the reduction of an export lives: a "reduction" directory inside a
+    binary export directory, or "<name>_reduction" next to a JSON export file.
+    """
+    if os.path.isdir(export_path):
+        return os.path.join(export_path, "reduction")
+    return os.path.splitext(export_path)[0] + "_reduction"
+
+
+class DimensionReduction:
+    """
+    A fitted reduction from source_dimension to dimension.
+
+    Parameters:
+    meta (dict): The contents of reduction.json (kind, model, source_dimension, dimension, ...).
+    mean (array): (source_dimension,) mean subtracted before a PCA projection.
+    projection (array): (source_dimension, dimension) PCA components.
+    """
+
+    def __init__(self, meta, mean=None, projection=None):
+        self.meta = meta
+        self.mean = mean
+        self.projection = projection
+
+    @property
+    def kind(self):
+        return self.meta["kind"]
+
+    @property
+    def dimension(self):
+        return self.meta["dimension"]
+
+    @property
+    def source_dimension(self):
+        return self.meta["source_dimension"]
+
+    @classmethod
+    def truncate(cls, source_dimension, dimension, model):
+        return cls(cls._meta("truncate", model, source_dimension, dimension))
+
+    @classmethod
+    def pca(cls, sample, dimension, model):
+        """Fits a PCA projection onto the top dimension components of a sample of unit-length vectors."""
+        if dimension > min(sample.shape):
+            raise ValueError(f"❌ Cannot fit {dimension} PCA components on a {sample.shape[0]} x {sample.shape[1]} sample.")
+        mean = sample.mean(axis=0)
+        centered = sample - mean
+        eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        order = np.argsort(eigenvalues)[::-1][:dimension]
+        meta = cls._meta("pca", model, sample.shape[1], dimension)
+        meta["explained_variance"] = round(float(eigenvalues[order].sum() / max(eigenvalues.sum(), 1e-12)), 4)
+        meta["mean_file"] = MEAN_FILE
+        meta["projection_file"] = PROJECTION_FILE
+        return cls(meta, mean.astype(np.float32), np.ascontiguousarray(eigenvectors[:, order], dtype=np.float32))
+
+    @staticmethod
+    def _meta(kind, model, source_dimension, dimension):
+        return {
+            "format_version": REDUCTION_FORMAT_VERSION,
+            "kind": kind,
+            "model": model,
+            "source_dimension": int(source_dimension),
+            "dimension": int(dimension)
+        }
+
+    def apply(self, vectors):
+        """Returns the reduced, unit-length float32 version of full-dimension vectors."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[1] != self.source_dimension:
+            raise ValueError(f"❌ Expected {self.source_dimension}-dimensional vectors, got {vectors.shape[1]}.")
+        if self.kind == "truncate":
+            return unit_rows(vectors[:, :self.dimension])
+        return unit_rows((vectors - self.mean) @ self.projection)
+
+    def save(self, directory):
+        """Writes reduction.json (and the PCA arrays) to directory and returns its path."""
+        os.makedirs(directory, exist_ok=True)
+        if self.kind == "pca":
+            np.save(os.path.join(directory, MEAN_FILE), self.mean)
+            np.save(os.path.join(directory, PROJECTION_FILE), self.projection)
+        with open(os.path.join(directory, REDUCTION_META_FILE), "w") as f:
+            json.dump(self.meta, f, indent=2)
+        return directory
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, REDUCTION_META_FILE), "r") as f:
+            meta = json.load(f)
+        if meta["kind"] == "truncate":
+            return cls(meta)
+        return cls(meta, np.load(os.path.join(directory, meta["mean_file"])),
+                   np.load(os.path.join(directory, meta["projection_file"])))
+
+
+def reservoir_sample(batches, size=SAMPLE_SIZE, seed=0):
+    """
+    Returns a uniform random sample of up to size rows from an iterator of 2-D arrays,
+    holding at most size + one batch in memory.
+    """
+    rng = np.random.default_rng(seed)
+    sample, keys = None, None
+    for batch in batches:
+        batch = np.asarray(batch, dtype=np.float32)
+        batch_keys = rng.random(len(batch))
+        if sample is None:
+            sample, keys = batch, batch_keys
+        else:
+            sample, keys = np.concatenate([sample, batch]), np.concatenate([keys, batch_keys])
+        if len(sample) > size:
+            keep = np.argpartition(keys, size - 1)[:size]
+            sample, keys = sample[keep], keys[keep]
+    if sample is None:
+        raise ValueError("❌ Cannot sample an empty export.")
+    return sample
+
+
+def reduction_recall(sample, reduction, k=RECALL_K, num_queries=RECALL_QUERIES, seed=0):
+    """Returns recall@k of searching the reduced sample against full-dimension search of the sample."""
+    vectors = unit_rows(sample)
+    queries = sample_queries(vectors, num_queries, seed)
+    k = min(k, len(vectors))
+    exact = np.argpartition(-(queries @ vectors.T), k - 1, axis=1)[:, :k]
+    reduced = np.argpartition(-(reduction.apply(queries) @ reduction.apply(vectors).T), k - 1, axis=1)[:, :k]
+    return sum(len(set(a.tolist()) & set(b.tolist())) for a, b in zip(exact, reduced)) / (len(queries) * k)
+
+
+def fit_reduction(sample, dimensions, model, seed=0):
+    """
+    Fits the reduction for model (truncation for text-embedding-3, PCA otherwise) and
+    records its recall@5 against full-dimension search.
+
+    Parameters:
+    sample (array): (n, source_dimension) sample of the export's vectors.
+    dimensions (int): The reduced dimensionality.
+    model (str): The embedding model the vectors came from.
+
+    Returns:
+    DimensionReduction: The fitted reduction.
+    """
+    vectors = unit_rows(sample)
+    if dimensions >= vectors.shape[1]:
+        raise ValueError(f"❌ dimensions ({dimensions}) must be smaller than the embedding dimension ({vectors.shape[1]}).")
+    if is_matryoshka(model):
+        reduction = DimensionReduction.truncate(vectors.shape[1], dimensions, model)
+    else:
+        reduction = DimensionReduction.pca(vectors, dimensions, model)
+    reduction.meta[f"recall_at_{RECALL_K}"] = round(reduction_recall(vectors, reduction, seed=seed), 4)
+    print(f"📐 {reduction.kind} {reduction.source_dimension} -> {reduction.dimension} dimensions for {model}: "
+          f"recall@{RECALL_K} {reduction.meta[f'recall_at_{RECALL_K}']:.3f}"
+          + (f", explained variance {reduction.meta['explained_variance']:.3f}" if reduction.kind == "pca" else ""))
+    return reduction
+
+
+def load_reduction(export_path):
+    """Returns the DimensionReduction saved for an export, or None if it is not reduced."""
+    directory = reduction_directory_for(export_path)
+    if not os.path.exists(os.path.join(directory, REDUCTION_META_FILE)):
+        return None
+    return DimensionReduction.load(directory)
+
+
+def remove_export_reduction(export_path):
+    """Deletes the reduction of an export, so a full-dimension re-export never keeps a stale one."""
+    directory = reduction_directory_for(export_path)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+        print(f"🗑️ Removed the dimension reduction at {directory} (the export was rewritten without one).")
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("export_path", type=str, help="A full-dimension binary export directory or embeddings.json file.")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[256, 512, 768], help="Reduced dimensionalities to check.")
+    parser.add_argument("--embedding_model", type=str, default="text-embedding-ada-002", help="The model the export was embedded with.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    if load_reduction(args.export_path) is not None:
+        print(f"❌ {args.export_path} is already reduced. Check a full-dimension export.")
+    else:
+        matrix = load_export_matrix(args.export_path)
+        sample = reservoir_sample((matrix[start:start + 10000] for start in range(0, len(matrix), 10000)), seed=args.seed)
+        print(f"Checking recall@{RECALL_K} of reduced dimensions on {len(sample)} of {len(matrix)} vectors "
+              f"({matrix.shape[1]} dimensions)...")
+        for dimensions in args.dimensions:
+            fit_reduction(sample, dimensions, args.embedding_model, args.seed)
@@ -0,0 +1,327 @@
+# This file contains disk-backed (SQLite) caches of embedding vectors.
+# QueryEmbeddingCache stores query embeddings keyed by embedding model,
+# dimensions and normalized question text, so repeated questions skip the
+# remote embedding call. CachedEmbeddings wraps any LangChain Embeddings
+# object and consults the cache in embed_query().
+# ContentEmbeddingCache stores document embeddings keyed by embedding model
+# and sha256(page_content), so vector store rebuilds only embed new or changed texts.
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_QUERY_CACHE_PATH = os.getenv("QUERY_EMBEDDING_CACHE_PATH", ".cache/query_embeddings.sqlite3")
+DEFAULT_QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+DEFAULT_CONTENT_CACHE_PATH = os.getenv("INGEST_EMBEDDING_CACHE_PATH", ".cache/ingest_embeddings.sqlite3")
+
+
+def normalize_query_text(text):
+    """Lowercases, trims and collapses whitespace so trivially different questions share a cache entry."""
+    return re.sub(r"\s+", " ", text.strip()).lower()
+
+
+def content_hash(text):
+    """Returns the hex sha256 digest of a document's page_content."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def vector_to_blob(vector):
+    """Packs a vector as float32 bytes."""
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def blob_to_vector(blob):
+    """Unpacks float32 bytes into a list of floats."""
+    return np.frombuffer(blob, dtype=np.float32).tolist()
+
+
+def embedding_model_name(embeddings):
+    """
+    Returns the model name of a LangChain embeddings object, used as part of cache keys.
+    A custom base URL (e.g. the local stand-in server) is appended, so its vectors
+    never mix with vectors from the real API.
+    """
+    name = getattr(embeddings, "model", None) or type(embeddings).__name__
+    base_url = getattr(embeddings, "openai_api_base", None)
+    return f"{name}@{base_url}" if base_url else name
+
+
+def embedding_dimensions(embeddings):
+    """Returns the requested output dimensions of an embeddings object, or 0 for the model default."""
+    return getattr(embeddings, "dimensions", None) or 0
+
+
+class QueryEmbeddingCache:
+    """
+    SQLite cache of query embeddings with size-based LRU eviction.
+
+    Parameters:
+    path (str): Path to the SQLite database file.
+    max_bytes (int): Maximum total size of stored vectors before the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_QUERY_CACHE_PATH, max_bytes=DEFAULT_QUERY_CACHE_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS query_embeddings (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, dimensions, text)
+            )"""
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS query_embeddings_last_used ON query_embeddings (last_used)")
+        self._connection.commit()
+        self._total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM query_embeddings").fetchone()[0]
+
+    def get(self, model, dimensions, text):
+        """Returns the cached vector for a normalized text, or None on a miss."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND dimensions = ? AND text = ?",
+                (model, dimensions, text)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute(
+                "UPDATE query_embeddings SET last_used = ? WHERE model = ? AND dimensions = ? AND text = ?",
+                (time.time(), model, dimensions, text)
+            )
+            self._connection.commit()
+            return blob_to_vector(row[0])
+
+    def put(self, model, dimensions, text, vector):
+        """Stores a vector for a normalized text and evicts old entries if the cache is over max_bytes."""
+        blob = vector_to_blob(vector)
+        with self._lock:
+            previous = self._connection.execute(
+                "SELECT size FROM query_embeddings WHERE model = ? AND dimensions = ? AND text = ?",
+                (model, dimensions, text)
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, dimensions, text, vector, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (model, dimensions, text, blob, len(blob), time.time())
+            )
+            self._total_bytes += len(blob) - (previous[0] if previous else 0)
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """Deletes least recently used entries until the cache is within max_bytes."""
+        while self._total_bytes > self.max_bytes:
+            rows = self._connection.execute(
+                "SELECT rowid, size FROM query_embeddings ORDER BY last_used LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for rowid, size in rows:
+                self._connection.execute("DELETE FROM query_embeddings WHERE rowid = ?", (rowid,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self):
+        """Returns hit/miss counters and the current size of the cache."""
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": self._total_bytes
+        }
+
+    def clear(self):
+        """Deletes every cached entry."""
+        with self._lock:
+            self._connection.execute("DELETE FROM query_embeddings")
+            self._connection.commit()
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain Embeddings object so embed_query() is served from a QueryEmbeddingCache.
+    Document embeddings are passed straight through to the wrapped object.
+
+    Parameters:
+    embeddings (Embeddings): The embeddings object to wrap (e.g. OpenAIEmbeddings).
+    cache (QueryEmbeddingCache): The cache to read from and write to.
+    bypass (bool): If True, always call the wrapped object and leave the cache untouched.
+    """
+
+    def __init__(self, embeddings, cache, bypass=False):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.bypass = bypass
+        self.model = embedding_model_name(embeddings)
+        self.dimensions = embedding_dimensions(embeddings)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        if self.bypass:
+            return self.embeddings.embed_query(text)
+        key = normalize_query_text(text)
+        vector = self.cache.get(self.model, self.dimensions, key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(self.model, self.dimensions, key, vector)
+        return vector
+
+    def embed_queries(self, texts):
+        """
+        Embeds many queries at once. Cached vectors are reused and every miss
+        is sent to the wrapped object in a single embed_documents() call.
+        """
+        if self.bypass:
+            return self.embeddings.embed_documents(list(texts))
+        keys = [normalize_query_text(text) for text in texts]
+        vectors = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            vector = self.cache.get(self.model, self.dimensions, key)
+            if vector is None:
+                missing[key] = text
+            else:
+                vectors[key] = vector
+        if missing:
+            for key, vector in zip(missing, self.embeddings.embed_documents(list(missing.values()))):
+                self.cache.put(self.model, self.dimensions, key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
+
+
+class ContentEmbeddingCache:
+    """
+    SQLite cache of document embeddings keyed by (model, dimensions, sha256(page_content)).
+
+    Parameters:
+    path (str): Path to the SQLite database file.
+    """
+
+    # SQLite limits the number of bound parameters per statement.
+    LOOKUP_CHUNK = 500
+
+    def __init__(self, path=DEFAULT_CONTENT_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS content_embeddings (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, dimensions, content_hash)
+            )"""
+        )
+        self._connection.commit()
+
+    def get_many(self, model, dimensions, hashes):
+        """Returns a dict of content_hash -> vector for the hashes that are cached."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique), self.LOOKUP_CHUNK):
+                chunk = unique[i:i + self.LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT content_hash, vector FROM content_embeddings "
+                    f"WHERE model = ? AND dimensions = ? AND content_hash IN ({placeholders})",
+                    (model, dimensions, *chunk)
+                ).fetchall()
+                for digest, blob in rows:
+                    found[digest] = blob_to_vector(blob)
+        self.hits += sum(1 for digest in hashes if digest in found)
+        self.misses += sum(1 for digest in hashes if digest not in found)
+        return found
+
+    def put_many(self, model, dimensions, items):
+        """Stores (content_hash, vector) pairs."""
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO content_embeddings (model, dimensions, content_hash, vector) VALUES (?, ?, ?, ?)",
+                [(model, dimensions, digest, vector_to_blob(vector)) for digest, vector in items]
+            )
+            self._connection.commit()
+
+    def stats(self):
+        """Returns hit/miss counters and the number of cached vectors."""
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM content_embeddings").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def embed_documents_cached(embeddings, texts, cache=None):
+    """
+    Embeds texts, sending only texts missing from the content cache to the embedding API.
+
+    Parameters:
+    embeddings (Embeddings): The embeddings object used for cache misses.
+    texts (list): The page_content strings to embed.
+    cache (ContentEmbeddingCache): The cache to consult, or None to embed everything.
+
+    Returns:
+    tuple: (vectors, num_embedded) where vectors is aligned with texts and
+    num_embedded is the number of unique texts sent to the embedding API.
+    """
+    if cache is None:
+        return embeddings.embed_documents(list(texts)), len(texts)
+
+    model = embedding_model_name(embeddings)
+    dimensions = embedding_dimensions(embeddings)
+    hashes = [content_hash(text) for text in texts]
+    found = cache.get_many(model, dimensions, hashes)
+
+    missing = {}
+    for digest, text in zip(hashes, texts):
+        if digest not in found and digest not in missing:
+            missing[digest] = text
+    if missing:
+        new_vectors = embeddings.embed_documents(list(missing.values()))
+        new_items = list(zip(missing.keys(), new_vectors))
+        cache.put_many(model, dimensions, new_items)
+        found.update(new_items)
+
+    return [found[digest] for digest in hashes], len(missing)
@@ -1,86 +1,528 @@
 # This file takes a Chroma vector store as input and exports the embeddings to a JSON file.
+# It can also export a binary, memory-mappable version of the embeddings
+# (a .npy matrix, a JSON Lines file of texts/metadata and a manifest).
+# Either export can optionally be shipped with an IVF ANN index (see ann_index.py)
+# and with int8 / product-quantized copies of its vectors (see quantization.py).
+# With dimensions set, vectors are reduced (Matryoshka truncation or PCA, see
+# dimension_reduction.py) before they are written.
+# It can also split the export into shards by a metadata key or k-means cluster (see sharded_export.py).
 
 import os
 import json
+import time
+import shutil
+import hashlib
 import argparse
+import tempfile
 import numpy as np
 from dotenv import load_dotenv
 from langchain_chroma.vectorstores import Chroma
 from langchain_openai.embeddings import OpenAIEmbeddings
+from ann_index import unit_rows, build_export_index, remove_export_index
+from quantization import QUANTIZATION_KINDS, build_export_quantization, remove_export_quantization
+from dimension_reduction import fit_reduction, reservoir_sample, reduction_directory_for, remove_export_reduction
+from sharded_export import (SHARD_KEYS, DEFAULT_MAX_SHARDS, DEFAULT_PAGE_RANGE, ShardWriter,
+                            count_shard_values, fit_shard_centroids, plan_metadata_shards, shard_value)
 
-def export_json(vectorstore_path, persona, output_name="embeddings.json"):
+# File names used inside a binary export directory.
+BINARY_MATRIX_FILE = "embeddings.npy"
+BINARY_RECORDS_FILE = "records.jsonl"
+BINARY_MANIFEST_FILE = "manifest.json"
+BINARY_FORMAT_VERSION = 1
+
+# Number of records read from Chroma per page when exporting.
+DEFAULT_PAGE_SIZE = 1000
+
+
+def load_collection(vectorstore_path, persona):
     """
-    Exports the embeddings from a Chroma vector store to a JSON file.
+    Opens a persisted Chroma vector store and returns its underlying collection.
 
     Parameters:
         vectorstore_path (str): Path to the Chroma vector store.
-        output_file (str): Path to the output JSON file.
+        persona (str): Used to identify the vector store collection.
+
+    Returns:
+        collection: The chromadb Collection object for the persona.
     """
     # 1. Load API key from .env
     load_dotenv()
     openai_api_key = os.getenv("OPENAI_API_KEY")
 
     # 2. Define the embedding function and load the vectorstore.
-    embeddings = OpenAIEmbeddings(api_key=openai_api_key)
+    embeddings = OpenAIEmbeddings(api_key=openai_api_key, base_url=os.getenv("OPENAI_BASE_URL"))
     vectorstore = Chroma(
         persist_directory=vectorstore_path,
         collection_name=persona,
         embedding_function=embeddings
         )
 
-    # 3. Retrieve all documents and their embeddings
-    collection = vectorstore._collection
-    results = collection.get(include=["documents", "embeddings", "metadatas"])
+    return vectorstore._collection
 
-    # 4. Format data for JSON export in the format expected by the edge function
-    output = {
-        "embeddings": [],
-        "texts": [],
-        "metadata": []
-    }
 
-    for doc_id, doc, embedding, metadata in zip(
-        results['ids'],
-        results['documents'],
-        results['embeddings'],
-        results['metadatas']
-        ):
-        # Convert to float16 and round to 3 decimal places for size reduction
-        embedding_array = np.array(embedding, dtype=np.float32)
-        embedding_16 = embedding_array.astype(np.float16)
-        output["embeddings"].append([round(float(val), 3) for val in embedding_16])
-        output["texts"].append(doc)
-        output["metadata"].append(metadata or {})
-
-    # 5. Save to JSON file
+def default_embedding_model():
+    """Returns the model name of the OpenAIEmbeddings the Chroma vector stores are built with."""
+    load_dotenv()
+    return OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL")).model
+
+
+def fit_export_reduction(collection, dimensions, embedding_model=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Fits the dimension reduction of an export on a random sample of the collection's embeddings.
+
+    Parameters:
+        collection: The chromadb Collection object.
+        dimensions (int): The reduced dimensionality.
+        embedding_model (str): The model the collection was embedded with. Defaults to default_embedding_model().
+        page_size (int): Number of records read from Chroma per page.
+
+    Returns:
+        DimensionReduction: The fitted reduction (see dimension_reduction.py).
+    """
+    pages = (page["embeddings"] for page in iter_collection_pages(collection, page_size, include=("embeddings",)))
+    return fit_reduction(reservoir_sample(pages), dimensions, embedding_model or default_embedding_model())
+
+
+def save_export_reduction(export_path, reduction):
+    """Saves the reduction next to an export, or removes a stale one if the export is full-dimension."""
+    if reduction is None:
+        remove_export_reduction(export_path)
+    else:
+        reduction.save(reduction_directory_for(export_path))
+
+
+def iter_collection_pages(collection, page_size=DEFAULT_PAGE_SIZE, include=("documents", "embeddings", "metadatas")):
+    """
+    Pages through a Chroma collection with limit/offset so only one page is in memory at a time.
+
+    Parameters:
+        collection: The chromadb Collection object.
+        page_size (int): Number of records to request per page.
+        include (tuple): Fields to include in each page.
+
+    Yields:
+        dict: The result of collection.get() for each non-empty page.
+    """
+    offset = 0
+    while True:
+        page = collection.get(include=list(include), limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        yield page
+        offset += len(page["ids"])
+        if len(page["ids"]) < page_size:
+            break
+
+
+def export_json(vectorstore_path, persona, output_name="embeddings.json", page_size=DEFAULT_PAGE_SIZE, ann_index=False, nlist=None,
+                quantization=(), dimensions=None, embedding_model=None):
+    """
+    Exports the embeddings from a Chroma vector store to a JSON file.
+
+    The collection is read page by page and each page is written to the output
+    as soon as it arrives, so peak memory is bounded by page_size rather than
+    the size of the collection. Texts and metadata are spooled to temporary
+    files and appended after the embeddings, keeping the
+    {"embeddings": [...], "texts": [...], "metadata": [...]} layout expected by the edge function.
+
+    Parameters:
+        vectorstore_path (str): Path to the Chroma vector store.
+        persona (str): Used to identify the vector store collection.
+        output_name (str): Name of the output JSON file.
+        page_size (int): Number of records read from Chroma per page.
+        ann_index (bool): Also build an IVF index next to the file (<name>_ivf).
+        nlist (int): Number of IVF lists. Defaults to about 4 * sqrt(count).
+        quantization (tuple): Quantized copies to write next to the file (<name>_int8, <name>_pq).
+            For the index and quantization the exported float16 vectors are kept in memory,
+            so memory is no longer bounded by page_size.
+        dimensions (int): Reduce the vectors to this many dimensions. The reduction is saved
+            next to the file (<name>_reduction) and recorded under "reduction" in the JSON.
+        embedding_model (str): The model the collection was embedded with, which selects
+            truncation (text-embedding-3) or PCA. Defaults to default_embedding_model().
+    """
+    # 1-2. Load the vectorstore collection.
+    collection = load_collection(vectorstore_path, persona)
+    reduction = fit_export_reduction(collection, dimensions, embedding_model, page_size) if dimensions else None
+
+    # 3-5. Stream documents and embeddings page by page into the JSON file.
     output_location = f"{vectorstore_path}/{output_name}"
-    with open(output_location, "w") as f:
-        json.dump(output, f, indent=2)
+    count = 0
+    index_pages = []
+    with open(output_location, "w") as f, \
+            tempfile.TemporaryFile("w+", encoding="utf-8", dir=vectorstore_path) as texts_spool, \
+            tempfile.TemporaryFile("w+", encoding="utf-8", dir=vectorstore_path) as metadata_spool:
+        f.write('{"embeddings": [')
+        for page in iter_collection_pages(collection, page_size):
+            # Convert to float16 and round to 3 decimal places for size reduction
+            vectors = np.asarray(page["embeddings"], dtype=np.float32)
+            if reduction is not None:
+                vectors = reduction.apply(vectors)
+            page_16 = vectors.astype(np.float16)
+            if ann_index or quantization:
+                index_pages.append(page_16.round(3))
+            for embedding_16, doc, metadata in zip(page_16, page["documents"], page["metadatas"]):
+                separator = "," if count else ""
+                f.write(separator + json.dumps([round(float(val), 3) for val in embedding_16]))
+                texts_spool.write(separator + json.dumps(doc))
+                metadata_spool.write(separator + json.dumps(metadata or {}))
+                count += 1
+
+        f.write('], "texts": [')
+        texts_spool.seek(0)
+        shutil.copyfileobj(texts_spool, f)
+        f.write('], "metadata": [')
+        metadata_spool.seek(0)
+        shutil.copyfileobj(metadata_spool, f)
+        if reduction is not None:
+            f.write('], "reduction": ' + json.dumps(reduction.meta) + "}")
+        else:
+            f.write("]}")
 
     # debugging output
     print(f"Embeddings exported to {output_location} as {output_name}")
-    print(f"Exported {len(output['embeddings'])} embeddings, {len(output['texts'])} texts")
+    print(f"Exported {count} embeddings, {count} texts")
+
+    # 6. Optionally build the ANN index and quantized copies of the exported (rounded) vectors.
+    save_export_reduction(output_location, reduction)
+    exported = np.concatenate(index_pages) if index_pages else None
+    if ann_index and exported is not None:
+        build_export_index(output_location, exported, nlist)
+    else:
+        remove_export_index(output_location)
+    remove_export_quantization(output_location, keep=quantization)
+    if quantization and exported is not None:
+        build_export_quantization(output_location, quantization, exported)
 
     return "EXPORT PROCESS COMPLETE"
 
 
+def export_shards(vectorstore_path, persona, shard_by, output_name="shards", max_shards=DEFAULT_MAX_SHARDS,
+                  page_range=DEFAULT_PAGE_RANGE, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Exports the embeddings from a Chroma vector store as shards in the embeddings.json layout,
+    plus a shards.json manifest with each shard's size, key values and centroid.
+
+    Parameters:
+        vectorstore_path (str): Path to the Chroma vector store.
+        persona (str): Used to identify the vector store collection.
+        shard_by (str): "character", "type", "source", "book", "page" or "kmeans".
+        output_name (str): Name of the output directory (created inside vectorstore_path).
+        max_shards (int): Maximum number of shards (the number of clusters for "kmeans").
+        page_range (int): Pages per shard for "page".
+        page_size (int): Number of records read from Chroma per page.
+
+    Returns:
+        str: Path to the shards directory.
+    """
+    if shard_by not in SHARD_KEYS:
+        raise ValueError(f"Unsupported shard key. Please use one of {', '.join(SHARD_KEYS)}.")
+
+    # 1-2. Load the vectorstore collection.
+    collection = load_collection(vectorstore_path, persona)
+
+    # 3. Plan the shards: key values from a metadata-only pass, or k-means centroids from a sample.
+    if shard_by == "kmeans":
+        pages = (page["embeddings"] for page in iter_collection_pages(collection, page_size, include=("embeddings",)))
+        centroids = fit_shard_centroids(reservoir_sample(pages), max_shards)
+    else:
+        metadatas = (metadata for page in iter_collection_pages(collection, page_size, include=("metadatas",))
+                     for metadata in page["metadatas"])
+        plan = plan_metadata_shards(count_shard_values(metadatas, shard_by, page_range), max_shards)
+
+    # 4. Stream every record into its shard, then write the shard files and the manifest.
+    writer = ShardWriter(os.path.join(vectorstore_path, output_name))
+    for page in iter_collection_pages(collection, page_size):
+        vectors = np.asarray(page["embeddings"], dtype=np.float32)
+        if shard_by == "kmeans":
+            labels = np.argmax(unit_rows(vectors) @ centroids.T, axis=1)
+            for label, vector, doc, metadata in zip(labels, vectors, page["documents"], page["metadatas"]):
+                writer.add(f"cluster_{label:03d}", vector, doc, metadata)
+        else:
+            for vector, doc, metadata in zip(vectors, page["documents"], page["metadatas"]):
+                value = shard_value(metadata or {}, shard_by, page_range)
+                writer.add(plan[value], vector, doc, metadata, value)
+    manifest = writer.finish(persona, shard_by, **({"page_range": page_range} if shard_by == "page" else {}))
+
+    # debugging output
+    largest = max(entry["count"] for entry in manifest["shards"])
+    print(f"Embeddings exported to {writer.directory} as {len(manifest['shards'])} shards by {shard_by}")
+    print(f"Exported {manifest['count']} embeddings, largest shard {largest}")
+
+    return writer.directory
+
+
+def sha256_file(file_path, chunk_size=1 << 20):
+    """Returns the hex sha256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_binary(vectorstore_path, persona, output_name="embeddings", dtype="float16", page_size=DEFAULT_PAGE_SIZE,
+                  ann_index=False, nlist=None, quantization=(), dimensions=None, embedding_model=None):
+    """
+    Exports the embeddings from a Chroma vector store to a binary directory.
+
+    The directory contains:
+        embeddings.npy: a contiguous (count, dimension) matrix in .npy format.
+        records.jsonl:  one compact JSON object per row with "id", "text" and "metadata".
+        manifest.json:  dimension, count, dtype and sha256 checksums of both files.
+
+    The matrix is preallocated on disk as a memory-mapped .npy file and filled
+    page by page, so peak memory is bounded by page_size.
+
+    Parameters:
+        vectorstore_path (str): Path to the Chroma vector store.
+        persona (str): Used to identify the vector store collection.
+        output_name (str): Name of the output directory (created inside vectorstore_path).
+        dtype (str): Storage dtype for the matrix, "float16" or "float32".
+        page_size (int): Number of records read from Chroma per page.
+        ann_index (bool): Also build an IVF index in an "ivf_index" directory inside the export.
+        nlist (int): Number of IVF lists. Defaults to about 4 * sqrt(count).
+        quantization (tuple): Quantized copies to write inside the export ("int8", "pq").
+        dimensions (int): Reduce the vectors to this many dimensions. The reduction is saved in a
+            "reduction" directory inside the export and recorded in the manifest.
+        embedding_model (str): The model the collection was embedded with (see export_json()).
+
+    Returns:
+        str: Path to the export directory.
+    """
+    if dtype not in ("float16", "float32"):
+        raise ValueError("Unsupported dtype. Please use 'float16' or 'float32'.")
+
+    # 1-2. Load the vectorstore collection.
+    collection = load_collection(vectorstore_path, persona)
+
+    # 3. Determine the matrix shape from the collection size and the first embedding.
+    count = collection.count()
+    first = collection.get(include=["embeddings"], limit=1)
+    # An empty collection gives an empty (0, 0) matrix and a manifest with count 0, as export_json() writes empty arrays.
+    if not first["ids"]:
+        print(f"⚠️ Collection '{persona}' in {vectorstore_path} is empty, writing an empty export.")
+    dimension = len(first["embeddings"][0]) if first["ids"] else 0
+    reduction = fit_export_reduction(collection, dimensions, embedding_model, page_size) if dimensions and count else None
+    if reduction is not None:
+        dimension = reduction.dimension
+
+    # 4. Stream pages into the matrix and records files, then write the manifest.
+    output_directory = os.path.join(vectorstore_path, output_name)
+    os.makedirs(output_directory, exist_ok=True)
+
+    matrix_path = os.path.join(output_directory, BINARY_MATRIX_FILE)
+    records_path = os.path.join(output_directory, BINARY_RECORDS_FILE)
+    matrix = np.lib.format.open_memmap(matrix_path, mode="w+", dtype=dtype, shape=(count, dimension))
+    row = 0
+    with open(records_path, "w", encoding="utf-8") as f:
+        for page in iter_collection_pages(collection, page_size):
+            page_rows = len(page["ids"])
+            if row + page_rows > count:
+                raise ValueError("❌ Collection grew during export. Please re-run the export.")
+            vectors = np.asarray(page["embeddings"], dtype=np.float32)
+            matrix[row:row + page_rows] = vectors if reduction is None else reduction.apply(vectors)
+            for doc_id, doc, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                record = {"id": doc_id, "text": doc, "metadata": metadata or {}}
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            row += page_rows
+    matrix.flush()
+    del matrix
+
+    if row != count:
+        raise ValueError(f"❌ Exported {row} rows but the collection reported {count}. Please re-run the export.")
+
+    if reduction is None:
+        write_binary_manifest(output_directory, persona, count, dimension, dtype)
+    else:
+        write_binary_manifest(output_directory, persona, count, dimension, dtype, reduction=reduction.meta)
+    save_export_reduction(output_directory, reduction)
+
+    # debugging output
+    print(f"Embeddings exported to {output_directory} in binary format ({dtype})")
+    print(f"Exported {count} embeddings of dimension {dimension}")
+
+    # 5. Optionally build the ANN index and quantized copies from the memory-mapped matrix.
+    if ann_index and count:
+        build_export_index(output_directory, np.load(matrix_path, mmap_mode="r"), nlist)
+    else:
+        remove_export_index(output_directory)
+    remove_export_quantization(output_directory, keep=quantization if count else ())
+    if quantization and count:
+        build_export_quantization(output_directory, quantization, np.load(matrix_path, mmap_mode="r"))
+
+    return output_directory
+
+
+def write_binary_manifest(output_directory, persona, count, dimension, dtype, **extra):
+    """
+    Writes manifest.json for a binary export directory and returns the manifest dict.
+    Any keyword arguments are stored as additional top level manifest entries.
+    """
+    matrix_path = os.path.join(output_directory, BINARY_MATRIX_FILE)
+    records_path = os.path.join(output_directory, BINARY_RECORDS_FILE)
+    manifest = {
+        "format_version": BINARY_FORMAT_VERSION,
+        "persona": persona,
+        "count": int(count),
+        "dimension": int(dimension),
+        "dtype": dtype,
+        "matrix_file": BINARY_MATRIX_FILE,
+        "records_file": BINARY_RECORDS_FILE,
+        "checksum": {
+            "algorithm": "sha256",
+            "matrix": sha256_file(matrix_path),
+            "records": sha256_file(records_path)
+        }
+    }
+    manifest.update(extra)
+    with open(os.path.join(output_directory, BINARY_MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_binary_export(export_directory, mmap=True, verify=False):
+    """
+    Loads a binary export created by export_binary().
+
+    Parameters:
+        export_directory (str): Path to the binary export directory.
+        mmap (bool): Memory-map the matrix read-only instead of reading it into memory.
+        verify (bool): Recompute the sha256 checksums and compare them to the manifest.
+
+    Returns:
+        tuple: (matrix, texts, metadatas, manifest)
+    """
+    with open(os.path.join(export_directory, BINARY_MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+
+    matrix_path = os.path.join(export_directory, manifest["matrix_file"])
+    records_path = os.path.join(export_directory, manifest["records_file"])
+
+    if verify:
+        checksum = manifest["checksum"]
+        if sha256_file(matrix_path) != checksum["matrix"]:
+            raise ValueError(f"❌ Checksum mismatch for {matrix_path}.")
+        if sha256_file(records_path) != checksum["records"]:
+            raise ValueError(f"❌ Checksum mismatch for {records_path}.")
+
+    matrix = np.load(matrix_path, mmap_mode="r" if mmap else None)
+    if matrix.shape != (manifest["count"], manifest["dimension"]):
+        raise ValueError(f"❌ Matrix shape {matrix.shape} does not match the manifest.")
+
+    texts = []
+    metadatas = []
+    with open(records_path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            texts.append(record["text"])
+            metadatas.append(record["metadata"])
+
+    return matrix, texts, metadatas, manifest
+
+
+def compare_export_formats(json_path, binary_directory):
+    """
+    Prints a size and load time comparison between a JSON export and a binary export.
+
+    Parameters:
+        json_path (str): Path to the JSON export file (e.g. embeddings.json).
+        binary_directory (str): Path to the binary export directory.
+
+    Returns:
+        dict: The measured sizes (bytes) and load times (seconds).
+    """
+    json_size = os.path.getsize(json_path)
+    binary_size = sum(
+        os.path.getsize(os.path.join(binary_directory, name))
+        for name in (BINARY_MATRIX_FILE, BINARY_RECORDS_FILE, BINARY_MANIFEST_FILE)
+    )
+
+    start = time.perf_counter()
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    json_matrix = np.asarray(data["embeddings"], dtype=np.float32)
+    json_load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix, texts, metadatas, manifest = load_binary_export(binary_directory, mmap=True)
+    binary_load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _ = np.asarray(matrix, dtype=np.float32)
+    binary_materialize_time = time.perf_counter() - start
+
+    comparison = {
+        "json_bytes": json_size,
+        "binary_bytes": binary_size,
+        "json_load_seconds": json_load_time,
+        "binary_mmap_load_seconds": binary_load_time,
+        "binary_float32_materialize_seconds": binary_materialize_time,
+        "count": int(json_matrix.shape[0])
+    }
+
+    print("=== EXPORT FORMAT COMPARISON ===")
+    print(f"Vectors: {comparison['count']}")
+    print(f"JSON size:   {json_size / 1e6:.2f} MB")
+    print(f"Binary size: {binary_size / 1e6:.2f} MB ({binary_size / max(json_size, 1):.1%} of JSON)")
+    print(f"JSON load (json.load + to float32): {json_load_time:.3f}s")
+    print(f"Binary load (mmap + records):       {binary_load_time:.3f}s")
+    print(f"Binary materialize to float32:      {binary_materialize_time:.3f}s")
+    print("================================")
+
+    return comparison
+
+
 if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser()
     parser.add_argument("vectorstore_path", help="The path to the Chroma vector store.")
     parser.add_argument("persona", type=str, help="Used to identify the vector store collection.")
     parser.add_argument("--output_name", type=str, default="embeddings.json", help="The name of the output JSON file.")
+    parser.add_argument("--format", type=str, default="json", choices=["json", "binary", "both"], help="The export format.")
+    parser.add_argument("--binary_name", type=str, default="embeddings", help="The name of the binary export directory.")
+    parser.add_argument("--dtype", type=str, default="float16", choices=["float16", "float32"], help="The dtype of the binary matrix.")
+    parser.add_argument("--page_size", type=int, default=DEFAULT_PAGE_SIZE, help="Number of records read from Chroma per page.")
+    parser.add_argument("--ann_index", action="store_true", help="Also build an IVF ANN index next to each export (see ann_index.py).")
+    parser.add_argument("--nlist", type=int, default=None, help="Number of IVF lists (default: about 4 * sqrt(count)).")
+    parser.add_argument("--quantize", nargs="+", default=[], choices=QUANTIZATION_KINDS, help="Also write quantized copies of each export (see quantization.py).")
+    parser.add_argument("--dimensions", type=int, default=None, help="Reduce the exported vectors to this many dimensions (see dimension_reduction.py).")
+    parser.add_argument("--embedding_model", type=str, default=None, help="The model the collection was embedded with (default: the OpenAIEmbeddings default).")
+    parser.add_argument("--shard_by", type=str, default=None, choices=SHARD_KEYS, help="Also export shards split by this key (see sharded_export.py).")
+    parser.add_argument("--max_shards", type=int, default=DEFAULT_MAX_SHARDS, help="Maximum number of shards (clusters for kmeans).")
+    parser.add_argument("--page_range", type=int, default=DEFAULT_PAGE_RANGE, help="Pages per shard when sharding by page.")
+    parser.add_argument("--shards_name", type=str, default="shards", help="The name of the shards directory.")
+    parser.add_argument("--compare", action="store_true", help="Compare size and load time of the JSON and binary exports.")
     args = parser.parse_args()
 
-    # Print the export details
-    print(f"Exporting vectorstore located at {args.vectorstore_path} in collection {args.persona} to JSON file named {args.output_name}...")
+    if args.format in ("json", "both"):
+        # Print the export details
+        print(f"Exporting vectorstore located at {args.vectorstore_path} in collection {args.persona} to JSON file named {args.output_name}...")
+
+        # Export the vector store to JSON.
+        result = export_json(args.vectorstore_path, args.persona, args.output_name, args.page_size,
+                             args.ann_index, args.nlist, args.quantize, args.dimensions, args.embedding_model)
 
-    # Export the vector store to JSON.
-    result = export_json(args.vectorstore_path, args.persona, args.output_name)
+        # Compress the JSON file to reduce size.
+        print(f"Compressing {args.vectorstore_path}/{args.output_name} to reduce size...")
+        os.system(f"gzip -k {args.vectorstore_path}/{args.output_name}")
 
-    # Compress the JSON file to reduce size.
-    print(f"Compressing {args.vectorstore_path}/{args.output_name} to reduce size...")
-    os.system(f"gzip -k {args.vectorstore_path}/{args.output_name}")
+        # Print the results
+        print(f"\n--- {result} ---")
 
-    # Print the results
-    print(f"\n--- {result} ---")
+    if args.format in ("binary", "both"):
+        print(f"Exporting vectorstore located at {args.vectorstore_path} in collection {args.persona} to binary directory named {args.binary_name}...")
+        binary_directory = export_binary(args.vectorstore_path, args.persona, args.binary_name, args.dtype, args.page_size,
+                                         args.ann_index, args.nlist, args.quantize, args.dimensions, args.embedding_model)
+        print(f"\n--- BINARY EXPORT COMPLETE: {binary_directory} ---")
+
+    if args.shard_by:
+        print(f"Exporting vectorstore located at {args.vectorstore_path} in collection {args.persona} as shards by {args.shard_by}...")
+        shards_directory = export_shards(args.vectorstore_path, args.persona, args.shard_by, args.shards_name,
+                                         args.max_shards, args.page_range, args.page_size)
+        print(f"\n--- SHARDED EXPORT COMPLETE: {shards_directory} ---")
+
+    if args.compare:
+        compare_export_formats(
+            os.path.join(args.vectorstore_path, args.output_name),
+            os.path.join(args.vectorstore_path, args.binary_name)
+        )
@@ -6,8 +6,66 @@
 
 import re
 import os
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
 from langchain_core.documents import Document
-from langchain_community.document_loaders import PyPDFLoader, CSVLoader
+
+class ReadProgress:
+    """
+    Tracks how far a streaming parser has read through its source file.
+    Used for progress reporting when the number of documents is not known up front.
+
+    Parameters:
+    file_path (str): The path to the source file.
+    """
+
+    def __init__(self, file_path):
+        self.total_bytes = os.path.getsize(file_path)
+        self.bytes_read = 0
+
+
+def counting_lines(f, progress=None):
+    """Yields lines from a text file object, adding their encoded size to progress.bytes_read."""
+    for line in f:
+        if progress is not None:
+            progress.bytes_read += len(line.encode(f.encoding or "utf-8"))
+        yield line
+
+
+def iter_docs_from_csv(file_path, progress=None):
+    """
+    Lazily generates LangChain Document objects from a CSV file, one row at a time.
+    The CSV file is expected to have two columns: 'character' and 'dialogue'.
+    The 'dialogue' column is used as the page_content, and 'character' as metadata.
+
+    Parameters:
+    file_path (str): The path to the CSV file.
+    progress (ReadProgress): Optional, updated with the number of bytes read.
+
+    Yields:
+    Document: LangChain Document objects with sequential doc_ids.
+    """
+    metadata_columns = ["character"]
+    with open(file_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(counting_lines(f, progress))
+        for row_index, row in enumerate(reader):
+            # Format the content columns as "column: value" lines, as LangChain's CSVLoader does,
+            # then strip the 'dialogue: ' prefix.
+            content = "\n".join(
+                f"{k.strip() if k is not None else k}: {v.strip() if isinstance(v, str) else v}"
+                for k, v in row.items()
+                if k not in metadata_columns
+            )
+            prefix = "dialogue: "
+            if content.startswith(prefix):
+                content = content[len(prefix):]
+            metadata = {"source": file_path, "row": row_index}
+            for column in metadata_columns:
+                metadata[column] = row[column]
+            metadata["doc_id"] = row_index + 1
+            yield Document(page_content=content, metadata=metadata)
+
 
 def generate_docs_from_csv(file_path):
     """
@@ -22,30 +80,7 @@ def generate_docs_from_csv(file_path):
     Returns:
     documents (list): A list of LangChain Document objects created from the CSV data.
     """
-
-    # Load the CSV file.
-    # The 'dialogue' column is used as the source text, and 'character' as metadata.
-    loader = CSVLoader(
-        file_path=file_path,
-        metadata_columns=["character"]
-        )
-
-    # Create LangChain Document objects, then post process.
-    # Post Process: update source metadata and strip prefixes in dialogue.
-    documents = loader.load()
-    count_doc = 1
-    for doc in documents:
-        doc.metadata["source"] = file_path
-        doc.metadata["doc_id"] = count_doc
-        prefix = "dialogue: "
-        if doc.page_content.startswith(prefix):
-            doc.page_content = doc.page_content[len(prefix):]
-        # Remove the 'source'  and 'row' fields to reduce metadata size.
-        # if "source" in doc.metadata:
-        #     del doc.metadata["source"]
-        # if "row" in doc.metadata:
-        #     del doc.metadata["row"]
-        count_doc += 1
+    documents = list(iter_docs_from_csv(file_path))
 
     # Describe the loaded documents.
     print(f"Generated {len(documents)} documents from the CSV file.")
@@ -63,48 +98,63 @@ def generate_docs_from_csv(file_path):
 
     return documents
 
-def generate_docs_from_txt(file_path):
+def iter_docs_from_txt(file_path, progress=None):
     """
-    Parses a text file to create LangChain Document objects.
-    For specifically, it expects the first line to be a version label,
-    and subsequent lines to contain dialogue with verse references.
+    Lazily parses a text file into LangChain Document objects, one line at a time.
+    The first non-empty line is the version label, used as the "source" metadata,
+    and subsequent lines contain dialogue with verse references.
 
     Parameters:
     file_path (str): The path to the text file.
-    Returns:
-    documents (list): A list of LangChain Document objects created from
-    the text file."""
+    progress (ReadProgress): Optional, updated with the number of bytes read.
 
-    documents = []
+    Yields:
+    Document: LangChain Document objects with sequential doc_ids.
+    """
+    source_line = None
+    count_doc = 1
 
     with open(file_path, "r", encoding="utf-8") as f:
-        lines = [line.strip() for line in f if line.strip()]
+        for line in counting_lines(f, progress):
+            line = line.strip()
+            if not line:
+                continue
 
-    if not lines:
-        return []
+            # First line is the source label, subsequent lines are content.
+            if source_line is None:
+                source_line = line
+                continue
 
-    # First line is the source label, subsequent lines are content.
-    source_line = lines[0]
-    content_lines = lines[1:]
-    count_doc = 1
+            # Extract verse reference (before first tab)
+            if "\t" in line:
+                verse_ref = line.split("\t")[0]
+            else:
+                verse_ref = "Unknown"
 
-    for line in content_lines:
-        # Extract verse reference (before first tab)
-        if "\t" in line:
-            verse_ref = line.split("\t")[0]
-        else:
-            verse_ref = "Unknown"
+            yield Document(
+                page_content=line,
+                metadata={
+                    "source": source_line,
+                    "verse": verse_ref,
+                    "doc_id": count_doc
+                }
+            )
+
+            count_doc += 1
+
+def generate_docs_from_txt(file_path):
+    """
+    Parses a text file to create LangChain Document objects.
+    For specifically, it expects the first line to be a version label,
+    and subsequent lines to contain dialogue with verse references.
 
-        documents.append(Document(
-            page_content=line,
-            metadata={
-                "source": source_line,
-                "verse": verse_ref,
-                "doc_id": count_doc
-            }
-        ))
+    Parameters:
+    file_path (str): The path to the text file.
+    Returns:
+    documents (list): A list of LangChain Document objects created from
+    the text file."""
 
-        count_doc += 1
+    documents = list(iter_docs_from_txt(file_path))
 
     # Describe the loaded documents.
     print(f"Generated {len(documents)} documents from the Text file.")
@@ -116,32 +166,29 @@ def generate_docs_from_txt(file_path):
 
     return documents
 
-def generate_docs_from_pdf(file_path):
-    """
-    Parses a PDF file to create LangChain Document objects.
+# Regular expressions for scene headings and character lines.
+SCENE_HEADING_PATTERN = re.compile(r'^(INT\.|EXT\.|EST\.)(.*)', re.IGNORECASE)
+CHARACTER_VOICE_PATTERN = re.compile(r'^([A-Z][A-Z0-9 \-\.]+?)(?:\s*\((V\.O\.|O\.S\.)\))?$')
 
-    Parameters:
-    file_path (str): The path to the PDF file.
 
-    Returns:
-    documents (list): A list of LangChain Document objects created from the PDF file.
+def parse_screenplay_page(text, page_number, file_name):
     """
+    Parses the text of one screenplay page into (page_content, metadata) pairs.
+    The metadata "doc_id" is left as None, callers number documents in page order.
 
-    # Load the PDF file into LangChain Document objects as single pages.
-    loader = PyPDFLoader(file_path)
-    pages = loader.load()
-    file_name = os.path.basename(file_path)
-    print(f"\nLoaded {len(pages)} pages from the PDF file: {file_name}")
+    Every buffer is flushed at the end of the page, so no character or
+    dialogue state carries over between pages and pages can be parsed
+    independently (and in parallel).
 
-    # Initialize variables for parsing.
-    # This will hold the final documents.
-    # Each document will have page_content and metadata.
-    documents = []
-    doc_id = 1
+    Parameters:
+    text (str): The extracted text of the page.
+    page_number (int): The 1-based page number.
+    file_name (str): The PDF file name, stored as the "source" metadata.
 
-    # Regular expressions for scene headings and character lines.
-    scene_heading_pattern = re.compile(r'^(INT\.|EXT\.|EST\.)(.*)', re.IGNORECASE)
-    character_voice_pattern = re.compile(r'^([A-Z][A-Z0-9 \-\.]+?)(?:\s*\((V\.O\.|O\.S\.)\))?$')
+    Returns:
+    records (list): A list of (page_content, metadata) tuples in reading order.
+    """
+    records = []
 
     # Buffers for dialogue and action lines.
     # These will be flushed to documents when a new scene or character is encountered.
@@ -152,96 +199,150 @@ def generate_docs_from_pdf(file_path):
     dialogue_buffer = []
     action_buffer = []
 
+    def metadata_for(doc_type, character, voice_over):
+        return {
+            "source": file_name,
+            "doc_id": None,
+            "page_number": page_number,
+            "type": doc_type,
+            "character": character,
+            "voice_over": voice_over
+        }
+
     # Helper functions to flush buffers to documents.
-    # These functions will create Document objects from the buffered content
+    # These functions will create records from the buffered content
     # and reset the buffers for the next scene or character.
-    def flush_dialogue_buffer(page_number):
-        nonlocal doc_id, dialogue_buffer, current_character, current_voice_over
+    def flush_dialogue_buffer():
+        nonlocal current_character, current_voice_over
         if current_character and dialogue_buffer:
             content = " ".join(dialogue_buffer).strip()
             if content:
-                documents.append(Document(
-                    page_content=content,
-                    metadata={
-                        "source": file_name,
-                        "doc_id": doc_id,
-                        "page_number": page_number,
-                        "type": "dialogue",
-                        "character": current_character,
-                        "voice_over": current_voice_over
-                    }
-                ))
-                doc_id += 1
+                records.append((content, metadata_for("dialogue", current_character, current_voice_over)))
         dialogue_buffer.clear()
         current_character = None
         current_voice_over = False
 
-    def flush_action_buffer(page_number):
-        nonlocal doc_id, action_buffer
+    def flush_action_buffer():
         if action_buffer:
             content = " ".join(action_buffer).strip()
             if content:
-                documents.append(Document(
-                    page_content=content,
-                    metadata={
-                        "source": file_name,
-                        "doc_id": doc_id,
-                        "page_number": page_number,
-                        "type": "action",
-                        "character": "none",
-                        "voice_over": False
-                    }
-                ))
-                doc_id += 1
+                records.append((content, metadata_for("action", "none", False)))
         action_buffer.clear()
 
-    # Process each page in the PDF.
-    # Each page is processed line by line to identify scene headings,
+    # The page is processed line by line to identify scene headings,
     # character lines, dialogue, and action lines.
-    for page_number, page in enumerate(pages, start=1):
-        lines = page.page_content.split("\n")
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+
+        # Scene Heading
+        if SCENE_HEADING_PATTERN.match(line):
+            flush_dialogue_buffer()
+            flush_action_buffer()
+            records.append((line.lower(), metadata_for("scene_heading", "none", False)))
+
+        # Character Line
+        elif CHARACTER_VOICE_PATTERN.match(line):
+            flush_dialogue_buffer()
+            flush_action_buffer()
+            match = CHARACTER_VOICE_PATTERN.match(line)
+            current_character = match.group(1).title()
+            current_voice_over = match.group(2) in ("V.O.", "O.S.") if match.group(2) else False
+
+        # Dialogue Line
+        elif current_character:
+            dialogue_buffer.append(line)
+
+        # Action Line (default)
+        else:
+            flush_dialogue_buffer()
+            action_buffer.append(line)
 
-            # Scene Heading
-            if scene_heading_pattern.match(line):
-                flush_dialogue_buffer(page_number)
-                flush_action_buffer(page_number)
-                documents.append(Document(
-                    page_content=line.lower(),
-                    metadata={
-                        "source": file_name,
-                        "doc_id": doc_id,
-                        "page_number": page_number,
-                        "type": "scene_heading",
-                        "character": "none",
-                        "voice_over": False
-                    }
-                ))
-                doc_id += 1
-
-            # Character Line
-            elif character_voice_pattern.match(line):
-                flush_dialogue_buffer(page_number)
-                flush_action_buffer(page_number)
-                match = character_voice_pattern.match(line)
-                current_character = match.group(1).title()
-                current_voice_over = match.group(2) in ("V.O.", "O.S.") if match.group(2) else False
-
-            # Dialogue Line
-            elif current_character:
-                dialogue_buffer.append(line)
-
-            # Action Line (default)
-            else:
-                flush_dialogue_buffer(page_number)
-                action_buffer.append(line)
+    # End of page flush
+    flush_dialogue_buffer()
+    flush_action_buffer()
+
+    return records
 
-        # End of page flush
-        flush_dialogue_buffer(page_number)
-        flush_action_buffer(page_number)
+
+def iter_pdf_page_texts(file_path, start_page=0, end_page=None):
+    """
+    Yields (page_number, text) for the pages in [start_page, end_page) of a PDF, one page at a time.
+    Text is extracted with pypdf in "plain" mode, the same extraction PyPDFLoader uses.
+    """
+    reader = PdfReader(file_path)
+    end_page = len(reader.pages) if end_page is None else min(end_page, len(reader.pages))
+    for index in range(start_page, end_page):
+        text = reader.pages[index].extract_text(extraction_mode="plain").strip()
+        yield index + 1, text
+
+
+def parse_pdf_page_range(file_path, start_page, end_page):
+    """
+    Parses a range of PDF pages into (page_content, metadata) records.
+    Used as the process pool worker of generate_docs_from_pdf().
+    """
+    file_name = os.path.basename(file_path)
+    records = []
+    for page_number, text in iter_pdf_page_texts(file_path, start_page, end_page):
+        records.extend(parse_screenplay_page(text, page_number, file_name))
+    return records
+
+
+def iter_docs_from_pdf(file_path, progress=None):
+    """
+    Parses a PDF file lazily, yielding LangChain Document objects page by page
+    as they are extracted. Peak memory is tied to one page rather than the whole file.
+
+    Parameters:
+    file_path (str): The path to the PDF file.
+    progress (ReadProgress): Optional, updated with the fraction of the file's bytes covered by parsed pages.
+
+    Yields:
+    Document: LangChain Document objects in reading order with sequential doc_ids.
+    """
+    file_name = os.path.basename(file_path)
+    num_pages = len(PdfReader(file_path).pages) if progress is not None else None
+    doc_id = 1
+    for page_number, text in iter_pdf_page_texts(file_path):
+        for content, metadata in parse_screenplay_page(text, page_number, file_name):
+            metadata["doc_id"] = doc_id
+            doc_id += 1
+            yield Document(page_content=content, metadata=metadata)
+        if progress is not None:
+            progress.bytes_read = progress.total_bytes * page_number // num_pages
+
+
+def generate_docs_from_pdf(file_path, workers=None, pages_per_task=8):
+    """
+    Parses a PDF file to create LangChain Document objects.
+
+    Parameters:
+    file_path (str): The path to the PDF file.
+    workers (int): If greater than 1, parse page ranges in a process pool of this size.
+    pages_per_task (int): Number of pages parsed by each process pool task.
+
+    Returns:
+    documents (list): A list of LangChain Document objects created from the PDF file.
+    """
+    file_name = os.path.basename(file_path)
+
+    if workers and workers > 1:
+        # Parse page ranges in parallel, then stitch them back together in page order.
+        # Pages carry no parser state across boundaries, so only doc_ids need renumbering.
+        num_pages = len(PdfReader(file_path).pages)
+        print(f"\nLoaded {num_pages} pages from the PDF file: {file_name}")
+        ranges = [(start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)]
+        documents = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for records in pool.map(parse_pdf_page_range, [file_path] * len(ranges),
+                                    [start for start, _ in ranges], [end for _, end in ranges]):
+                for content, metadata in records:
+                    metadata["doc_id"] = len(documents) + 1
+                    documents.append(Document(page_content=content, metadata=metadata))
+    else:
+        documents = list(iter_docs_from_pdf(file_path))
 
     print(f"Parsed {len(documents)} LangChain documents from the PDF file: {file_name}\n")
     print("Documents 128-130, page_content and metadata:\n")
@@ -250,3 +351,24 @@ def generate_docs_from_pdf(file_path):
         print(f"Metadata: {doc.metadata}\n")
 
     return documents
+
+
+def iter_docs(file_path, progress=None):
+    """
+    Lazily generates LangChain Document objects from a CSV, TXT or PDF file.
+
+    Parameters:
+    file_path (str): The path to the source file.
+    progress (ReadProgress): Optional, updated as the file is read.
+
+    Returns:
+    iterator: A generator of LangChain Document objects.
+    """
+    if file_path.lower().endswith(".csv"):
+        return iter_docs_from_csv(file_path, progress)
+    elif file_path.lower().endswith(".txt"):
+        return iter_docs_from_txt(file_path, progress)
+    elif file_path.lower().endswith(".pdf"):
+        return iter_docs_from_pdf(file_path, progress)
+    else:
+        raise ValueError("❌ Unsupported file type. Please provide a CSV, TXT, or PDF file.")
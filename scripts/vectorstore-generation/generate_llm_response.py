@@ -1,42 +1,45 @@
 #### This file generates a retriever object from a vector store.
 #### Then generates a prompt using RAG for the llm to send to OpenAI.
 #### Finally, it invokes the RAG chain with a question and gets a response from the llm.
+#### stream_llm_response() returns the response token by token as it is generated,
+#### recording time-to-first-token and tokens per second.
+#### If the query daemon is running (see query_daemon.py) the CLI asks it instead,
+#### otherwise the answer is generated in-process.
 
 import os
-from dotenv import load_dotenv
+import time
+import asyncio
 import argparse
-from langchain_openai.chat_models.base import ChatOpenAI
-from langchain_core.runnables.passthrough import RunnablePassthrough
-from langchain.prompts import ChatPromptTemplate
+from types import SimpleNamespace
 from query_vectorstore import query_vectorstore
-from my_prompts import my_prompt_template
+import daemon_client
+import persona_registry
+import tracing
 
-def generate_llm_response(question, vs_directory, persona, character):
+LLM_MODEL_NAME = "gpt-4o-mini"
+
+def get_llm():
+    """Returns the (cached) LLM client. See store_registry.py."""
+    import store_registry
+    return store_registry.get_chat_model(
+        model_name=LLM_MODEL_NAME,
+        temperature=0.7,
+        max_tokens=500
+        )
+
+def build_rag_prompt(question, vs_directory, persona, character):
     """
-    Generates a response from the LLM based on the vector store and user question.
+    Retrieves context from the vector store and fills in the persona's RAG prompt.
 
     Parameters:
+    question (str): The user's question to ask the LLM.
     vs_directory (str): The directory where the vector store is saved.
     persona (str): The name of the persona for vector store collection and filtering.
-    question (str): The user's question to ask the LLM.
     character (str): The character to filter the vector store by, if applicable.
 
     Returns:
-    str: The response from the LLM.
+    ChatPromptValue: The formatted prompt, ready to send to the LLM.
     """
-
-    # 1. Load API key from .env
-    load_dotenv()
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-
-    # 2. Define LLM
-    llm = ChatOpenAI(
-        model_name="gpt-4o-mini",
-        temperature=0.7,
-        max_tokens=500,
-        api_key=openai_api_key
-        )
-
     # 3. Generate context utilizing retriever querying vector store.
     # This will return a list of Document objects.
     # See query_vectorstore.py for details.
@@ -53,30 +56,149 @@ def generate_llm_response(question, vs_directory, persona, character):
     print(context)
     print("================")
 
-    # 4. Create RAG prompt with context and question placeholders.
-    my_prompt = my_prompt_template(persona)
-    prompt = ChatPromptTemplate.from_template(my_prompt)
+    # 4. Fill in the persona's RAG prompt (compiled once, see persona_registry.py)
+    # with the user's question and the retrieved context.
+    # Personas without a JSON file get a generic prompt instead of an error.
+    with tracing.span("format_prompt", persona=persona):
+        persona_config = persona_registry.get_or_fallback(persona)
+        prompt_value = persona_config.prompt_template.invoke({"question": question, "context": context})
 
     # debugging output
     print("=== PROMPT ===")
-    print(f"\n{my_prompt}\n")
-
-    # 5. RAG Chain:
-    # pass {question} and {context} to prompt → format prompt → LLM
-    rag_chain = (
-        {
-            "question": RunnablePassthrough(),
-            "context": RunnablePassthrough()
-        }
-        | prompt
-        | llm
-    )
+    print(f"\n{persona_config.prompt}\n")
+
+    return prompt_value
+
+@tracing.traced("generate_llm_response")
+def generate_llm_response(question, vs_directory, persona, character):
+    """
+    Generates a response from the LLM based on the vector store and user question.
+
+    Parameters:
+    vs_directory (str): The directory where the vector store is saved.
+    persona (str): The name of the persona for vector store collection and filtering.
+    question (str): The user's question to ask the LLM.
+    character (str): The character to filter the vector store by, if applicable.
+
+    Returns:
+    str: The response from the LLM.
+    """
 
-    # 6. Invoke RAG chain with the user's question and return response to display to the user.
-    response = rag_chain.invoke(question, context=context)
+    # 1-2. Get the (cached) LLM client. See store_registry.py.
+    llm = get_llm()
+
+    # 3-4. Retrieve context and format the RAG prompt.
+    prompt_value = build_rag_prompt(question, vs_directory, persona, character)
+
+    # 5-6. Send the formatted prompt to the LLM and return response to display to the user.
+    with tracing.span("llm_call", model=LLM_MODEL_NAME):
+        response = llm.invoke(prompt_value)
     return response.content
 
+class StreamingResponse:
+    """
+    The LLM response as a stream of tokens. Iterate over it (with for, or async for
+    when it was created by astream_llm_response()) to receive tokens as they arrive.
+    Timing is recorded from the moment the question was submitted.
+
+    Parameters:
+    chunks (iterator): The message chunks from llm.stream() or llm.astream().
+    started (float): time.perf_counter() when the question was submitted.
+    """
+
+    def __init__(self, chunks, started):
+        self._chunks = chunks
+        self.started = started
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+        self._parts = []
+
+    def _record(self, chunk):
+        if not chunk.content:
+            return None
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += 1
+        self._parts.append(chunk.content)
+        return chunk.content
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            token = self._record(chunk)
+            if token:
+                yield token
+        self.finished_at = time.perf_counter()
+
+    async def __aiter__(self):
+        async for chunk in self._chunks:
+            token = self._record(chunk)
+            if token:
+                yield token
+        self.finished_at = time.perf_counter()
+
+    @property
+    def content(self):
+        """The text received so far."""
+        return "".join(self._parts)
+
+    @property
+    def time_to_first_token(self):
+        """Seconds from submitting the question to the first token, or None before it arrives."""
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def tokens_per_second(self):
+        """Generation rate after the first token (each streamed chunk is one token), or None until the stream ends."""
+        if self.finished_at is None or self.first_token_at is None:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        return (self.tokens - 1) / elapsed if elapsed > 0 and self.tokens > 1 else None
+
+    def stats(self):
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens_per_second,
+            "total_time": None if self.finished_at is None else self.finished_at - self.started
+        }
+
+def stream_llm_response(question, vs_directory, persona, character):
+    """
+    Same as generate_llm_response(), but returns the response token by token as it is generated.
+
+    Returns:
+    StreamingResponse: Iterate over it for the tokens, then read .stats().
+    """
+    started = time.perf_counter()
+    llm = get_llm()
+    prompt_value = build_rag_prompt(question, vs_directory, persona, character)
+    return StreamingResponse(llm.stream(prompt_value), started)
+
+async def astream_llm_response(question, vs_directory, persona, character):
+    """
+    Async version of stream_llm_response(). Retrieval runs in a worker thread
+    so the event loop is not blocked.
+
+    Returns:
+    StreamingResponse: Iterate over it with async for, then read .stats().
+    """
+    started = time.perf_counter()
+    llm = get_llm()
+    prompt_value = await asyncio.to_thread(build_rag_prompt, question, vs_directory, persona, character)
+    return StreamingResponse(llm.astream(prompt_value), started)
+
+def daemon_chunks(lines):
+    """Turns the JSON lines streamed by the query daemon into message-like chunks for StreamingResponse."""
+    for line in lines:
+        if "error" in line:
+            raise RuntimeError(f"❌ Query daemon error: {line['error']}")
+        if "token" in line:
+            yield SimpleNamespace(content=line["token"])
+
 if __name__ == "__main__":
+    started = time.perf_counter()
+
     # Parse command line arguments
     # Example Usage: python3 generate_llm_response.py <question> <vs_directory> <persona> <character>
     parser = argparse.ArgumentParser()
@@ -84,11 +206,58 @@ if __name__ == "__main__":
     parser.add_argument("vs_directory", help="The directory where the vector store is saved.")
     parser.add_argument("persona", help="The name of the persona.")
     parser.add_argument("--character", type=str, default="None", help="The character for filtering.")
+    parser.add_argument("--no_query_cache", action="store_true", help="Bypass the query embedding cache.")
+    parser.add_argument("--stream", action="store_true", help="Print the response token by token as it is generated.")
+    parser.add_argument("--trace", type=str, default=None, help="Trace sinks, e.g. histogram or jsonl:traces.jsonl (see tracing.py).")
+    parser.add_argument("--openai_base_url", type=str, default=None, help="Send OpenAI requests to this URL (e.g. the local stand-in server).")
+    parser.add_argument("--no_daemon", action="store_true", help="Always answer in-process, even if the query daemon is running.")
     args = parser.parse_args()
 
-    # Generate the LLM response
-    response = generate_llm_response(args.question, args.vs_directory, args.persona, args.character)
+    # Ask the query daemon first. Options that change in-process behavior always run in-process.
+    use_daemon = not (args.no_daemon or args.openai_base_url or args.trace or args.no_query_cache)
+    # The daemon runs in its own working directory, so paths are sent absolute.
+    payload = {"question": args.question, "vs_directory": os.path.abspath(args.vs_directory), "persona": args.persona,
+               "character": args.character, "stream": args.stream}
+    response = None
+    if use_daemon and args.stream:
+        lines = daemon_client.stream("/answer", payload)
+        if lines is not None:
+            response = StreamingResponse(daemon_chunks(lines), started)
+    elif use_daemon:
+        result = daemon_client.request("/answer", payload)
+        if result is not None:
+            response = result["answer"]
+    if response is not None:
+        print(f"⚡ Answered by the query daemon at {daemon_client.DEFAULT_DAEMON_URL}")
+    else:
+        import store_registry
+        if args.openai_base_url:
+            store_registry.set_openai_base_url(args.openai_base_url)
+        if args.trace:
+            tracing.configure(args.trace)
+        if args.no_query_cache:
+            store_registry.bypass_query_cache()
+
+    if args.stream:
+        # Stream the LLM response, printing tokens as they arrive
+        if response is None:
+            response = stream_llm_response(args.question, args.vs_directory, args.persona, args.character)
+        print(f"User Question: {args.question}\n")
+        print(f"Response from LLM for persona '{args.persona}, character '{args.character}': ")
+        for token in response:
+            print(token, end="", flush=True)
+        print("\n")
+        stats = response.stats()
+        if stats["time_to_first_token"] is not None:
+            print(f"⏱️ Time to first token: {stats['time_to_first_token']:.2f}s, "
+                  f"{stats['tokens']} tokens in {stats['total_time']:.2f}s"
+                  + (f" ({stats['tokens_per_second']:.1f} tokens/s)" if stats["tokens_per_second"] else ""))
+    else:
+        # Generate the LLM response
+        if response is None:
+            response = generate_llm_response(args.question, args.vs_directory, args.persona, args.character)
 
-    # Print the results
-    print(f"User Question: {args.question}\n")
-    print(f"Response from LLM for persona '{args.persona}, character '{args.character}': \n{response}\n")
+        # Print the results
+        print(f"User Question: {args.question}\n")
+        print(f"Response from LLM for persona '{args.persona}, character '{args.character}': \n{response}\n")
+    tracing.report()
@@ -1,15 +1,207 @@
 # This file generates a Chroma vector store from a given set of documents.
 # It uses the OpenAI embeddings to create the vector store and saves it locally.
+# Embeddings are cached by sha256(page_content), so rebuilds only embed new or changed texts.
+# Ingestion is pipelined: a bounded pool of embedding workers feeds a single
+# writer that upserts batches into Chroma in order, recording resumable progress.
+# Records left over from an earlier build whose documents are gone are then deleted.
+# A lexical index (BM25 and verse / character lookups, see lexical_index.py) is built next to the store.
+# With --chunk, adjacent lines are merged into token-bounded windows (see chunk_documents.py).
+# With --dedupe, exact and near-duplicate documents are collapsed before embedding (see dedupe_documents.py).
+# Changing --chunk or --dedupe (or their limits) between builds resets the collection.
 
 import os
+import json
+import hashlib
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid5, NAMESPACE_URL
 from tqdm import tqdm
 from dotenv import load_dotenv
 from langchain_openai.embeddings import OpenAIEmbeddings
 from langchain_chroma import Chroma
 from generate_document_objects import generate_docs_from_csv, generate_docs_from_txt, generate_docs_from_pdf
+from chunk_documents import chunk_documents, DEFAULT_MAX_TOKENS
+from dedupe_documents import dedupe_documents, DEFAULT_NEAR_THRESHOLD
+from lexical_index import build_lexical_index, lexical_index_directory
+from embedding_cache import ContentEmbeddingCache, embed_documents_cached
+import store_registry
+import daemon_client
 
-def generate_vectorstore(doc_path, output_name, output_directory, character_filter):
+def document_id(doc):
+    """Returns a deterministic id for a Document, so re-ingesting it replaces the existing record."""
+    return str(uuid5(NAMESPACE_URL, f"{doc.metadata.get('source')}:{doc.metadata.get('doc_id')}"))
+
+
+def corpus_fingerprint(docs):
+    """Returns a sha256 over every document's id and content, used to decide if saved progress can be resumed."""
+    digest = hashlib.sha256()
+    for doc in docs:
+        digest.update(f"{doc.metadata.get('source')}:{doc.metadata.get('doc_id')}\0{doc.page_content}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_progress(progress_path, fingerprint, batch_size):
+    """Returns the number of batches already written for this corpus, or 0 if there is no matching progress file."""
+    if not progress_path or not os.path.exists(progress_path):
+        return 0
+    with open(progress_path, "r") as f:
+        progress = json.load(f)
+    if progress.get("fingerprint") != fingerprint or progress.get("batch_size") != batch_size:
+        return 0
+    return progress.get("batches_written", 0)
+
+
+def save_progress(progress_path, fingerprint, batch_size, batches_written):
+    """Atomically records how many batches have been written."""
+    with open(progress_path + ".tmp", "w") as f:
+        json.dump({"fingerprint": fingerprint, "batch_size": batch_size, "batches_written": batches_written}, f)
+    os.replace(progress_path + ".tmp", progress_path)
+
+
+def load_build_settings(settings_path):
+    """Returns the document settings (chunking, dedupe) the store was last built with, or None if unknown."""
+    if not os.path.exists(settings_path):
+        return None
+    with open(settings_path, "r") as f:
+        return json.load(f)
+
+
+def save_build_settings(settings_path, settings):
+    """Records the document settings (chunking, dedupe) the store was built with."""
+    with open(settings_path + ".tmp", "w") as f:
+        json.dump(settings, f)
+    os.replace(settings_path + ".tmp", settings_path)
+
+
+def ingest_documents(vector_store, embeddings, docs, cache=None, batch_size=50, workers=4, max_pending=None, progress_path=None):
+    """
+    Embeds and writes documents into a Chroma vector store with a pipelined worker pool.
+
+    Up to `workers` batches are embedded concurrently while the calling thread
+    writes finished batches to Chroma strictly in document order. At most
+    `max_pending` batches are in flight at once, so a slow writer applies
+    backpressure to the embedding workers. After every written batch the
+    progress is saved, and a re-run over the same corpus resumes after the
+    last written batch.
+
+    Parameters:
+    vector_store (Chroma): The vector store to write to.
+    embeddings (Embeddings): The embeddings object used for cache misses.
+    docs (list): The Document objects to ingest.
+    cache (ContentEmbeddingCache): Optional content-hash embedding cache.
+    batch_size (int): Documents per embedding request and Chroma upsert.
+    workers (int): Number of concurrent embedding workers.
+    max_pending (int): Maximum batches in flight, defaults to 2 * workers.
+    progress_path (str): File used to record resumable progress, or None to disable resuming.
+
+    Returns:
+    int: The number of unique texts sent to the embedding API.
+    """
+    collection = vector_store._collection
+    max_pending = max_pending or 2 * workers
+    batch_starts = list(range(0, len(docs), batch_size))
+
+    fingerprint = corpus_fingerprint(docs) if progress_path else None
+    batches_written = load_progress(progress_path, fingerprint, batch_size)
+    if batches_written:
+        print(f"⏩ Resuming ingestion after {batches_written} of {len(batch_starts)} batches already written...")
+
+    def embed_batch(start):
+        texts = [doc.page_content for doc in docs[start:start + batch_size]]
+        return embed_documents_cached(embeddings, texts, cache)
+
+    total_embedded = 0
+    with tqdm(total=len(docs), initial=min(batches_written * batch_size, len(docs)),
+              desc="Ingesting documents into Chroma") as pbar, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+
+        def write_oldest():
+            nonlocal total_embedded, batches_written
+            start, future = pending.popleft()
+            vectors, num_embedded = future.result()
+            batch_docs = docs[start:start + batch_size]
+            collection.upsert(
+                ids=[document_id(doc) for doc in batch_docs],
+                embeddings=vectors,
+                documents=[doc.page_content for doc in batch_docs],
+                metadatas=[doc.metadata or None for doc in batch_docs]
+            )
+            total_embedded += num_embedded
+            batches_written += 1
+            if progress_path:
+                save_progress(progress_path, fingerprint, batch_size, batches_written)
+            pbar.update(len(batch_docs))
+
+        for start in batch_starts[batches_written:]:
+            if len(pending) >= max_pending:
+                write_oldest()
+            pending.append((start, pool.submit(embed_batch, start)))
+        while pending:
+            write_oldest()
+
+    if progress_path and os.path.exists(progress_path):
+        os.remove(progress_path)
+
+    return total_embedded
+
+
+def prune_stale_records(collection, keep_ids, page_size=1000):
+    """
+    Deletes the records of a collection whose id is not in keep_ids, such as lines removed
+    from the source since the last build.
+
+    Parameters:
+    collection (Collection): The chromadb collection to prune.
+    keep_ids (iterable): The ids of the documents just ingested.
+    page_size (int): Ids read and deleted per request.
+
+    Returns:
+    int: The number of deleted records.
+    """
+    keep_ids = set(keep_ids)
+    stale_ids = []
+    offset = 0
+    while True:
+        ids = collection.get(include=[], limit=page_size, offset=offset)["ids"]
+        if not ids:
+            break
+        stale_ids.extend(record_id for record_id in ids if record_id not in keep_ids)
+        offset += len(ids)
+    # Delete only after reading every page, so the offsets above stay valid.
+    for start in range(0, len(stale_ids), page_size):
+        collection.delete(ids=stale_ids[start:start + page_size])
+    return len(stale_ids)
+
+
+def load_source_documents(doc_path):
+    """
+    Generates LangChain document objects from a .csv, .pdf or .txt source file.
+
+    Parameters:
+    doc_path (str): File path of the source documents.
+
+    Returns:
+    docs (list): A list of LangChain Document objects.
+    """
+    if doc_path.lower().endswith(".csv"):
+        docs = generate_docs_from_csv(doc_path)  # Custom function to handle CSV files
+        print("LangChain Document objects generated from CSV file.")
+    elif doc_path.lower().endswith(".pdf"):
+        docs = generate_docs_from_pdf(doc_path)  # Custom function to handle PDF files
+        print("LangChain Document objects generated from PDF files.")
+    elif doc_path.lower().endswith(".txt"):
+        docs = generate_docs_from_txt(doc_path)  # Custom function to handle Text files
+        print("LangChain Document objects generated from Text files.")
+    else:
+        raise ValueError("Unsupported file type. Please provide a .pdf, .txt, or .csv file.")
+    return docs
+
+
+def generate_vectorstore(doc_path, output_name, output_directory, character_filter, use_embedding_cache=True,
+                         workers=4, max_pending=None, resume=True, dedupe=False, near_threshold=DEFAULT_NEAR_THRESHOLD,
+                         chunk=False, max_tokens=DEFAULT_MAX_TOKENS):
     """
     Generates a Chroma vector store from the provided documents and saves it locally.
 
@@ -17,6 +209,14 @@ def generate_vectorstore(doc_path, output_name, output_directory, character_filt
     doc_path (str): File path or directory path of documents to be added to the vector store.
     output_name (str): The name of the output vector store file (without extension).
     output_directory (str): The directory where the vector store will be saved.
+    use_embedding_cache (bool): Reuse cached embeddings for unchanged page_content (see embedding_cache.py).
+    workers (int): Number of concurrent embedding workers.
+    max_pending (int): Maximum batches in flight, defaults to 2 * workers.
+    resume (bool): Resume an interrupted ingestion of the same corpus.
+    dedupe (bool): Collapse exact and near-duplicate documents before embedding them.
+    near_threshold (float): Minimum similarity of near duplicates, or None for exact duplicates only.
+    chunk (bool): Merge adjacent lines into windows of up to max_tokens tokens before deduplicating and embedding.
+    max_tokens (int): Maximum tokens per window.
     """
     # Check if the file exists
     if not os.path.exists(doc_path):
@@ -27,53 +227,89 @@ def generate_vectorstore(doc_path, output_name, output_directory, character_filt
     print(f"Output name: {output_name}")
     print(f"Output directory: {output_directory}")
 
+    # 1-2. Generate LangChain document objects from source file(s).
+    docs = load_source_documents(doc_path)
+    if chunk:
+        docs = chunk_documents(docs, max_tokens)
+    if dedupe:
+        docs = dedupe_documents(docs, near_threshold)
+
+    # 3-7. Embed the documents and write them to the vector store.
+    # Chunked, deduplicated and one-line records must not mix, so the store is reset when
+    # these settings differ from its last build (unchanged texts still come from the embedding cache).
+    settings = {"chunk": max_tokens if chunk else None, "dedupe": near_threshold if dedupe else None}
+    settings_path = os.path.join(output_directory, f"build_settings_{output_name.replace(' ', '_')}.json")
+    previous_settings = load_build_settings(settings_path)
+    reset = previous_settings is not None and previous_settings != settings
+    if reset:
+        print(f"♻️ Chunking or dedupe settings changed from {previous_settings} to {settings}, resetting the collection...")
+    build_vectorstore(docs, output_name, output_directory, use_embedding_cache, workers, max_pending, resume, reset)
+    save_build_settings(settings_path, settings)
+
+    # 8. Build the lexical index of the same documents.
+    build_lexical_index(docs, lexical_index_directory(output_directory))
+
+
+def build_vectorstore(docs, output_name, output_directory, use_embedding_cache=True, workers=4, max_pending=None,
+                      resume=True, reset=False):
+    """
+    Embeds Document objects and writes them to a Chroma vector store saved locally.
+
+    Parameters:
+    docs (list): The LangChain Document objects to ingest.
+    output_name (str): The name of the output vector store collection.
+    output_directory (str): The directory where the vector store will be saved.
+    use_embedding_cache (bool): Reuse cached embeddings for unchanged page_content (see embedding_cache.py).
+    workers (int): Number of concurrent embedding workers.
+    max_pending (int): Maximum batches in flight, defaults to 2 * workers.
+    resume (bool): Resume an interrupted ingestion of the same corpus.
+    reset (bool): Delete every existing record in the collection before ingesting.
+    """
     # 1. Load the OpenAI API key from .env.
     load_dotenv()
     openai_api_key = os.getenv("OPENAI_API_KEY")
 
-    # 2. Generate LangChain document objects from source file(s).
-    if doc_path.lower().endswith(".csv"):
-        docs = generate_docs_from_csv(doc_path, character_filter)  # Custom function to handle CSV files
-        print("LangChain Document objects generated from CSV file.")
-    elif doc_path.lower().endswith(".pdf"):
-        docs = generate_docs_from_pdf(doc_path)  # Custom function to handle PDF files
-        print("LangChain Document objects generated from PDF files.")
-    elif doc_path.lower().endswith(".txt"):
-        docs = generate_docs_from_txt(doc_path)  # Custom function to handle Text files
-        print("LangChain Document objects generated from Text files.")
-    else:
-        raise ValueError("Unsupported file type. Please provide a .pdf, .txt, or .csv file.")
-
     # 3. Create embeddings using OpenAI.
-    embeddings = OpenAIEmbeddings(api_key=openai_api_key)
+    embeddings = OpenAIEmbeddings(api_key=openai_api_key, base_url=os.getenv("OPENAI_BASE_URL"))
 
     # 4. Create Chroma vector store.
+    collection_name = output_name.replace(" ", "_")  # Sanitize collection name
     vector_store = Chroma(
         embedding_function=embeddings,
-        collection_name=output_name.replace(" ", "_"),  # Sanitize collection name
+        collection_name=collection_name,
         persist_directory=output_directory  # Where to save data locally
         )
+    if reset:
+        vector_store.reset_collection()
     print(f"✅ Vector store created: {vector_store}")
 
     # 5. Ingest documents into the vector store.
+    # Vectors for unchanged page_content come from the content cache,
+    # only new or changed texts are sent to the embedding API.
+    cache = ContentEmbeddingCache() if use_embedding_cache else None
+    progress_path = os.path.join(output_directory, f"ingest_progress_{collection_name}.json") if resume else None
     total_docs = len(docs)
     batch_size = 50  # Define batch size for ingestion
-    print(f"📥 Ingesting {total_docs} documents into the vector store in batches of {batch_size}...")
-    with tqdm(total=total_docs, desc="Ingesting documents into Chroma") as pbar:
-        for i in range(0, total_docs, batch_size):
-            batch_docs = docs[i:i + batch_size]
-            vector_store.add_documents(batch_docs)
-            pbar.update(len(batch_docs))
+    print(f"📥 Ingesting {total_docs} documents into the vector store in batches of {batch_size} with {workers} embedding workers...")
+    total_embedded = ingest_documents(vector_store, embeddings, docs, cache, batch_size, workers, max_pending, progress_path)
+    print(f"🧮 Embedded {total_embedded} new or changed texts, the rest were reused from the embedding cache.")
+    if not reset:
+        # Upserts only replace records, so drop the ones the current documents no longer produce.
+        pruned = prune_stale_records(vector_store._collection, (document_id(doc) for doc in docs))
+        if pruned:
+            print(f"🗑️ Deleted {pruned} stale records that are no longer in the source.")
 
-    # 5. Done!
+    # 6. Done!
     print(f"✅ Vector store generation and ingesting of {len(docs)} is complete.")
     print(f"📁 Saved to: {output_directory} as: {output_name}")
     print("✅ Vector store generation complete.")
     print("💡 You can now load this vector store for RAG or other applications.")
     print("🔍 To query the vector store, use the 'generate_llm_response' function.")
 
-    # 7. Free up memory.
+    # 7. Free up memory and drop any stale handles to the rebuilt store.
     vector_store = None
+    store_registry.invalidate(output_directory, collection_name)
+    daemon_client.invalidate(output_directory, collection_name)
     print("🧹 Vectorstore cleared from memory to free up resources.")
 
 if __name__ == "__main__":
@@ -84,9 +320,28 @@ if __name__ == "__main__":
     parser.add_argument("output_name", type=str, help="The name of the output vector store file (without extension).")
     parser.add_argument("output_directory", type=str, help="The directory where the vector store will be saved.")
     parser.add_argument("--character_filter", type=str, default="None", help="The directory where the vector store will be saved.")
+    parser.add_argument("--no_embedding_cache", action="store_true", help="Re-embed every document instead of reusing cached embeddings.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent embedding workers.")
+    parser.add_argument("--max_pending", type=int, default=None, help="Maximum batches in flight (default: 2 x workers).")
+    parser.add_argument("--no_resume", action="store_true", help="Start ingestion from the beginning instead of resuming.")
+    parser.add_argument("--chunk", action="store_true", help="Merge adjacent lines into token-bounded windows before embedding.")
+    parser.add_argument("--max_tokens", type=int, default=DEFAULT_MAX_TOKENS, help="Maximum tokens per window (with --chunk).")
+    parser.add_argument("--dedupe", action="store_true", help="Collapse exact and near-duplicate documents before embedding.")
+    parser.add_argument("--near_threshold", type=float, default=DEFAULT_NEAR_THRESHOLD, help="Minimum similarity of near duplicates (with --dedupe).")
+    parser.add_argument("--openai_base_url", type=str, default=None, help="Send OpenAI requests to this URL (e.g. the local stand-in server).")
     args = parser.parse_args()
+    if args.openai_base_url:
+        store_registry.set_openai_base_url(args.openai_base_url)
 
     generate_vectorstore(args.doc_path,
                         args.output_name,
                         args.output_directory,
-                        args.character_filter)
+                        args.character_filter,
+                        not args.no_embedding_cache,
+                        args.workers,
+                        args.max_pending,
+                        not args.no_resume,
+                        args.dedupe,
+                        args.near_threshold,
+                        args.chunk,
+                        args.max_tokens)
@@ -0,0 +1,320 @@
+# This file builds and searches a local lexical index of a persona's documents, so
+# lexical queries ("John 3:16", a quoted catchphrase) are answered without an
+# embedding call or a vector search:
+# - BM25 over lowercase word tokens, stored as CSR postings (term -> rows and term frequencies),
+# - exact lookup tables for Bible verse references ("verse" metadata) and character names.
+# route() decides whether a query is clearly lexical: a verse reference (or range, e.g.
+# "John 3:16-18") found in the verse table, or a quoted phrase. reciprocal_rank_fusion()
+# merges lexical and vector results for hybrid retrieval.
+# The index is written to <vectorstore_path>/lexical_index at ingestion (main.py,
+# generate_vectorstore_chroma.py) and used by query_vectorstore.py (--lexical).
+# Example Usage:
+# python3 lexical_index.py ./vector-store/bible_chroma_db "John 3:16"
+# python3 lexical_index.py ./vector-store/homer_chroma_db "\"mmm donuts\"" --character "Homer Simpson"
+
+import os
+import re
+import json
+import math
+import mmap
+import shutil
+import argparse
+from collections import Counter
+import numpy as np
+
+LEXICAL_FORMAT_VERSION = 1
+LEXICAL_INDEX_DIRECTORY = "lexical_index"
+INDEX_META_FILE = "index.json"
+DOCUMENTS_FILE = "documents.jsonl"
+OFFSETS_FILE = "offsets.npy"
+ROWS_FILE = "rows.npy"
+FREQUENCIES_FILE = "frequencies.npy"
+LENGTHS_FILE = "lengths.npy"
+DOCUMENT_OFFSETS_FILE = "document_offsets.npy"
+
+# BM25 parameters, and the rank constant of reciprocal-rank fusion.
+K1 = 1.2
+B = 0.75
+RRF_K = 60
+# Metadata keys with an exact lookup table.
+LOOKUP_KEYS = ("verse", "character")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+VERSE_PATTERN = re.compile(r"^\s*((?:[1-3]\s*)?[a-z]+(?:\s+[a-z]+)*)\.?\s+(\d+)\s*:\s*(\d+)(?:\s*-\s*(\d+))?\s*$", re.IGNORECASE)
+QUOTED_PATTERN = re.compile(r"^\s*[\"“”'‘’](.+)[\"“”'‘’]\s*$")
+
+
+def tokenize(text):
+    """Returns the lowercase word tokens of text."""
+    return TOKEN_PATTERN.findall(text.lower().replace("’", "'"))
+
+
+def verse_keys(text):
+    """
+    Returns the normalized verse references of a reference or range ("1 John 3:16", "1john 3:16-18"),
+    or an empty list if text is not a verse reference.
+    """
+    match = VERSE_PATTERN.match(text)
+    if not match:
+        return []
+    book = " ".join(re.sub(r"^([1-3])\s*", r"\1 ", match.group(1).lower()).split())
+    chapter, first = int(match.group(2)), int(match.group(3))
+    last = int(match.group(4)) if match.group(4) else first
+    return [f"{book} {chapter}:{verse}" for verse in range(first, max(first, last) + 1)]
+
+
+def lookup_key(name, value):
+    """Returns the lookup table key of a metadata value."""
+    if name == "verse":
+        keys = verse_keys(str(value))
+        return keys[0] if len(keys) == 1 else None
+    return " ".join(str(value).lower().split())
+
+
+def lexical_index_directory(vectorstore_path):
+    return os.path.join(vectorstore_path, LEXICAL_INDEX_DIRECTORY)
+
+
+def build_lexical_index(docs, directory):
+    """
+    Builds the BM25 postings and lookup tables of Document objects and writes them to directory.
+
+    Parameters:
+    docs (iterable): The Document objects that were ingested.
+    directory (str): The output directory (replaced if it exists).
+
+    Returns:
+    LexicalIndex: The built index.
+    """
+    vocabulary = {}
+    postings = []
+    lengths = []
+    document_offsets = [0]
+    lookups = {name: {} for name in LOOKUP_KEYS}
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+
+    with open(os.path.join(directory, DOCUMENTS_FILE), "wb") as f:
+        for row, doc in enumerate(docs):
+            metadata = doc.metadata or {}
+            line = (json.dumps({"text": doc.page_content, "metadata": metadata}, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            document_offsets.append(document_offsets[-1] + len(line))
+            tokens = tokenize(doc.page_content)
+            lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                term_id = vocabulary.setdefault(term, len(vocabulary))
+                postings.append((term_id, row, frequency))
+            for name in LOOKUP_KEYS:
+                if metadata.get(name) is not None:
+                    key = lookup_key(name, metadata[name])
+                    if key:
+                        lookups[name].setdefault(key, []).append(row)
+
+    postings = np.asarray(postings, dtype=np.int64).reshape(-1, 3)
+    postings = postings[np.argsort(postings[:, 0], kind="stable")]
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(postings[:, 0], minlength=len(vocabulary)), out=offsets[1:])
+    lengths = np.asarray(lengths, dtype=np.int32)
+    meta = {
+        "format_version": LEXICAL_FORMAT_VERSION,
+        "count": len(lengths),
+        "average_length": float(lengths.mean()) if len(lengths) else 0.0,
+        "k1": K1,
+        "b": B,
+        "vocabulary": vocabulary,
+        "lookups": {name: table for name, table in lookups.items() if table}
+    }
+    np.save(os.path.join(directory, OFFSETS_FILE), offsets)
+    np.save(os.path.join(directory, ROWS_FILE), postings[:, 1].astype(np.int32))
+    np.save(os.path.join(directory, FREQUENCIES_FILE), postings[:, 2].astype(np.float32))
+    np.save(os.path.join(directory, LENGTHS_FILE), lengths)
+    np.save(os.path.join(directory, DOCUMENT_OFFSETS_FILE), np.asarray(document_offsets, dtype=np.int64))
+    with open(os.path.join(directory, INDEX_META_FILE), "w") as f:
+        json.dump(meta, f)
+    print(f"🔤 Built a lexical index of {len(lengths)} documents and {len(vocabulary)} terms "
+          f"({', '.join(f'{len(table)} {name}s' for name, table in meta['lookups'].items()) or 'no lookup tables'}) at {directory}")
+    return LexicalIndex(directory)
+
+
+class LexicalIndex:
+    """
+    A BM25 index with exact lookup tables, loaded from a directory written by build_lexical_index().
+    Arrays and documents are memory-mapped, so loading does not read the corpus.
+
+    Parameters:
+    directory (str): The lexical index directory.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, INDEX_META_FILE), "r") as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.vocabulary = meta.pop("vocabulary")
+        self.lookups = meta.pop("lookups")
+        self.meta = meta
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        self.rows = np.load(os.path.join(directory, ROWS_FILE), mmap_mode="r")
+        self.frequencies = np.load(os.path.join(directory, FREQUENCIES_FILE), mmap_mode="r")
+        lengths = np.load(os.path.join(directory, LENGTHS_FILE)).astype(np.float32)
+        average = max(meta["average_length"], 1e-6)
+        # BM25 length normalization of every document, precomputed.
+        self.norms = meta["k1"] * (1 - meta["b"] + meta["b"] * lengths / average)
+        self.document_offsets = np.load(os.path.join(directory, DOCUMENT_OFFSETS_FILE))
+        with open(os.path.join(directory, DOCUMENTS_FILE), "rb") as f:
+            self._documents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.document_offsets[-1] else b""
+
+    @classmethod
+    def load(cls, vectorstore_path):
+        """Returns the lexical index of a vector store, or None if it has none."""
+        directory = lexical_index_directory(vectorstore_path)
+        if not os.path.exists(os.path.join(directory, INDEX_META_FILE)):
+            return None
+        return cls(directory)
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def record(self, row):
+        """Returns the {"text", "metadata"} record at row."""
+        return json.loads(self._documents[self.document_offsets[row]:self.document_offsets[row + 1]])
+
+    def document(self, row):
+        """Returns the Document at row."""
+        from langchain_core.documents import Document
+        record = self.record(row)
+        return Document(page_content=record["text"], metadata=record["metadata"])
+
+    def lookup(self, name, value):
+        """Returns the rows whose name metadata ("verse" or "character") equals value."""
+        key = lookup_key(name, value)
+        return list(self.lookups.get(name, {}).get(key, [])) if key else []
+
+    def route(self, query):
+        """Returns "verse" or "phrase" if query is clearly lexical, otherwise None."""
+        keys = verse_keys(query)
+        if keys and any(key in self.lookups.get("verse", {}) for key in keys):
+            return "verse"
+        if QUOTED_PATTERN.match(query):
+            return "phrase"
+        return None
+
+    def _allowed(self, filter):
+        """Returns a boolean mask of the rows matching a metadata filter, or None without a filter."""
+        if not filter:
+            return None
+        allowed = np.ones(len(self), dtype=bool)
+        for name, value in filter.items():
+            mask = np.zeros(len(self), dtype=bool)
+            if name in LOOKUP_KEYS:
+                mask[self.lookup(name, value)] = True
+            else:
+                mask[[row for row in range(len(self)) if self.record(row)["metadata"].get(name) == value]] = True
+            allowed &= mask
+        return allowed
+
+    def scores(self, query):
+        """Returns the BM25 score of every document for query."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        count = len(self)
+        for term, query_frequency in Counter(tokenize(query)).items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            rows = self.rows[start:end]
+            frequencies = self.frequencies[start:end]
+            idf = math.log(1 + (count - (end - start) + 0.5) / (end - start + 0.5))
+            scores[rows] += query_frequency * idf * frequencies * (self.meta["k1"] + 1) / (frequencies + self.norms[rows])
+        return scores
+
+    def search_with_scores(self, query, k=5, filter=None):
+        """
+        Answers a query from the index: the documents of a verse reference, the best BM25
+        matches containing a quoted phrase, or the best BM25 matches otherwise.
+
+        Parameters:
+        query (str): The query.
+        k (int): Maximum number of results.
+        filter (dict): Optional metadata filter, e.g. {"character": "Homer Simpson"}.
+
+        Returns:
+        list: (Document, score) tuples, best first.
+        """
+        allowed = self._allowed(filter)
+        route = self.route(query)
+        if route == "verse":
+            rows = [row for key in verse_keys(query) for row in self.lookups["verse"].get(key, [])]
+            rows = [row for row in rows if allowed is None or allowed[row]][:k]
+            return [(self.document(row), 1.0) for row in rows]
+
+        phrase = QUOTED_PATTERN.match(query)
+        scores = self.scores(phrase.group(1) if phrase else query)
+        if allowed is not None:
+            scores[~allowed] = 0
+        candidates = np.flatnonzero(scores)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        if not phrase:
+            return [(self.document(row), float(scores[row])) for row in candidates[:k]]
+
+        # Keep the best matches that contain the phrase's tokens in order.
+        needle = " " + " ".join(tokenize(phrase.group(1))) + " "
+        results = []
+        for row in candidates:
+            if needle in " " + " ".join(tokenize(self.record(row)["text"])) + " ":
+                results.append((self.document(row), float(scores[row])))
+                if len(results) == k:
+                    break
+        return results
+
+    def search(self, query, k=5, filter=None):
+        """Same as search_with_scores() but returns only the Document objects."""
+        return [doc for doc, _ in self.search_with_scores(query, k, filter)]
+
+
+def document_key(doc):
+    """Returns the identity of a document across result lists (its source and doc_id, or its text)."""
+    metadata = doc.metadata or {}
+    if metadata.get("doc_id") is not None:
+        return (metadata.get("source"), metadata["doc_id"])
+    return doc.page_content
+
+
+def reciprocal_rank_fusion(result_lists, k=5, rrf_k=RRF_K):
+    """
+    Merges ranked lists of Document objects: each document scores the sum of 1 / (rrf_k + rank)
+    over the lists it appears in.
+
+    Returns:
+    list: The top k Document objects.
+    """
+    scores, documents = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+
+if __name__ == "__main__":
+    import time
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("vectorstore_path", type=str, help="The vector store with a lexical_index directory.")
+    parser.add_argument("query", type=str, help="The query, e.g. a verse reference or a quoted phrase.")
+    parser.add_argument("--character", type=str, default="None", help="The character for filtering.")
+    parser.add_argument("--k", type=int, default=5, help="Number of results.")
+    args = parser.parse_args()
+
+    index = LexicalIndex.load(args.vectorstore_path)
+    if index is None:
+        raise FileNotFoundError(f"❌ No lexical index in {args.vectorstore_path}. Rebuild the persona with main.py.")
+    start = time.perf_counter()
+    results = index.search_with_scores(args.query, args.k, None if args.character == "None" else {"character": args.character})
+    elapsed = time.perf_counter() - start
+    print(f"🔤 Route: {index.route(args.query) or 'bm25'}, {len(results)} results in {elapsed * 1e6:.0f} µs")
+    for doc, score in results:
+        print(f"{score:.3f} {doc.page_content[:100]!r} {doc.metadata}")
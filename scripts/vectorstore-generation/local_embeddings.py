@@ -0,0 +1,56 @@
+# This file contains a deterministic, local embedding function.
+# Texts are embedded by feature hashing their lowercase word tokens into a
+# fixed number of dimensions, so texts sharing words have similar vectors.
+# It needs no network access and is used by the offline benchmarks and the
+# local OpenAI stand-in server. It is NOT a substitute for a real embedding model.
+
+import re
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_DIMENSIONS = 256
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def hash_embedding(text, dimensions=DEFAULT_DIMENSIONS):
+    """
+    Returns a deterministic unit-length embedding for text.
+
+    Parameters:
+    text (str): The text to embed.
+    dimensions (int): The number of output dimensions.
+
+    Returns:
+    list: The embedding as a list of floats.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    tokens = TOKEN_PATTERN.findall(text.lower()) or [text]
+    for token in tokens:
+        digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[digest % dimensions] += 1.0 if (digest >> 32) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+
+class HashEmbeddings(Embeddings):
+    """
+    LangChain Embeddings implementation backed by hash_embedding().
+
+    Parameters:
+    dimensions (int): The number of output dimensions.
+    """
+
+    model = "local-hash"
+
+    def __init__(self, dimensions=DEFAULT_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts):
+        return [hash_embedding(text, self.dimensions) for text in texts]
+
+    def embed_query(self, text):
+        return hash_embedding(text, self.dimensions)
@@ -0,0 +1,333 @@
+# This file runs a local, OpenAI-compatible stand-in server for offline load testing.
+# It implements the embeddings and chat completions endpoints:
+# - POST /v1/embeddings returns deterministic hash-based vectors (see local_embeddings.py),
+#   for string inputs and for token id lists (as sent by LangChain's OpenAIEmbeddings).
+# - POST /v1/chat/completions returns a canned reply, streamed as server-sent events
+#   when the request sets "stream": true.
+# Latency distributions, rate limiting (429) and server errors (500) can be injected
+# to see how the pipeline behaves under realistic conditions.
+# Point the entry points at it with --openai_base_url http://127.0.0.1:8089/v1
+# (or by setting OPENAI_BASE_URL).
+# Example Usage:
+# python3 local_openai_server.py --latency lognormal --latency_ms 120 --rate_limit_rate 0.02 --error_rate 0.01
+
+import json
+import time
+import uuid
+import base64
+import random
+import argparse
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from local_embeddings import DEFAULT_DIMENSIONS, hash_embedding
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8089
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+CANNED_REPLY = ("This is a canned reply from the local stand-in server. It does not understand the question, "
+                "but it answers at a realistic pace so the rest of the pipeline can be measured without calling OpenAI.")
+
+
+class LatencyModel:
+    """
+    A distribution of response latencies.
+
+    Parameters:
+    distribution (str): "fixed", "uniform" (0 to 2 x median), "normal" or "lognormal".
+    median_ms (float): The median latency in milliseconds.
+    sigma (float): Spread of the normal (relative to the median) and lognormal distributions.
+    max_ms (float): Optional cap on any sampled latency.
+    """
+
+    def __init__(self, distribution="fixed", median_ms=0.0, sigma=0.5, max_ms=None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"❌ Unknown latency distribution '{distribution}'. Use one of {LATENCY_DISTRIBUTIONS}.")
+        self.distribution = distribution
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.max_ms = max_ms
+
+    def sample(self, rng):
+        """Returns one latency in seconds."""
+        if self.distribution == "fixed":
+            ms = self.median_ms
+        elif self.distribution == "uniform":
+            ms = rng.uniform(0, 2 * self.median_ms)
+        elif self.distribution == "normal":
+            ms = rng.gauss(self.median_ms, self.sigma * self.median_ms)
+        else:
+            ms = self.median_ms * np.exp(rng.gauss(0, self.sigma))
+        if self.max_ms is not None:
+            ms = min(ms, self.max_ms)
+        return max(ms, 0.0) / 1000
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts of up to `burst` requests."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    The stand-in HTTP server. Holds the fault injection settings and request counters.
+
+    Parameters:
+    address (tuple): (host, port) to listen on.
+    latency (LatencyModel): Latency applied before each response (and before the first streamed token).
+    token_latency (LatencyModel): Latency between streamed tokens.
+    rate_limit_rate (float): Probability of answering a request with 429.
+    error_rate (float): Probability of answering a request with 500.
+    max_rps (float): If set, requests beyond this many per second are answered with 429.
+    dimensions (int): Default embedding dimensions.
+    seed (int): Seed for the latency and fault injection random numbers.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=None, token_latency=None, rate_limit_rate=0.0, error_rate=0.0,
+                 max_rps=None, dimensions=DEFAULT_DIMENSIONS, seed=0):
+        super().__init__(address, StandInHandler)
+        self.latency = latency or LatencyModel()
+        self.token_latency = token_latency or LatencyModel()
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(max_rps) if max_rps else None
+        self.dimensions = dimensions
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "embeddings": 0, "chat_completions": 0, "rate_limited": 0, "errors": 0}
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def sample_latency(self, model):
+        with self._lock:
+            return model.sample(self._rng)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the OpenAI endpoints used by the pipeline."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_error_json(self, status, message, error_type, headers=None):
+        self.send_json(status, {"error": {"message": message, "type": error_type, "param": None, "code": None}}, headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/health", "/v1/health"):
+            self.send_json(200, {"status": "ok"})
+        elif self.path.rstrip("/") in ("/stats", "/v1/stats"):
+            self.send_json(200, dict(self.server.stats))
+        elif self.path.rstrip("/") == "/v1/models":
+            self.send_json(200, {"object": "list", "data": [
+                {"id": "text-embedding-ada-002", "object": "model", "owned_by": "local"},
+                {"id": "gpt-4o-mini", "object": "model", "owned_by": "local"}
+            ]})
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}", "invalid_request_error")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_error_json(400, "Request body is not valid JSON.", "invalid_request_error")
+            return
+
+        server = self.server
+        server.count("requests")
+
+        # Fault injection happens before any work, like a loaded upstream would.
+        if (server.bucket and not server.bucket.try_acquire()) or server.random() < server.rate_limit_rate:
+            server.count("rate_limited")
+            self.send_error_json(429, "Rate limit reached (injected by the local stand-in server).",
+                                 "rate_limit_error", {"Retry-After": "1"})
+            return
+        if server.random() < server.error_rate:
+            server.count("errors")
+            self.send_error_json(500, "Internal server error (injected by the local stand-in server).", "server_error")
+            return
+
+        time.sleep(server.sample_latency(server.latency))
+
+        path = self.path.rstrip("/")
+        if path in ("/v1/embeddings", "/embeddings"):
+            server.count("embeddings")
+            self.handle_embeddings(body)
+        elif path in ("/v1/chat/completions", "/chat/completions"):
+            server.count("chat_completions")
+            self.handle_chat_completions(body)
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}", "invalid_request_error")
+
+    def handle_embeddings(self, body):
+        inputs = body.get("input", [])
+        # "input" may be a string, a list of strings, a list of token ids or a list of token id lists.
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dimensions = body.get("dimensions") or self.server.dimensions
+        data = []
+        prompt_tokens = 0
+        for index, item in enumerate(inputs):
+            text = item if isinstance(item, str) else " ".join(str(token) for token in item)
+            prompt_tokens += len(item) if isinstance(item, list) else len(text.split())
+            vector = hash_embedding(text, dimensions)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+            else:
+                embedding = vector
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        self.send_json(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}
+        })
+
+    def handle_chat_completions(self, body):
+        model = body.get("model", "gpt-4o-mini")
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in body.get("messages", []))
+        words = CANNED_REPLY.split(" ")
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+        if max_tokens:
+            words = words[:max_tokens]
+        reply = " ".join(words)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            self.send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        # Server-sent events: one chunk per word, then a finish chunk, an optional usage chunk and [DONE].
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_chunk(choices, **extra):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": choices, **extra}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            for index, word in enumerate(words):
+                if index:
+                    time.sleep(self.server.sample_latency(self.server.token_latency))
+                delta = {"content": word if index == 0 else " " + word}
+                if index == 0:
+                    delta["role"] = "assistant"
+                send_chunk([{"index": 0, "delta": delta, "finish_reason": None}])
+            send_chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (body.get("stream_options") or {}).get("include_usage"):
+                send_chunk([], usage=usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_server(host=DEFAULT_HOST, port=DEFAULT_PORT, **settings):
+    """
+    Starts a StandInServer in a background thread.
+
+    Parameters:
+    host (str): Host to listen on.
+    port (int): Port to listen on, 0 picks a free port.
+    settings: Keyword arguments passed to StandInServer (latency, error_rate, ...).
+
+    Returns:
+    StandInServer: The running server; use server.base_url and server.shutdown().
+    """
+    server = StandInServer((host, port), **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help="Host to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on.")
+    parser.add_argument("--latency", type=str, default="fixed", choices=LATENCY_DISTRIBUTIONS, help="Response latency distribution.")
+    parser.add_argument("--latency_ms", type=float, default=0.0, help="Median response latency in milliseconds.")
+    parser.add_argument("--latency_sigma", type=float, default=0.5, help="Spread of the normal / lognormal latency distribution.")
+    parser.add_argument("--latency_max_ms", type=float, default=None, help="Cap on any sampled latency.")
+    parser.add_argument("--token_latency_ms", type=float, default=0.0, help="Median delay between streamed tokens in milliseconds.")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0, help="Probability of answering with 429.")
+    parser.add_argument("--max_rps", type=float, default=None, help="Answer with 429 beyond this many requests per second.")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Probability of answering with 500.")
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS, help="Default embedding dimensions.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency and fault injection.")
+    args = parser.parse_args()
+
+    server = StandInServer(
+        (args.host, args.port),
+        latency=LatencyModel(args.latency, args.latency_ms, args.latency_sigma, args.latency_max_ms),
+        token_latency=LatencyModel(args.latency, args.token_latency_ms, args.latency_sigma, args.latency_max_ms),
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        max_rps=args.max_rps,
+        dimensions=args.dimensions,
+        seed=args.seed
+    )
+    print(f"🧪 Local OpenAI stand-in server listening on {server.base_url}")
+    print(f"💡 Use it with: --openai_base_url {server.base_url}  (or OPENAI_BASE_URL={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 Requests served: {server.stats}")
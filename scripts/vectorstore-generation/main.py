@@ -1,44 +1,297 @@
-### This file generates a pipeline that creates vectorstores
-### and JSON versions of those vectorstores.
-
-# import pandas as pd
-from generate_vectorstore_chroma import generate_vectorstore
-from export_vectorstore_json import export_json
-from generate_llm_response import generate_llm_response
-
-# Define input and output file parameters
-bible_input = "source-files/bible.txt"
-bible_output = "bible"
-bible_output_directory = "./chroma_langchain_db"
-homer_input = "source-files/homer_lines.txt"
-homer_output = "homer"
-homer_output_directory = "./homer_chroma_db"
-barbie_input = "source-files/barbie_final_shooting_script.pdf"
-barbie_output = "barbie"
-barbie_output_directory = "./barbie_chroma_db"
-
-### SUMMARY - WORKFLOW:
-# 1. Generate vector store for the datasets (e.g. Bible, The Simpsons, etc.).
-# 2. Export the vector store embeddings to JSON format.
-# 3. Test generating a response from the LLM using the vector store.
-### Upload output of 1 and 2 to supabase storage.
+### This file is the build orchestrator that creates vectorstores
+### and exported (JSON / binary) versions of those vectorstores.
+### Personas are described by the JSON manifests in the personas folder.
+
+### SUMMARY - WORKFLOW (per persona):
+# 1. parse:    Generate Document objects from the source file (e.g. Bible, The Simpsons, etc.).
+#    chunk:    Merge adjacent lines into token-bounded windows (personas with "chunking", see chunk_documents.py).
+#    dedupe:   Collapse exact and near-duplicate documents (personas with "dedupe", see dedupe_documents.py).
+#              It runs after chunk on purpose: chunking needs every parsed line in reading order
+#              (scene headings and the gaps between lines decide the windows), and a line collapsed
+#              into its first occurrence would vanish from every later exchange. Dedupe then
+#              collapses the repeated windows, one-line windows and scene headings.
+# 2. embed:    Embed every document into the content-hash embedding cache.
+# 3. store:    Write the documents and cached embeddings to a Chroma vector store.
+#    lexical:  Build the BM25 and verse / character lookup index of the documents (see lexical_index.py).
+# 4. export:   Export the vector store to JSON and binary formats.
+# 5. compress: Gzip the JSON export for the edge function.
+### Upload outputs of 4 and 5 to supabase storage.
 ### ---------- ####
+# Like make, each step is skipped when the hash of its inputs matches the last
+# successful run and its outputs still exist. Independent personas are built
+# in parallel in a process pool.
+# Example Usage:
+# python3 main.py
+# python3 main.py --personas homer barbie --force
+
+import os
+import json
+import gzip
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_openai.embeddings import OpenAIEmbeddings
+from generate_vectorstore_chroma import load_source_documents, build_vectorstore
+from export_vectorstore_json import export_json, export_binary, sha256_file
+from chunk_documents import chunk_documents, chunk_options
+from dedupe_documents import dedupe_documents, dedupe_options
+from embedding_cache import ContentEmbeddingCache, embed_documents_cached, embedding_model_name
+from lexical_index import build_lexical_index, lexical_index_directory
+from persona_registry import get_registry, BASE_DIRECTORY, PERSONA_DIRECTORY
+import store_registry
+import daemon_client
+
+BUILD_DIRECTORY = ".build"
+EMBED_BATCH_SIZE = 50
+
+
+def load_persona_manifest(persona_directory=PERSONA_DIRECTORY):
+    """
+    Loads every persona configuration in persona_directory (see persona_registry.py).
+
+    Returns:
+    list: Persona dicts sorted by name.
+    """
+    return [persona.to_dict() for persona in get_registry(persona_directory).all()]
+
+
+def step_key(step, params, *inputs):
+    """Returns a sha256 over a step's name, parameters and input hashes."""
+    encoded = json.dumps([step, params, list(inputs)], sort_keys=True)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def relabel_source(docs, source, label):
+    """Yields docs with a "source" metadata equal to the source path replaced by label."""
+    for doc in docs:
+        if doc.metadata.get("source") == source:
+            doc.metadata["source"] = label
+        yield doc
+
+
+def write_documents(docs, path):
+    """Writes Document objects to a JSON Lines file."""
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        for doc in docs:
+            f.write(json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False) + "\n")
+    os.replace(path + ".tmp", path)
+
+
+def read_documents(path):
+    """Reads Document objects written by write_documents()."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [Document(**json.loads(line)) for line in f]
+
+
+def gzip_file(path):
+    """Writes path.gz next to path, keeping the original (like gzip -k)."""
+    with open(path, "rb") as source, gzip.open(path + ".gz", "wb") as target:
+        shutil.copyfileobj(source, target)
+
+
+class BuildState:
+    """
+    The input hash of every successful step for one persona,
+    saved in .build/<persona>/state.json.
+    """
+
+    def __init__(self, build_directory):
+        self.path = os.path.join(build_directory, "state.json")
+        self.keys = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self.keys = json.load(f)
+
+    def run(self, step, key, outputs, action, force=False):
+        """
+        Runs action() unless the step's key matches the last run and every output exists.
+
+        Returns:
+        bool: True if the step ran, False if it was skipped.
+        """
+        if not force and self.keys.get(step) == key and all(os.path.exists(output) for output in outputs):
+            print(f"⏭️ {step}: up to date, skipping.")
+            return False
+        print(f"▶️ {step}: running...")
+        action()
+        self.keys[step] = key
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.keys, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+        return True
+
+
+def embed_documents_into_cache(docs, embeddings, workers=4):
+    """Embeds every document into the content-hash embedding cache with a pool of workers."""
+    cache = ContentEmbeddingCache()
+    texts = [doc.page_content for doc in docs]
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        embedded = sum(num for _, num in pool.map(lambda batch: embed_documents_cached(embeddings, batch, cache), batches))
+    print(f"🧮 Embedded {embedded} new or changed texts for {len(texts)} documents.")
+
+
+def build_persona(persona, force=False, workers=4):
+    """
+    Builds one persona through parse -> (chunk) -> (dedupe) -> embed -> store -> lexical -> export -> compress,
+    skipping steps whose inputs have not changed.
+
+    Parameters:
+    persona (dict): The persona manifest (name, source, vectorstore_path, optional chunking, dedupe, ann_index, quantization and dimensions).
+    force (bool): Run every step even if it is up to date.
+    workers (int): Number of concurrent embedding workers.
+
+    Returns:
+    dict: step -> "ran" or "skipped".
+    """
+    name = persona["name"]
+    source = persona["source"]
+    vectorstore_path = persona["vectorstore_path"]
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"The source file {source} for persona '{name}' does not exist.")
+
+    build_directory = os.path.join(BUILD_DIRECTORY, name)
+    os.makedirs(build_directory, exist_ok=True)
+    os.makedirs(vectorstore_path, exist_ok=True)
+    state = BuildState(build_directory)
+    results = {}
+
+    load_dotenv()
+    embeddings = OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL"))
+    model = embedding_model_name(embeddings)
+
+    docs_path = os.path.join(build_directory, "documents.jsonl")
+    json_path = os.path.join(vectorstore_path, "embeddings.json")
+    binary_path = os.path.join(vectorstore_path, "embeddings")
+    gzip_path = json_path + ".gz"
+
+    # 1. parse: keyed by the source file content.
+    # Persona paths are absolute (see persona_registry.py); the source is labelled by its path
+    # relative to this directory so document ids and step keys do not depend on the checkout.
+    label = os.path.relpath(source, BASE_DIRECTORY)
+    key = step_key("parse", {"source": label}, sha256_file(source))
+    results["parse"] = state.run(
+        "parse", key, [docs_path], lambda: write_documents(relabel_source(load_source_documents(source), source, label), docs_path), force
+    )
+
+    # chunk: keyed by the parsed documents and the chunking options.
+    # Personas without "chunking" keep one document per parsed line. Scene headings and
+    # empty documents are kept as documents of their own unless "chunking" has "drop_empty": true.
+    chunking = chunk_options(persona.get("chunking"))
+    if chunking is not None:
+        parsed_path = docs_path
+        docs_path = os.path.join(build_directory, "chunked_documents.jsonl")
+        key = step_key("chunk", chunking, sha256_file(parsed_path))
+        results["chunk"] = state.run(
+            "chunk", key, [docs_path],
+            lambda: write_documents(chunk_documents(read_documents(parsed_path), **chunking), docs_path), force
+        )
+
+    # dedupe: keyed by the (chunked) documents and the dedupe options. Runs after chunk (see above).
+    # Personas without "dedupe" embed these documents directly.
+    dedupe = dedupe_options(persona.get("dedupe"))
+    if dedupe is not None:
+        deduped_input = docs_path
+        docs_path = os.path.join(build_directory, "deduped_documents.jsonl")
+        key = step_key("dedupe", dedupe, sha256_file(deduped_input))
+        results["dedupe"] = state.run(
+            "dedupe", key, [docs_path],
+            lambda: write_documents(dedupe_documents(read_documents(deduped_input), **dedupe), docs_path), force
+        )
+
+    # 2. embed: keyed by the (chunked, deduplicated) documents and the embedding model.
+    docs_hash = sha256_file(docs_path)
+    key = step_key("embed", {"model": model}, docs_hash)
+    results["embed"] = state.run("embed", key, [], lambda: embed_documents_into_cache(read_documents(docs_path), embeddings, workers), force)
+
+    # 3. store: keyed by the parsed documents and the embedding model.
+    store_key = step_key("store", {"model": model, "collection": name, "path": vectorstore_path}, docs_hash)
+    results["store"] = state.run(
+        "store", store_key, [os.path.join(vectorstore_path, "chroma.sqlite3")],
+        lambda: build_vectorstore(read_documents(docs_path), name, vectorstore_path, workers=workers, resume=False, reset=True),
+        force
+    )
+
+    # lexical: keyed by the stored documents.
+    lexical_path = lexical_index_directory(vectorstore_path)
+    key = step_key("lexical", {}, docs_hash)
+    results["lexical"] = state.run("lexical", key, [lexical_path],
+                                   lambda: build_lexical_index(read_documents(docs_path), lexical_path), force)
+
+    # 4. export: keyed by the store step (the Chroma files are not byte-stable across opens).
+    # Personas with "ann_index": true also get an IVF index next to each export (see ann_index.py),
+    # and personas with "quantization": ["int8", "pq"] quantized copies (see quantization.py).
+    # Personas with "dimensions": n are exported with n dimensions (see dimension_reduction.py).
+    ann_index = bool(persona.get("ann_index", False))
+    quantization = sorted(persona.get("quantization", []))
+    dimensions = persona.get("dimensions")
+    params = {}
+    if dimensions:
+        params["dimensions"] = dimensions
+    if ann_index:
+        params["ann_index"] = True
+    if quantization:
+        params["quantization"] = quantization
+    key = step_key("export", params, store_key)
+    def export():
+        export_json(vectorstore_path, name, ann_index=ann_index, quantization=quantization, dimensions=dimensions)
+        export_binary(vectorstore_path, name, ann_index=ann_index, quantization=quantization, dimensions=dimensions)
+    results["export"] = state.run("export", key, [json_path, binary_path], export, force)
+
+    # 5. compress: keyed by the JSON export content.
+    key = step_key("compress", {}, sha256_file(json_path))
+    results["compress"] = state.run("compress", key, [gzip_path], lambda: gzip_file(json_path), force)
+
+    # A running query daemon re-opens the rebuilt store, lexical index and exports.
+    if results["store"] or results["lexical"] or results["export"]:
+        daemon_client.invalidate(vectorstore_path, name)
+
+    return {step: "ran" if ran else "skipped" for step, ran in results.items()}
+
+
+def build_all(personas, jobs=None, force=False, workers=4):
+    """
+    Builds independent personas in parallel in a process pool.
+
+    Returns:
+    dict: persona name -> step results (or the error message).
+    """
+    jobs = jobs or min(len(personas), os.cpu_count() or 1)
+    summary = {}
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {persona["name"]: pool.submit(build_persona, persona, force, workers) for persona in personas}
+        for name, future in futures.items():
+            try:
+                summary[name] = future.result()
+            except Exception as e:
+                print(f"❌ Build of persona '{name}' failed: {e}")
+                summary[name] = {"error": str(e)}
+    return summary
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--personas", nargs="*", default=None, help="Persona names to build (default: all).")
+    parser.add_argument("--persona_directory", type=str, default=PERSONA_DIRECTORY, help="Directory of persona manifests.")
+    parser.add_argument("--jobs", type=int, default=None, help="Number of personas built in parallel.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent embedding workers per persona.")
+    parser.add_argument("--force", action="store_true", help="Run every step even if it is up to date.")
+    parser.add_argument("--openai_base_url", type=str, default=None, help="Send OpenAI requests to this URL (e.g. the local stand-in server).")
+    args = parser.parse_args()
+    if args.openai_base_url:
+        store_registry.set_openai_base_url(args.openai_base_url)
+
+    personas = load_persona_manifest(args.persona_directory)
+    if args.personas:
+        personas = [persona for persona in personas if persona["name"] in args.personas]
+
+    print(f"Building {len(personas)} personas: {', '.join(persona['name'] for persona in personas)}")
+    summary = build_all(personas, args.jobs, args.force, args.workers)
 
-# 1. Generate vector stores.
-generate_vectorstore(bible_input, bible_output, bible_output_directory) # The Bible
-generate_vectorstore(homer_input, homer_output, homer_output_directory)  # Homer Simpson
-# generate_vectorstore(barbie_input, barbie_output, barbie_output_directory)  # Barbie
-
-# 2. Convert vector store embeddings to JSON format.
-export_json(vectorstore_path=bible_output_directory)  # The Bible
-export_json(vectorstore_path=homer_output_directory) # Homer Simpson
-# export_json(vectorstore_path=barbie_output_directory) # Barbie
-
-# 3. Test generating a response from the LLM using a given vector store.
-# Create a retriever from vector store, then generate RAG chain and get response from LLM.
-question = "What does the Bible say about love?"
-response_for_user = generate_llm_response(bible_output_directory, bible_output, question)
-print(f"\n\n{response_for_user}\n\n")
-question = "What's for dinner?"
-response_for_user = generate_llm_response(homer_output_directory, homer_output, question)
-print(f"\n\n{response_for_user}\n\n")
+    print("=== BUILD SUMMARY ===")
+    for name, steps in summary.items():
+        print(f"{name}: {steps}")
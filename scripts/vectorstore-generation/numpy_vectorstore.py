@@ -0,0 +1,228 @@
+# This file contains an in-process vector store backed by NumPy.
+# It loads a persona exported by export_vectorstore_json.py (binary directory
+# or embeddings.json) into a contiguous, L2-normalized float32 matrix and
+# answers top-k cosine similarity queries without opening Chroma.
+# If the export has an ANN index (see ann_index.py), queries only score the
+# vectors in the nprobe closest IVF lists instead of every vector.
+# With a quantization kind ("int8" or "pq", see quantization.py) only the compressed
+# codes are held in memory and scored directly.
+# Exports reduced to fewer dimensions (see dimension_reduction.py) apply the same
+# truncation or PCA projection to full-dimension query vectors before searching.
+# It is used as the "numpy" backend of query_vectorstore.py.
+
+import os
+import json
+import numpy as np
+from langchain_core.documents import Document
+from ann_index import load_ivf_index
+from quantization import load_quantized
+from dimension_reduction import load_reduction
+from export_vectorstore_json import BINARY_MANIFEST_FILE, load_binary_export
+
+# Metadata keys that get precomputed index masks for filtering.
+DEFAULT_FILTER_KEYS = ("character",)
+
+
+def normalize_rows(matrix):
+    """Returns a contiguous float32 copy of matrix with every row scaled to unit length."""
+    matrix = np.array(matrix, dtype=np.float32, order="C", copy=True)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def top_k_indices(scores, k):
+    """
+    Returns the indices of the k highest scores along the last axis, best first.
+    Uses argpartition so only the k winners are sorted.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+class NumpyVectorStore:
+    """
+    Cosine similarity search over an exported persona held in memory.
+
+    Parameters:
+    matrix (array): (count, dimension) embeddings, any float dtype. May be None if quantized is given.
+    texts (list): Page content for each row.
+    metadatas (list): Metadata dict for each row.
+    filter_keys (tuple): Metadata keys to build index masks for.
+    ann_index (IVFIndex): Optional ANN index over matrix (see ann_index.py).
+    quantized (ScalarQuantizer or ProductQuantizer): Optional compressed codes to search
+        instead of the float matrix (see quantization.py).
+    reduction (DimensionReduction): Optional reduction the export's vectors went through,
+        applied to full-dimension queries (see dimension_reduction.py).
+    """
+
+    def __init__(self, matrix, texts, metadatas, filter_keys=DEFAULT_FILTER_KEYS, ann_index=None, quantized=None,
+                 reduction=None):
+        count = len(matrix) if quantized is None else len(quantized)
+        if len(texts) != count or len(metadatas) != count:
+            raise ValueError("❌ matrix, texts and metadatas must have the same length.")
+        if ann_index is not None and ann_index.meta["count"] != count:
+            raise ValueError("❌ The ANN index does not match the export. Rebuild it with ann_index.py.")
+        self.matrix = normalize_rows(matrix) if quantized is None else None
+        self.quantized = quantized
+        self.reduction = reduction
+        self.texts = texts
+        self.metadatas = metadatas
+        self.masks = self._build_masks(filter_keys)
+        self.ann_index = ann_index
+
+    def _build_masks(self, filter_keys):
+        """Precomputes, for each filter key and value, the sorted row indices holding that value."""
+        masks = {}
+        for key in filter_keys:
+            rows_by_value = {}
+            for row, metadata in enumerate(self.metadatas):
+                if key in metadata:
+                    rows_by_value.setdefault(metadata[key], []).append(row)
+            masks[key] = {value: np.asarray(rows, dtype=np.int64) for value, rows in rows_by_value.items()}
+        return masks
+
+    @classmethod
+    def from_export(cls, export_path, filter_keys=DEFAULT_FILTER_KEYS, quantization=None):
+        """
+        Loads a persona export created by export_vectorstore_json.py, with its ANN index
+        and dimension reduction if it has them.
+
+        Parameters:
+        export_path (str): A binary export directory (containing manifest.json) or an embeddings.json file.
+        filter_keys (tuple): Metadata keys to build index masks for.
+        quantization (str): Load the export's "int8" or "pq" codes instead of the float matrix.
+
+        Returns:
+        NumpyVectorStore: The loaded store.
+        """
+        if os.path.isdir(export_path) and os.path.exists(os.path.join(export_path, BINARY_MANIFEST_FILE)):
+            matrix, texts, metadatas, _ = load_binary_export(export_path, mmap=True)
+        elif os.path.isfile(export_path):
+            with open(export_path, "r") as f:
+                data = json.load(f)
+            matrix, texts, metadatas = data["embeddings"], data["texts"], data["metadata"]
+        else:
+            raise FileNotFoundError(f"No persona export found at {export_path}.")
+        quantized = load_quantized(export_path, quantization) if quantization else None
+        return cls(None if quantized else matrix, texts, metadatas, filter_keys,
+                   load_ivf_index(export_path), quantized, load_reduction(export_path))
+
+    def __len__(self):
+        return len(self.texts)
+
+    def candidate_rows(self, filter=None):
+        """
+        Returns the row indices allowed by a {"key": value} filter, or None for all rows.
+        Only keys with precomputed masks are supported.
+        """
+        if not filter:
+            return None
+        rows = None
+        for key, value in filter.items():
+            if key not in self.masks:
+                raise ValueError(f"❌ No index mask for metadata key '{key}'. Add it to filter_keys.")
+            value_rows = self.masks[key].get(value, np.empty(0, dtype=np.int64))
+            rows = value_rows if rows is None else np.intersect1d(rows, value_rows, assume_unique=True)
+        return rows
+
+    def scores_for(self, query_vectors, rows=None):
+        """Returns cosine scores of shape (num_queries, num_rows) for normalized query vectors."""
+        if self.quantized is not None:
+            return self.quantized.scores(query_vectors, rows)
+        if rows is None:
+            return query_vectors @ self.matrix.T
+        return (query_vectors @ self.matrix.T)[:, rows] if len(rows) > len(self) // 4 else query_vectors @ self.matrix[rows].T
+
+    def use_ann_index(self, nprobe, rows):
+        """
+        Returns True if a search should go through the ANN index: an index exists, nprobe is
+        not 0 and the filter leaves more rows than the probed lists would hold on average.
+        """
+        if self.ann_index is None or nprobe == 0:
+            return False
+        if rows is None:
+            return True
+        nprobe = nprobe or self.ann_index.nprobe
+        return len(rows) > len(self) * nprobe / self.ann_index.nlist
+
+    def prepare_queries(self, query_vectors):
+        """Returns unit-length query vectors, reduced first if the export was reduced and they are full-dimension."""
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        if self.reduction is not None and queries.shape[1] == self.reduction.source_dimension:
+            queries = self.reduction.apply(queries)
+        return normalize_rows(queries)
+
+    def document(self, row):
+        return Document(page_content=self.texts[row], metadata=dict(self.metadatas[row]))
+
+    def search_batch_with_scores(self, query_vectors, k=5, filter=None, nprobe=None):
+        """
+        Runs top-k cosine search for a batch of query vectors with a single matrix product,
+        or through the ANN index when the export has one.
+
+        Parameters:
+        query_vectors (array): (num_queries, dimension) query embeddings.
+        k (int): Number of results per query.
+        filter (dict): Optional metadata filter, e.g. {"character": "Homer Simpson"}.
+        nprobe (int): IVF lists probed per query. None uses the index default, 0 forces exact search.
+
+        Returns:
+        list: For each query, a list of (Document, score) tuples, best first.
+        """
+        queries = self.prepare_queries(query_vectors)
+        rows = self.candidate_rows(filter)
+        if rows is not None and len(rows) == 0:
+            return [[] for _ in range(len(queries))]
+
+        if self.use_ann_index(nprobe, rows):
+            allowed = None
+            if rows is not None:
+                allowed = np.zeros(len(self), dtype=bool)
+                allowed[rows] = True
+            return [
+                [(self.document(int(row)), float(score)) for row, score in zip(best_rows, best_scores)]
+                for best_rows, best_scores in self.ann_index.search(
+                    self.matrix if self.quantized is None else self.quantized, queries, k, nprobe, allowed)
+            ]
+
+        scores = self.scores_for(queries, rows)
+        best = top_k_indices(scores, k)
+
+        results = []
+        for query_index, positions in enumerate(best):
+            matches = []
+            for position in positions:
+                row = int(position if rows is None else rows[position])
+                matches.append((self.document(row), float(scores[query_index, position])))
+            results.append(matches)
+        return results
+
+    def search_batch(self, query_vectors, k=5, filter=None, nprobe=None):
+        """Same as search_batch_with_scores() but returns only the Document objects."""
+        return [[doc for doc, _ in matches] for matches in self.search_batch_with_scores(query_vectors, k, filter, nprobe)]
+
+    def search(self, query_vector, k=5, filter=None, nprobe=None):
+        """Returns the top-k Document objects for a single query vector."""
+        return self.search_batch([query_vector], k, filter, nprobe)[0]
+
+
+def default_export_path(vectorstore_path):
+    """
+    Returns the export to load for a Chroma vector store directory:
+    the binary "embeddings" directory if present, otherwise embeddings.json.
+    """
+    binary_directory = os.path.join(vectorstore_path, "embeddings")
+    if os.path.exists(os.path.join(binary_directory, BINARY_MANIFEST_FILE)):
+        return binary_directory
+    return os.path.join(vectorstore_path, "embeddings.json")
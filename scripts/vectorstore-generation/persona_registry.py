@@ -0,0 +1,183 @@
+# This file is the single registry of personas, loaded from the personas folder.
+# Each persona is one JSON file holding its source file, Chroma vector store path,
+# default character filter, Weaviate collection name and schema file, and its prompt.
+# Only the file names are listed when the registry is created; a persona's JSON is
+# parsed the first time it is used, and its prompt is compiled into a
+# ChatPromptTemplate once and cached, so startup stays fast as personas are added.
+# Example Usage:
+# python3 persona_registry.py            (lists every persona)
+# python3 persona_registry.py homer      (prints one persona and its prompt)
+
+import os
+import json
+import argparse
+import threading
+
+# Relative paths in persona files (source, vectorstore_path, collection_schema) are
+# relative to this directory, so personas are found from any working directory.
+BASE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PERSONA_DIRECTORY = os.path.join(BASE_DIRECTORY, "personas")
+PATH_KEYS = ("source", "vectorstore_path", "collection_schema")
+
+# Prompt of personas without a JSON file, so answering them does not fail.
+FALLBACK_PROMPT = "\n".join([
+    "Answer the following question in a few sentences, using this context where it helps:",
+    "{context}",
+    "",
+    "Now respond to the following question:",
+    "{question}"
+])
+
+
+def resolve_path(path):
+    """Returns path made absolute against BASE_DIRECTORY (None and absolute paths are returned unchanged)."""
+    if path is None or os.path.isabs(path):
+        return path
+    return os.path.normpath(os.path.join(BASE_DIRECTORY, path))
+
+
+class PersonaConfig:
+    """
+    The configuration of one persona, as stored in personas/<name>.json.
+
+    Parameters:
+    data (dict): The parsed persona JSON. Relative paths are resolved against BASE_DIRECTORY.
+    """
+
+    def __init__(self, data):
+        data = dict(data, **{key: resolve_path(data[key]) for key in PATH_KEYS if key in data})
+        self.name = data["name"]
+        self.source = data["source"]
+        self.vectorstore_path = data["vectorstore_path"]
+        self.collection = data.get("collection", self.name.title())
+        self.collection_schema_path = data.get("collection_schema")
+        self.character = data.get("character", "None")
+        prompt = data.get("prompt", "")
+        self.prompt = "\n".join(prompt) if isinstance(prompt, list) else prompt
+        self._data = data
+        self._prompt_template = None
+        self._collection_schema = None
+        self._lock = threading.Lock()
+
+    @property
+    def prompt_template(self):
+        """The persona's prompt compiled into a ChatPromptTemplate, built once."""
+        with self._lock:
+            if self._prompt_template is None:
+                from langchain.prompts import ChatPromptTemplate
+                self._prompt_template = ChatPromptTemplate.from_template(self.prompt)
+            return self._prompt_template
+
+    @property
+    def collection_schema(self):
+        """The Weaviate collection schema (see collection-properties), loaded once."""
+        with self._lock:
+            if self._collection_schema is None and self.collection_schema_path:
+                with open(self.collection_schema_path, "r") as f:
+                    self._collection_schema = json.load(f)
+            return self._collection_schema
+
+    def to_dict(self):
+        """Returns the persona as a plain dict (the parsed JSON, with absolute paths)."""
+        return dict(self._data)
+
+
+class PersonaRegistry:
+    """
+    Lazily loaded personas from a directory of <name>.json files.
+
+    Parameters:
+    directory (str): The directory of persona JSON files.
+    """
+
+    def __init__(self, directory=PERSONA_DIRECTORY):
+        self.directory = directory
+        self._paths = {
+            entry.name[:-len(".json")]: entry.path
+            for entry in os.scandir(directory)
+            if entry.is_file() and entry.name.endswith(".json")
+        }
+        self._personas = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        """Returns every persona name, sorted, without loading any persona."""
+        return sorted(self._paths)
+
+    def __contains__(self, name):
+        return name in self._paths
+
+    def get(self, name):
+        """Returns the PersonaConfig for name, loading it on first use."""
+        with self._lock:
+            persona = self._personas.get(name)
+            if persona is None:
+                if name not in self._paths:
+                    raise KeyError(f"❌ Unknown persona '{name}'. Add {name}.json to the {self.directory} folder.")
+                with open(self._paths[name], "r") as f:
+                    persona = PersonaConfig(json.load(f))
+                self._personas[name] = persona
+            return persona
+
+    def all(self):
+        """Returns every PersonaConfig, sorted by name."""
+        return [self.get(name) for name in self.names()]
+
+
+_lock = threading.Lock()
+_registries = {}
+_fallbacks = {}
+
+
+def get_registry(directory=PERSONA_DIRECTORY):
+    """Returns the process-wide PersonaRegistry for a directory, created on first use."""
+    key = os.path.abspath(directory)
+    with _lock:
+        if key not in _registries:
+            _registries[key] = PersonaRegistry(directory)
+        return _registries[key]
+
+
+def get(name, directory=PERSONA_DIRECTORY):
+    """Returns the PersonaConfig for name from the default registry."""
+    return get_registry(directory).get(name)
+
+
+def get_or_fallback(name, directory=PERSONA_DIRECTORY):
+    """
+    Returns the PersonaConfig for name from the default registry, or for an unknown
+    persona a PersonaConfig with FALLBACK_PROMPT (created once per name).
+    """
+    registry = get_registry(directory)
+    if name in registry:
+        return registry.get(name)
+    with _lock:
+        if name not in _fallbacks:
+            print(f"⚠️ Unknown persona '{name}', using the generic prompt. Add {name}.json to the {directory} folder.")
+            _fallbacks[name] = PersonaConfig({"name": name, "source": None, "vectorstore_path": None, "prompt": FALLBACK_PROMPT})
+        return _fallbacks[name]
+
+
+def names(directory=PERSONA_DIRECTORY):
+    """Returns every persona name in the default registry."""
+    return get_registry(directory).names()
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("name", nargs="?", default=None, help="A persona to print (default: list every persona).")
+    parser.add_argument("--persona_directory", type=str, default=PERSONA_DIRECTORY, help="Directory of persona JSON files.")
+    args = parser.parse_args()
+
+    registry = get_registry(args.persona_directory)
+    if args.name:
+        persona = registry.get(args.name)
+        for key, value in persona.to_dict().items():
+            if key != "prompt":
+                print(f"{key}: {value}")
+        print(f"=== PROMPT ===\n{persona.prompt}")
+    else:
+        for persona in registry.all():
+            print(f"{persona.name}: source={persona.source}, vectorstore_path={persona.vectorstore_path}, "
+                  f"collection={persona.collection}, character={persona.character}")
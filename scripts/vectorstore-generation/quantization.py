@@ -0,0 +1,315 @@
+# This file compresses exported embeddings so a persona's full corpus fits in far less memory:
+# - int8: scalar quantization with a per-dimension offset and scale (4x smaller than float32).
+# - pq:   product quantization. Each vector is split into m sub-vectors and each
+#         sub-vector is stored as the 1-byte id of its nearest centroid in a trained
+#         256-entry codebook (dimension * 4 / m times smaller than float32).
+# Searches score the query against the compressed codes directly (asymmetric
+# distance): int8 codes are multiplied with the scaled query, and pq codes are
+# summed from a per-query lookup table, so vectors are never decompressed.
+# Every quantized export records its recall@5 against the float32 original.
+# It is saved next to the export (like the ANN index, see ann_index.py):
+# - codes.npy:          (count, dimension) int8 or (count, m) uint8 codes.
+# - offsets.npy / scales.npy (int8) or codebooks.npy (pq, (m, 256, dimension / m) float32).
+# - quantization.json:  kind, count, dimension, sizes and the measured recall@5.
+# Example Usage:
+# python3 quantization.py ./vector-store/bible_chroma_db/embeddings --kind int8 pq
+
+import os
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+from ann_index import unit_rows, sample_queries, load_export_matrix
+
+QUANTIZATION_FORMAT_VERSION = 1
+QUANTIZATION_META_FILE = "quantization.json"
+CODES_FILE = "codes.npy"
+QUANTIZATION_KINDS = ("int8", "pq")
+
+PQ_CENTROIDS = 256
+PQ_ITERATIONS = 15
+PQ_TRAINING_POINTS = 20000
+RECALL_K = 5
+RECALL_QUERIES = 200
+
+
+def quantized_directory_for(export_path, kind):
+    """
+    Returns where a quantized copy of an export lives: a "<kind>" directory inside a
+    binary export directory, or "<name>_<kind>" next to a JSON export file.
+    """
+    if os.path.isdir(export_path):
+        return os.path.join(export_path, kind)
+    return os.path.splitext(export_path)[0] + "_" + kind
+
+
+def default_subspaces(dimension):
+    """Returns the default number of PQ sub-vectors: the largest divisor of dimension up to dimension / 8."""
+    for m in range(max(1, dimension // 8), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+class ScalarQuantizer:
+    """
+    int8 codes with a per-dimension offset and scale: vector ~= (codes + 128) * scales + offsets.
+
+    Parameters:
+    codes (array): (count, dimension) int8 codes.
+    offsets (array): (dimension,) float32 minimum of each dimension.
+    scales (array): (dimension,) float32 step of each dimension.
+    meta (dict): The contents of quantization.json.
+    """
+
+    kind = "int8"
+
+    def __init__(self, codes, offsets, scales, meta=None):
+        self.codes = codes
+        self.offsets = offsets
+        self.scales = scales
+        self.meta = meta or {}
+
+    @classmethod
+    def fit(cls, vectors):
+        """Quantizes unit-length float32 vectors."""
+        offsets = vectors.min(axis=0)
+        scales = (vectors.max(axis=0) - offsets) / 255.0
+        scales[scales == 0] = 1.0
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, len(vectors), 65536):
+            chunk = (vectors[start:start + 65536] - offsets) / scales
+            codes[start:start + 65536] = np.clip(np.rint(chunk) - 128, -128, 127)
+        return cls(codes, offsets.astype(np.float32), scales.astype(np.float32))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _query_terms(self, queries):
+        # q . x = codes . (q * scales) + q . (128 * scales + offsets)
+        weights = queries * self.scales
+        return weights, queries @ (128 * self.scales + self.offsets)
+
+    def scores(self, queries, rows=None, chunk_size=65536):
+        """Returns approximate dot products of shape (num_queries, num_rows) from the codes."""
+        weights, constant = self._query_terms(queries)
+        codes = self.codes if rows is None else self.codes[rows]
+        result = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), chunk_size):
+            result[:, start:start + chunk_size] = weights @ np.asarray(codes[start:start + chunk_size], dtype=np.float32).T
+        return result + constant[:, None]
+
+    def score_rows(self, rows, query):
+        """Returns approximate dot products of one query with the given rows."""
+        return self.scores(query[None, :], rows)[0]
+
+    def arrays(self):
+        return {"offsets.npy": self.offsets, "scales.npy": self.scales}
+
+    @classmethod
+    def from_arrays(cls, codes, arrays, meta):
+        return cls(codes, arrays["offsets.npy"], arrays["scales.npy"], meta)
+
+
+class ProductQuantizer:
+    """
+    Product quantization codes: sub-vector j of a vector ~= codebooks[j, codes[:, j]].
+
+    Parameters:
+    codes (array): (count, m) uint8 codes.
+    codebooks (array): (m, 256, dimension / m) float32 centroids.
+    meta (dict): The contents of quantization.json.
+    """
+
+    kind = "pq"
+
+    def __init__(self, codes, codebooks, meta=None):
+        self.codes = codes
+        self.codebooks = codebooks
+        self.meta = meta or {}
+
+    @classmethod
+    def fit(cls, vectors, m=None, iterations=PQ_ITERATIONS, seed=0):
+        """Trains one k-means codebook per sub-vector on a sample, then encodes every vector."""
+        count, dimension = vectors.shape
+        m = m or default_subspaces(dimension)
+        if dimension % m:
+            raise ValueError(f"❌ The dimension {dimension} is not divisible by m={m}.")
+        dsub = dimension // m
+        centroids = min(PQ_CENTROIDS, count)
+
+        rng = np.random.default_rng(seed)
+        training = vectors if count <= PQ_TRAINING_POINTS else vectors[np.sort(rng.choice(count, PQ_TRAINING_POINTS, replace=False))]
+        codebooks = np.zeros((m, PQ_CENTROIDS, dsub), dtype=np.float32)
+        codes = np.empty((count, m), dtype=np.uint8)
+        for j in range(m):
+            sub = np.ascontiguousarray(training[:, j * dsub:(j + 1) * dsub])
+            codebook = sub[rng.choice(len(sub), centroids, replace=False)].copy()
+            for _ in range(iterations):
+                labels = cls._nearest(sub, codebook)
+                sums = np.zeros_like(codebook)
+                np.add.at(sums, labels, sub)
+                counts = np.bincount(labels, minlength=centroids)
+                filled = counts > 0
+                codebook[filled] = sums[filled] / counts[filled, None]
+            codebooks[j, :centroids] = codebook
+            for start in range(0, count, 65536):
+                codes[start:start + 65536, j] = cls._nearest(vectors[start:start + 65536, j * dsub:(j + 1) * dsub], codebook)
+        return cls(codes, codebooks)
+
+    @staticmethod
+    def _nearest(sub, codebook):
+        # argmin ||x - c||^2 = argmax (x . c - ||c||^2 / 2)
+        return np.argmax(sub @ codebook.T - 0.5 * (codebook ** 2).sum(axis=1), axis=1)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def lookup_tables(self, queries):
+        """Returns (num_queries, m, 256) dot products of each query sub-vector with each centroid."""
+        m, _, dsub = self.codebooks.shape
+        return np.einsum("qmd,mcd->qmc", queries.reshape(len(queries), m, dsub), self.codebooks)
+
+    def scores(self, queries, rows=None, chunk_size=8192):
+        """Returns approximate dot products of shape (num_queries, num_rows) summed from lookup tables."""
+        tables = self.lookup_tables(queries)
+        codes = self.codes if rows is None else self.codes[rows]
+        subspaces = np.arange(tables.shape[1])
+        result = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), chunk_size):
+            chunk = np.asarray(codes[start:start + chunk_size], dtype=np.intp)
+            for index, table in enumerate(tables):
+                result[index, start:start + chunk_size] = table[subspaces, chunk].sum(axis=1)
+        return result
+
+    def score_rows(self, rows, query):
+        """Returns approximate dot products of one query with the given rows."""
+        return self.scores(query[None, :], rows)[0]
+
+    def arrays(self):
+        return {"codebooks.npy": self.codebooks}
+
+    @classmethod
+    def from_arrays(cls, codes, arrays, meta):
+        return cls(codes, arrays["codebooks.npy"], meta)
+
+
+QUANTIZERS = {"int8": ScalarQuantizer, "pq": ProductQuantizer}
+
+
+def recall_at_k(vectors, quantizer, k=RECALL_K, num_queries=RECALL_QUERIES, seed=0):
+    """Returns the recall@k of searching the quantized codes, against exact float32 search."""
+    queries = sample_queries(vectors, num_queries, seed)
+    k = min(k, len(vectors))
+    exact = np.argpartition(-(queries @ vectors.T), k - 1, axis=1)[:, :k]
+    approximate = np.argpartition(-quantizer.scores(queries), k - 1, axis=1)[:, :k]
+    hits = sum(len(set(a.tolist()) & set(b.tolist())) for a, b in zip(exact, approximate))
+    return hits / (len(queries) * k)
+
+
+def quantize(matrix, kind, m=None, seed=0):
+    """
+    Quantizes an embedding matrix and measures its recall@5 against the float32 original.
+
+    Parameters:
+    matrix (array): (count, dimension) embeddings, any float dtype (a memory map works).
+    kind (str): "int8" or "pq".
+    m (int): Number of PQ sub-vectors. Defaults to default_subspaces(dimension).
+    seed (int): Random seed.
+
+    Returns:
+    ScalarQuantizer or ProductQuantizer: The quantizer, with its meta filled in.
+    """
+    if kind not in QUANTIZERS:
+        raise ValueError(f"❌ Unsupported quantization '{kind}'. Please use one of {', '.join(QUANTIZATION_KINDS)}.")
+    vectors = unit_rows(matrix)
+    quantizer = ScalarQuantizer.fit(vectors) if kind == "int8" else ProductQuantizer.fit(vectors, m, seed=seed)
+    code_bytes = int(quantizer.codes.nbytes + sum(array.nbytes for array in quantizer.arrays().values()))
+    quantizer.meta = {
+        "format_version": QUANTIZATION_FORMAT_VERSION,
+        "kind": kind,
+        "count": int(len(vectors)),
+        "dimension": int(vectors.shape[1]),
+        "code_bytes_per_vector": int(quantizer.codes.shape[1] * quantizer.codes.itemsize),
+        "bytes": code_bytes,
+        "float32_bytes": int(vectors.nbytes),
+        f"recall_at_{RECALL_K}": round(recall_at_k(vectors, quantizer, seed=seed), 4)
+    }
+    if kind == "pq":
+        quantizer.meta["m"] = int(quantizer.codes.shape[1])
+    return quantizer
+
+
+def save_quantized(directory, quantizer):
+    """Writes a quantizer's codes, parameters and quantization.json to directory."""
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, CODES_FILE), np.ascontiguousarray(quantizer.codes))
+    for name, array in quantizer.arrays().items():
+        np.save(os.path.join(directory, name), np.ascontiguousarray(array, dtype=np.float32))
+    with open(os.path.join(directory, QUANTIZATION_META_FILE), "w") as f:
+        json.dump(quantizer.meta, f, indent=2)
+    return directory
+
+
+def load_quantized(export_path, kind, mmap=True):
+    """Returns the quantizer saved for an export, memory-mapping its codes by default."""
+    directory = quantized_directory_for(export_path, kind)
+    meta_path = os.path.join(directory, QUANTIZATION_META_FILE)
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"No {kind} quantized export found at {directory}. Build it with quantization.py.")
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    quantizer_class = QUANTIZERS[meta["kind"]]
+    names = [name for name in os.listdir(directory) if name.endswith(".npy") and name != CODES_FILE]
+    arrays = {name: np.load(os.path.join(directory, name)) for name in names}
+    codes = np.load(os.path.join(directory, CODES_FILE), mmap_mode="r" if mmap else None)
+    return quantizer_class.from_arrays(codes, arrays, meta)
+
+
+def remove_export_quantization(export_path, keep=()):
+    """Deletes the quantized copies of an export except the kinds in keep, so none go stale after a re-export."""
+    for kind in QUANTIZATION_KINDS:
+        directory = quantized_directory_for(export_path, kind)
+        if kind not in keep and os.path.isdir(directory):
+            shutil.rmtree(directory)
+            print(f"🗑️ Removed the {kind} quantized export at {directory} (the export was rewritten without it).")
+
+
+def build_export_quantization(export_path, kinds, matrix=None, m=None, seed=0):
+    """
+    Quantizes an export with each requested kind and saves the results next to the export.
+
+    Parameters:
+    export_path (str): A binary export directory or an embeddings.json file.
+    kinds (list): Quantization kinds to build, e.g. ["int8", "pq"].
+    matrix (array): The export's embeddings, if already loaded. Loaded from export_path otherwise.
+    m (int): Number of PQ sub-vectors.
+
+    Returns:
+    dict: kind -> quantization.json contents.
+    """
+    results = {}
+    for kind in kinds:
+        directory = quantized_directory_for(export_path, kind)
+        if matrix is None:
+            matrix = load_export_matrix(export_path)
+        started = time.perf_counter()
+        quantizer = quantize(matrix, kind, m, seed)
+        save_quantized(directory, quantizer)
+        meta = results[kind] = quantizer.meta
+        print(f"🗜️ {kind}: {meta['bytes'] / 1e6:.2f} MB ({meta['bytes'] / meta['float32_bytes']:.1%} of float32), "
+              f"recall@{RECALL_K} {meta[f'recall_at_{RECALL_K}']:.3f}, built in {time.perf_counter() - started:.1f}s at {directory}")
+    return results
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("export_path", type=str, help="A binary export directory or an embeddings.json file.")
+    parser.add_argument("--kind", nargs="+", default=["int8"], choices=QUANTIZATION_KINDS, help="Quantization kinds to build.")
+    parser.add_argument("--m", type=int, default=None, help="Number of PQ sub-vectors (default: about dimension / 8).")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    build_export_quantization(args.export_path, args.kind, m=args.m, seed=args.seed)
@@ -0,0 +1,244 @@
+# This file runs a long-lived local query daemon, so the query scripts do not pay
+# for importing langchain / weaviate / openai, loading .env and opening stores on
+# every run. It starts once, pre-warms the configured personas (vector store,
+# embeddings and LLM clients) and serves requests on a localhost HTTP port:
+# - POST /query            query_vectorstore() results as {"documents": [...]}
+# - POST /answer           generate_llm_response() as {"answer": ...}, or JSON Lines
+#                          {"token": ...} followed by {"stats": ...} when "stream" is true
+# - POST /weaviate_query   nearText results from one shared Weaviate connection
+# - POST /invalidate       drops cached handles of a rebuilt or deleted vector store
+# - GET  /health           status, uptime and warm personas
+# - POST /shutdown         stops the daemon
+# query_vectorstore.py, generate_llm_response.py and weaviate_text_query.py use the
+# daemon when it is running and fall back to in-process execution when it is not.
+# Example Usage:
+# python3 query_daemon.py                       (pre-warms every persona)
+# python3 query_daemon.py --personas homer --weaviate
+# python3 query_daemon.py --stop
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import daemon_client
+import persona_registry
+import store_registry
+import tracing
+from query_vectorstore import query_vectorstore
+from generate_llm_response import get_llm, generate_llm_response, stream_llm_response
+
+
+class QueryDaemon(ThreadingHTTPServer):
+    """
+    The daemon's HTTP server. Holds the warm personas and the shared Weaviate client.
+
+    Parameters:
+    address (tuple): (host, port) to listen on.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, QueryDaemonHandler)
+        self.started = time.time()
+        self.warm_personas = []
+        self.requests = 0
+        self._weaviate_client = None
+        self._weaviate_lock = threading.Lock()
+
+    def prewarm(self, persona_names, weaviate=False):
+        """
+        Opens each persona's vector store and the shared clients before the first request.
+        Personas whose vector store has not been built are skipped: opening a missing
+        Chroma path would create an empty store there.
+        """
+        get_llm()
+        store_registry.get_embeddings()
+        for name in persona_names:
+            persona = persona_registry.get(name)
+            if not os.path.isdir(persona.vectorstore_path):
+                print(f"⚠️ Skipped persona '{name}': no vector store at {persona.vectorstore_path}.")
+                continue
+            try:
+                store_registry.get_persona(persona.vectorstore_path, persona.name).vectorstore
+                persona.prompt_template
+                self.warm_personas.append(name)
+                print(f"🔥 Pre-warmed persona '{name}' ({persona.vectorstore_path}).")
+            except Exception as e:
+                print(f"⚠️ Could not pre-warm persona '{name}': {e}")
+        if weaviate:
+            self.weaviate_client()
+
+    def weaviate_client(self):
+        """Returns the shared Weaviate client, connecting on first use."""
+        with self._weaviate_lock:
+            if self._weaviate_client is None:
+                from weaviate_connection import connect_to_weaviate
+                self._weaviate_client = connect_to_weaviate()
+                print("✅ Connected to Weaviate.")
+            return self._weaviate_client
+
+    def server_close(self):
+        super().server_close()
+        with self._weaviate_lock:
+            if self._weaviate_client is not None:
+                self._weaviate_client.close()
+                self._weaviate_client = None
+                print("✅ Weaviate client connection closed successfully.")
+
+
+class QueryDaemonHandler(BaseHTTPRequestHandler):
+    """Request handler of the query daemon."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self.send_json(200, {
+                "status": "ok",
+                "pid": os.getpid(),
+                "uptime_seconds": round(time.time() - self.server.started, 1),
+                "personas": self.server.warm_personas,
+                "requests": self.server.requests
+            })
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_json(400, {"error": "Request body is not valid JSON."})
+            return
+        self.server.requests += 1
+
+        path = self.path.rstrip("/")
+        try:
+            if path == "/query":
+                self.handle_query(body)
+            elif path == "/answer":
+                self.handle_answer(body)
+            elif path == "/weaviate_query":
+                self.handle_weaviate_query(body)
+            elif path == "/invalidate":
+                self.handle_invalidate(body)
+            elif path == "/shutdown":
+                self.send_json(200, {"status": "shutting down"})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            else:
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+        except Exception as e:
+            print(f"❌ {path} failed: {type(e).__name__}: {e}")
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def require_paths(self, body, *keys):
+        """
+        Answers 404 and returns False if a path in body does not exist. Opening a missing
+        Chroma path would create an empty store and answer with no documents.
+        """
+        for key in keys:
+            path = body.get(key)
+            if path and not os.path.exists(path):
+                self.send_json(404, {"error": f"{key} '{path}' does not exist on the daemon's machine (send absolute paths)."})
+                return False
+        return True
+
+    def handle_query(self, body):
+        if not self.require_paths(body, "vectorstore_path", "export_path"):
+            return
+        docs = query_vectorstore(
+            body["query"], body["vectorstore_path"], body["persona"], body.get("character", "None"),
+            body.get("backend", "chroma"), body.get("export_path"), body.get("lexical", "auto")
+        )
+        self.send_json(200, {"documents": [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]})
+
+    def handle_invalidate(self, body):
+        store_registry.invalidate(body["vectorstore_path"], body.get("persona"))
+        print(f"🧹 Invalidated {body.get('persona') or 'every persona'} at {body['vectorstore_path']}.")
+        self.send_json(200, {"status": "invalidated"})
+
+    def handle_answer(self, body):
+        if not self.require_paths(body, "vs_directory"):
+            return
+        arguments = (body["question"], body["vs_directory"], body["persona"], body.get("character", "None"))
+        if not body.get("stream"):
+            self.send_json(200, {"answer": generate_llm_response(*arguments)})
+            return
+
+        # Stream JSON lines as tokens arrive; the response ends when the connection closes.
+        response = stream_llm_response(*arguments)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for token in response:
+                self.wfile.write((json.dumps({"token": token}, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write((json.dumps({"stats": response.stats()}) + "\n").encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            self.wfile.write((json.dumps({"error": f"{type(e).__name__}: {e}"}) + "\n").encode("utf-8"))
+
+    def handle_weaviate_query(self, body):
+        from weaviate_text_query import near_text_objects
+        objects = near_text_objects(
+            self.server.weaviate_client(), body["collection_name"], body["query"],
+            body.get("character_filter", "None"), body.get("num_objects", 5)
+        )
+        self.send_json(200, {"objects": objects})
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default=daemon_client.DEFAULT_DAEMON_URL, help="Address to listen on (localhost only).")
+    parser.add_argument("--personas", nargs="*", default=None, help="Personas to pre-warm (default: all).")
+    parser.add_argument("--persona_directory", type=str, default=persona_registry.PERSONA_DIRECTORY, help="Directory of persona configurations.")
+    parser.add_argument("--weaviate", action="store_true", help="Connect to Weaviate at start-up for /weaviate_query.")
+    parser.add_argument("--trace", type=str, default=None, help="Trace sinks, e.g. prometheus:9464 (see tracing.py).")
+    parser.add_argument("--openai_base_url", type=str, default=None, help="Send OpenAI requests to this URL (e.g. the local stand-in server).")
+    parser.add_argument("--stop", action="store_true", help="Stop a running daemon.")
+    args = parser.parse_args()
+
+    if args.stop:
+        if daemon_client.request("/shutdown", {}, url=args.url) is None:
+            print(f"No query daemon is running at {args.url}.")
+        else:
+            print(f"🛑 Stopped the query daemon at {args.url}.")
+        sys.exit(0)
+
+    if daemon_client.is_running(args.url):
+        print(f"❌ Something is already listening at {args.url}.")
+        sys.exit(1)
+    if args.openai_base_url:
+        store_registry.set_openai_base_url(args.openai_base_url)
+    if args.trace:
+        tracing.configure(args.trace)
+
+    address = urlparse(args.url)
+    daemon = QueryDaemon((address.hostname, address.port))
+    registry = persona_registry.get_registry(args.persona_directory)
+    daemon.prewarm(args.personas if args.personas is not None else registry.names(), args.weaviate)
+    print(f"⚡ Query daemon listening on {args.url} (pid {os.getpid()}).")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+        print(f"👋 Query daemon stopped after {daemon.requests} requests.")
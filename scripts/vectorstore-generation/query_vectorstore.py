@@ -3,14 +3,56 @@
 # For a specific persona (collection) and character (character filter).
 # Example Usage:
 # python3 query_vectorstore.py "What is the capital of France?" /vector-store/homer_chroma_db homer "Homer Simpson"
+# Add --backend numpy to search the exported embeddings in-process instead of opening Chroma,
+# or --backend int8 / pq to search the export's quantized codes (see quantization.py),
+# or --backend sharded to search only the needed shards of a sharded export (see sharded_export.py).
+# Verse references ("John 3:16") and quoted phrases are answered from the local lexical
+# index without an embedding call (see lexical_index.py). --lexical hybrid fuses BM25 and
+# vector results, --lexical only answers every query from BM25 and --lexical off disables the index.
+# If the query daemon is running (see query_daemon.py) the CLI asks it instead,
+# otherwise the query runs in-process. Heavy modules (langchain, chromadb, openai)
+# are imported inside the functions, so the daemon path never loads them.
 
 import os
 import argparse
-from dotenv import load_dotenv
-from langchain_openai.embeddings import OpenAIEmbeddings
-from langchain_chroma.vectorstores import Chroma
+from types import SimpleNamespace
+import daemon_client
+import tracing
 
-def query_vectorstore(query, vectorstore_path, persona, character):
+# Backends that search an export in-process: "numpy" uses the float matrix, "int8" and "pq" the quantized codes,
+# "sharded" the shards of a sharded export.
+NUMPY_BACKENDS = ("numpy", "int8", "pq", "sharded")
+BACKENDS = ("chroma",) + NUMPY_BACKENDS
+# How the lexical index is used: "auto" answers clearly lexical queries from it, "hybrid" also fuses
+# BM25 and vector results of the other queries, "only" never embeds, "off" never uses it.
+LEXICAL_MODES = ("auto", "hybrid", "only", "off")
+
+def default_backend_export(vectorstore_path, backend):
+    """Returns the export a numpy backend searches when no export_path is given."""
+    if backend == "sharded":
+        return os.path.join(vectorstore_path, "shards")
+    from numpy_vectorstore import default_export_path
+    return default_export_path(vectorstore_path)
+
+def lexical_answer(index, query, character, k=5, lexical="auto"):
+    """
+    Returns the lexical index's results for a query that should not go to vector search:
+    every query with lexical "only", otherwise clearly lexical queries (see LexicalIndex.route())
+    that have results. Returns None for the others.
+    """
+    route = index.route(query)
+    if lexical != "only" and route is None:
+        return None
+    search_filter = None if character == "None" else {"character": character}
+    with tracing.span("lexical_search", route=route or "bm25", k=k):
+        results = index.search(query, k=k, filter=search_filter)
+    if not results and lexical != "only":
+        return None
+    print(f"🔤 Answered '{query}' from the lexical index ({route or 'bm25'}) without an embedding call.")
+    return results
+
+@tracing.traced("query_vectorstore")
+def query_vectorstore(query, vectorstore_path, persona, character, backend="chroma", export_path=None, lexical="auto"):
     """
     Queries a Chroma vector store for relevant documents based on a query.
 
@@ -19,10 +61,37 @@ def query_vectorstore(query, vectorstore_path, persona, character):
     vectorstore_path (str): The path to the Chroma vector store.
     persona (str): The persona name.
     character (str): The character to filter documents by.
+    backend (str): "chroma" to query the persisted store, "numpy" to search the exported embeddings in-process,
+        "int8" / "pq" to search the export's quantized codes in-process, or "sharded" to search a sharded export.
+    export_path (str): Export to load for the numpy backends. Defaults to the export inside vectorstore_path.
+    lexical (str): How the lexical index is used, one of LEXICAL_MODES.
 
     Returns:
     list: A list of Document objects that match the query.
     """
+    import store_registry
+
+    if lexical not in LEXICAL_MODES:
+        raise ValueError(f"Unsupported lexical mode. Please use one of {', '.join(LEXICAL_MODES)}.")
+    index = store_registry.get_persona(vectorstore_path, persona).lexical_index() if lexical != "off" else None
+    if index is not None:
+        results = lexical_answer(index, query, character, lexical=lexical)
+        if results is not None:
+            return results
+        if lexical == "hybrid":
+            from lexical_index import reciprocal_rank_fusion
+            vector_results = query_vectorstore(query, vectorstore_path, persona, character, backend, export_path, lexical="off")
+            with tracing.span("lexical_search", route="bm25", k=5):
+                lexical_results = index.search(query, k=5, filter=None if character == "None" else {"character": character})
+            return reciprocal_rank_fusion([vector_results, lexical_results], k=5)
+
+    if backend in NUMPY_BACKENDS:
+        return query_numpy_vectorstore(query, vectorstore_path, persona,
+                                       export_path or default_backend_export(vectorstore_path, backend), character,
+                                       backend=backend)
+    elif backend != "chroma":
+        raise ValueError(f"Unsupported backend. Please use one of {', '.join(BACKENDS)}.")
+
     # debugging output
     print(">> Executing Function: query_vectorstore() in query_vectorstore.py")
     print(f"Creating embeddings and loading vector store from {vectorstore_path}...")
@@ -30,42 +99,121 @@ def query_vectorstore(query, vectorstore_path, persona, character):
     print(f"Using query: '{query}'...")
     print(f"Using character: '{character}'...")
 
-    # 1. Load API key from .env
-    load_dotenv()
-    openai_api_key = os.getenv("OPENAI_API_KEY")
+    # 1-2. Get the (cached) vectorstore for this persona.
+    # See store_registry.py, stores and clients are opened once per process.
+    vectorstore = store_registry.get_persona(vectorstore_path, persona).vectorstore
 
-    # 2. Load vectorstore
-    embeddings = OpenAIEmbeddings(api_key=openai_api_key)
-    vectorstore = Chroma(
-        persist_directory=vectorstore_path,
-        collection_name=persona,
-        embedding_function=embeddings
-        )
-
-    # debugging output
-    print("Generating retriever and conducting similarity search...")
+    # 3. Embed the query (served from the query embedding cache when possible).
+    # This is what the similarity retriever does internally, split out so each stage can be traced.
+    with tracing.span("embed_query"):
+        query_vector = store_registry.get_embeddings().embed_query(query)
 
-    # 3. Perform a similarity search as retriever and return the results.
-    if character == "None":
-        retriever = vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5}
-        )
-    else:
-        # If a character is specified, filter results by that character.
+    # 4. Similarity search, filtered by character if one is specified.
+    search_filter = None
+    if character != "None":
         print(f"Filtering results by character: {character}")
-        retriever = vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5, "filter": {"character": character}}
-        )
+        search_filter = {"character": character}
+    print(f"Conducting similarity search with query: '{query}'...")
+    with tracing.span("similarity_search", backend="chroma", k=5):
+        results = vectorstore.similarity_search_by_vector(query_vector, k=5, filter=search_filter)
+
+    return results
+
+def query_numpy_vectorstore(query, vectorstore_path, persona, export_path, character, k=5, backend="numpy"):
+    """
+    Queries an exported persona in-process with NumpyVectorStore.
+    The export is loaded once per process (see store_registry.py) and reused by later queries.
+
+    Parameters:
+    query (str): The query string to search for.
+    vectorstore_path (str): The path to the Chroma vector store.
+    persona (str): The persona name.
+    export_path (str): Binary export directory or embeddings.json file.
+    character (str): The character to filter documents by.
+    k (int): Number of documents to return.
+    backend (str): "numpy", "int8" / "pq" (the export's quantized codes) or "sharded" (a shards directory).
+
+    Returns:
+    list: A list of Document objects that match the query.
+    """
+    import store_registry
 
     # debugging output
-    print(f"Invoking retriever with query: '{query}'...")
+    print(f"Searching exported embeddings at {export_path} in-process ({backend} backend)...")
 
-    # 4. Invoke the retriever with the query
-    results = retriever.invoke(query)
+    store = store_registry.get_persona(vectorstore_path, persona).export_store(export_path, backend)
+    with tracing.span("embed_query"):
+        query_vector = store_registry.get_embeddings().embed_query(query)
 
-    return results
+    search_filter = None if character == "None" else {"character": character}
+    with tracing.span("similarity_search", backend=backend, k=k):
+        return store.search(query_vector, k=k, filter=search_filter)
+
+@tracing.traced("query_vectorstore_batch")
+def query_vectorstore_batch(queries, vectorstore_path, persona, character, backend="chroma", export_path=None, k=5,
+                            lexical="auto"):
+    """
+    Queries a vector store for many queries at once: every query is embedded in one
+    batched embedding call and searched in one vectorized batch.
+
+    Parameters:
+    queries (list): The query strings to search for.
+    vectorstore_path (str): The path to the Chroma vector store.
+    persona (str): The persona name.
+    character (str): The character to filter documents by.
+    backend (str): "chroma", "numpy", "int8", "pq" or "sharded", as in query_vectorstore().
+    export_path (str): Export to load for the numpy backends. Defaults to the export inside vectorstore_path.
+    k (int): Number of documents to return per query.
+    lexical (str): How the lexical index is used, one of LEXICAL_MODES, as in query_vectorstore().
+
+    Returns:
+    list: For each query, a list of Document objects that match it.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported backend. Please use one of {', '.join(BACKENDS)}.")
+    if lexical not in LEXICAL_MODES:
+        raise ValueError(f"Unsupported lexical mode. Please use one of {', '.join(LEXICAL_MODES)}.")
+    if not queries:
+        return []
+    import store_registry
+    from langchain_core.documents import Document
+
+    handle = store_registry.get_persona(vectorstore_path, persona)
+    index = handle.lexical_index() if lexical != "off" else None
+    if index is not None:
+        # Answer lexical queries from the index, and embed and search the rest in one batch.
+        results = [lexical_answer(index, query, character, k, lexical) for query in queries]
+        remaining = [i for i, result in enumerate(results) if result is None]
+        if remaining:
+            vector_results = query_vectorstore_batch([queries[i] for i in remaining], vectorstore_path, persona, character,
+                                                     backend, export_path, k, lexical="off")
+            for i, docs in zip(remaining, vector_results):
+                results[i] = docs
+            if lexical == "hybrid":
+                from lexical_index import reciprocal_rank_fusion
+                search_filter = None if character == "None" else {"character": character}
+                for i in remaining:
+                    results[i] = reciprocal_rank_fusion([results[i], index.search(queries[i], k=k, filter=search_filter)], k=k)
+        return results
+
+    with tracing.span("embed_query", batch=len(queries)):
+        query_vectors = store_registry.get_embeddings().embed_queries(queries)
+
+    search_filter = None if character == "None" else {"character": character}
+    with tracing.span("similarity_search", backend=backend, k=k, batch=len(queries)):
+        if backend in NUMPY_BACKENDS:
+            store = handle.export_store(export_path or default_backend_export(vectorstore_path, backend), backend)
+            return store.search_batch(query_vectors, k=k, filter=search_filter)
+        result = handle.vectorstore._collection.query(
+            query_embeddings=query_vectors,
+            n_results=k,
+            where=search_filter,
+            include=["documents", "metadatas"]
+        )
+    return [
+        [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+        for texts, metadatas in zip(result["documents"], result["metadatas"])
+    ]
 
 if __name__ == "__main__":
     # Parse command line arguments
@@ -74,11 +222,45 @@ if __name__ == "__main__":
     parser.add_argument("vectorstore_path", type=str, help="The directory where the vector store is persisted.")
     parser.add_argument("persona", type=str, help="The persona being simulated.")
     parser.add_argument("--character", type=str, default="None", help="The character for filtering.")
+    parser.add_argument("--no_query_cache", action="store_true", help="Bypass the query embedding cache.")
+    parser.add_argument("--trace", type=str, default=None, help="Trace sinks, e.g. histogram or jsonl:traces.jsonl (see tracing.py).")
+    parser.add_argument("--openai_base_url", type=str, default=None, help="Send OpenAI requests to this URL (e.g. the local stand-in server).")
+    parser.add_argument("--backend", type=str, default="chroma", choices=BACKENDS, help="The search backend.")
+    parser.add_argument("--export_path", type=str, default=None, help="The export to search with the numpy backends.")
+    parser.add_argument("--lexical", type=str, default="auto", choices=LEXICAL_MODES, help="How the lexical index is used (see lexical_index.py).")
+    parser.add_argument("--no_daemon", action="store_true", help="Always query in-process, even if the query daemon is running.")
     args = parser.parse_args()
 
-    # Query the vector store and print results
-    print(f"Initiating querying of vector store: {args.vectorstore_path}...")
-    response = query_vectorstore(args.query, args.vectorstore_path, args.persona, args.character)
+    # Ask the query daemon first. Options that change in-process behavior always run in-process.
+    response = None
+    if not (args.no_daemon or args.openai_base_url or args.trace or args.no_query_cache):
+        # The daemon runs in its own working directory, so paths are sent absolute.
+        result = daemon_client.request("/query", {
+            "query": args.query,
+            "vectorstore_path": os.path.abspath(args.vectorstore_path),
+            "persona": args.persona,
+            "character": args.character,
+            "backend": args.backend,
+            "export_path": os.path.abspath(args.export_path) if args.export_path else None,
+            "lexical": args.lexical
+        })
+        if result is not None:
+            print(f"⚡ Answered by the query daemon at {daemon_client.DEFAULT_DAEMON_URL}")
+            response = [SimpleNamespace(**doc) for doc in result["documents"]]
+
+    if response is None:
+        import store_registry
+        if args.openai_base_url:
+            store_registry.set_openai_base_url(args.openai_base_url)
+        if args.trace:
+            tracing.configure(args.trace)
+        if args.no_query_cache:
+            store_registry.bypass_query_cache()
+
+        # Query the vector store and print results
+        print(f"Initiating querying of vector store: {args.vectorstore_path}...")
+        response = query_vectorstore(args.query, args.vectorstore_path, args.persona, args.character,
+                                     args.backend, args.export_path, args.lexical)
 
     print(f"Found {len(response)} documents matching the query.")
     print("=== RESULTS ===")
@@ -89,3 +271,4 @@ if __name__ == "__main__":
         print("----------------")
 
     print("\n--- End of Results ---")
+    tracing.report()
@@ -0,0 +1,281 @@
+# This file splits a persona export into shards and searches only the shards a query needs.
+# Shards are split by a metadata key or by k-means cluster:
+# - character / type / source: one shard per value, the rarest values pooled into an "other" shard.
+# - book: the book of a Bible "verse" reference (e.g. "John" for "John 3:16").
+# - page: page ranges of a screenplay ("page_number" metadata), page_range pages per shard.
+# - kmeans: one shard per cluster of similar vectors.
+# Every shard is a JSON file in the embeddings.json layout used by the edge function, so a
+# consumer can download shards instead of one big file. shards.json records each shard's
+# file, size, key values and centroid (the normalized mean of its vectors).
+# ShardedVectorStore opens only the shards whose values match a filter on the shard key,
+# or whose centroids are closest to the query, and keeps at most max_open shards in memory,
+# so load time and memory depend on the query instead of the size of the corpus.
+# The shards are written by export_vectorstore_json.py (--shard_by).
+
+import os
+import json
+import shutil
+import threading
+import numpy as np
+from collections import Counter, OrderedDict
+from ann_index import unit_rows, spherical_kmeans
+
+SHARD_FORMAT_VERSION = 1
+SHARD_MANIFEST_FILE = "shards.json"
+SHARD_KEYS = ("character", "type", "source", "book", "page", "kmeans")
+DEFAULT_MAX_SHARDS = 32
+DEFAULT_PAGE_RANGE = 10
+# Shards searched per query when routing by centroid, and shards kept open.
+DEFAULT_PROBE_SHARDS = 2
+DEFAULT_MAX_OPEN_SHARDS = 4
+OTHER_SHARD = "other"
+
+
+def shard_value(metadata, shard_by, page_range=DEFAULT_PAGE_RANGE):
+    """Returns the value of the shard key for one record's metadata."""
+    if shard_by == "book":
+        verse = str(metadata.get("verse", "Unknown"))
+        return verse.rsplit(" ", 1)[0] if " " in verse else verse
+    if shard_by == "page":
+        page = metadata.get("page_number", metadata.get("page"))
+        if page is None:
+            return "None"
+        start = (int(page) - 1) // page_range * page_range + 1
+        return f"{start}-{start + page_range - 1}"
+    return str(metadata.get(shard_by, "None"))
+
+
+def plan_metadata_shards(value_counts, max_shards=DEFAULT_MAX_SHARDS):
+    """
+    Assigns key values to shards: the max_shards - 1 most common values get a shard each
+    and the remaining values share an "other" shard.
+
+    Parameters:
+    value_counts (Counter): Number of records per key value.
+    max_shards (int): Maximum number of shards.
+
+    Returns:
+    dict: key value -> shard id.
+    """
+    if len(value_counts) <= max_shards:
+        return {value: _shard_id(value) for value in value_counts}
+    plan = {value: _shard_id(value) for value, _ in value_counts.most_common(max_shards - 1)}
+    for value in value_counts:
+        plan.setdefault(value, OTHER_SHARD)
+    return plan
+
+
+def _shard_id(value):
+    """Returns a file-name-safe shard id for a key value."""
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(value)).strip("_") or "none"
+    return safe[:64] if safe != OTHER_SHARD else OTHER_SHARD + "_value"
+
+
+def fit_shard_centroids(sample, shards=DEFAULT_MAX_SHARDS, seed=0):
+    """Returns k-means centroids for kmeans sharding, fitted on a sample of the export's vectors."""
+    vectors = unit_rows(sample)
+    return spherical_kmeans(vectors, min(shards, len(vectors)), seed=seed)
+
+
+class ShardWriter:
+    """
+    Writes records into shard files. Each shard's vectors and records are spooled to
+    temporary files while the export streams, then written out in the embeddings.json layout.
+
+    Parameters:
+    directory (str): The output directory (replaced if it exists).
+    """
+
+    def __init__(self, directory):
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        self.directory = directory
+        self.dimension = None
+        self._shards = {}
+
+    def _shard(self, shard_id):
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            prefix = os.path.join(self.directory, shard_id)
+            shard = self._shards[shard_id] = {
+                "vectors": open(prefix + ".vectors.tmp", "wb"),
+                "records": open(prefix + ".records.tmp", "w", encoding="utf-8"),
+                "count": 0,
+                "sum": np.zeros(self.dimension, dtype=np.float64),
+                "values": set()
+            }
+        return shard
+
+    def add(self, shard_id, vector, text, metadata, value=None):
+        """Appends one record to a shard."""
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = len(vector)
+        shard = self._shard(shard_id)
+        shard["vectors"].write(vector.astype(np.float16).tobytes())
+        shard["records"].write(json.dumps({"text": text, "metadata": metadata or {}}, ensure_ascii=False) + "\n")
+        norm = np.linalg.norm(vector)
+        shard["sum"] += vector / norm if norm else vector
+        shard["count"] += 1
+        if value is not None:
+            shard["values"].add(value)
+
+    def finish(self, persona, shard_by, **extra):
+        """
+        Writes every shard as <shard id>.json and the shards.json manifest.
+
+        Returns:
+        dict: The manifest.
+        """
+        entries = []
+        for shard_id, shard in sorted(self._shards.items()):
+            shard["vectors"].close()
+            shard["records"].close()
+            file_name = shard_id + ".json"
+            self._write_shard_json(shard_id, file_name)
+            centroid = shard["sum"] / max(np.linalg.norm(shard["sum"]), 1e-12)
+            entries.append({
+                "id": shard_id,
+                "file": file_name,
+                "count": shard["count"],
+                "bytes": os.path.getsize(os.path.join(self.directory, file_name)),
+                "values": sorted(shard["values"]),
+                "centroid": [round(float(value), 5) for value in centroid]
+            })
+        manifest = {
+            "format_version": SHARD_FORMAT_VERSION,
+            "persona": persona,
+            "shard_by": shard_by,
+            "count": sum(entry["count"] for entry in entries),
+            "dimension": self.dimension,
+            "shards": entries
+        }
+        manifest.update(extra)
+        with open(os.path.join(self.directory, SHARD_MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def _write_shard_json(self, shard_id, file_name, chunk_rows=1000):
+        prefix = os.path.join(self.directory, shard_id)
+        row_bytes = self.dimension * 2
+        with open(os.path.join(self.directory, file_name), "w") as f:
+            f.write('{"embeddings": [')
+            with open(prefix + ".vectors.tmp", "rb") as vectors:
+                first = True
+                for chunk in iter(lambda: vectors.read(row_bytes * chunk_rows), b""):
+                    for row in np.frombuffer(chunk, dtype=np.float16).reshape(-1, self.dimension):
+                        f.write(("" if first else ",") + json.dumps([round(float(val), 3) for val in row]))
+                        first = False
+            for field, name in (("text", "texts"), ("metadata", "metadata")):
+                f.write(f'], "{name}": [')
+                with open(prefix + ".records.tmp", "r", encoding="utf-8") as records:
+                    for index, line in enumerate(records):
+                        f.write(("," if index else "") + json.dumps(json.loads(line)[field]))
+            f.write("]}")
+        os.remove(prefix + ".vectors.tmp")
+        os.remove(prefix + ".records.tmp")
+
+
+class ShardedVectorStore:
+    """
+    Searches a sharded export, opening only the shards a query needs.
+
+    Parameters:
+    directory (str): The shards directory (containing shards.json).
+    max_open (int): Maximum number of shards kept in memory (least recently used are closed).
+    """
+
+    def __init__(self, directory, max_open=DEFAULT_MAX_OPEN_SHARDS):
+        with open(os.path.join(directory, SHARD_MANIFEST_FILE), "r") as f:
+            self.manifest = json.load(f)
+        self.directory = directory
+        self.max_open = max_open
+        self.shard_by = self.manifest["shard_by"]
+        self.page_range = self.manifest.get("page_range", DEFAULT_PAGE_RANGE)
+        self.entries = self.manifest["shards"]
+        self.centroids = unit_rows(np.asarray([entry["centroid"] for entry in self.entries], dtype=np.float32))
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.manifest["count"]
+
+    def shards_for(self, query_vector, filter=None, probe_shards=DEFAULT_PROBE_SHARDS):
+        """
+        Returns the indexes of the shards to search: those holding the filter value of the
+        shard key, otherwise the probe_shards shards whose centroids are closest to the query.
+        Filters on other keys are applied inside the probed shards only.
+        """
+        if filter and self.shard_by in filter:
+            value = str(filter[self.shard_by])
+            return [index for index, entry in enumerate(self.entries) if value in entry["values"]]
+        scores = self.centroids @ unit_rows(np.atleast_2d(query_vector))[0]
+        return np.argsort(-scores)[:probe_shards].tolist()
+
+    def shard(self, index):
+        """Returns the NumpyVectorStore of one shard, loading it on first use."""
+        from numpy_vectorstore import NumpyVectorStore
+        entry = self.entries[index]
+        with self._lock:
+            store = self._open.get(entry["id"])
+            if store is None:
+                store = NumpyVectorStore.from_export(os.path.join(self.directory, entry["file"]))
+                if self.shard_by != "kmeans":
+                    # Mask on the shard key as routed (e.g. the book of a verse), so a filter on it
+                    # also selects the matching records of multi-value shards such as "other".
+                    rows_by_value = {}
+                    for row, metadata in enumerate(store.metadatas):
+                        rows_by_value.setdefault(shard_value(metadata, self.shard_by, self.page_range), []).append(row)
+                    store.masks[self.shard_by] = {value: np.asarray(rows, dtype=np.int64) for value, rows in rows_by_value.items()}
+                self._open[entry["id"]] = store
+                while len(self._open) > self.max_open:
+                    self._open.popitem(last=False)
+            else:
+                self._open.move_to_end(entry["id"])
+            return store
+
+    def search_batch_with_scores(self, query_vectors, k=5, filter=None, probe_shards=DEFAULT_PROBE_SHARDS):
+        """
+        Top-k cosine search over the shards chosen for each query, merged by score.
+
+        Parameters:
+        query_vectors (array): (num_queries, dimension) query embeddings.
+        k (int): Number of results per query.
+        filter (dict): Optional metadata filter, e.g. {"character": "Homer Simpson"}.
+        probe_shards (int): Shards searched per query when routing by centroid.
+
+        Returns:
+        list: For each query, a list of (Document, score) tuples, best first.
+        """
+        shard_filter = filter
+        if filter and self.shard_by in filter:
+            # Shard key values are compared as strings, as recorded in shards.json.
+            shard_filter = dict(filter, **{self.shard_by: str(filter[self.shard_by])})
+        results = []
+        for query in np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)):
+            matches = []
+            for index in self.shards_for(query, filter, probe_shards):
+                store = self.shard(index)
+                if shard_filter and self.shard_by in shard_filter and len(self.entries[index]["values"]) == 1:
+                    # Every record of a single-value shard matches the shard key.
+                    store_filter = {key: value for key, value in shard_filter.items() if key != self.shard_by}
+                else:
+                    store_filter = shard_filter
+                matches.extend(store.search_batch_with_scores([query], k, store_filter or None)[0])
+            matches.sort(key=lambda match: match[1], reverse=True)
+            results.append(matches[:k])
+        return results
+
+    def search_batch(self, query_vectors, k=5, filter=None, probe_shards=DEFAULT_PROBE_SHARDS):
+        """Same as search_batch_with_scores() but returns only the Document objects."""
+        return [[doc for doc, _ in matches] for matches in self.search_batch_with_scores(query_vectors, k, filter, probe_shards)]
+
+    def search(self, query_vector, k=5, filter=None, probe_shards=DEFAULT_PROBE_SHARDS):
+        """Returns the top-k Document objects for a single query vector."""
+        return self.search_batch([query_vector], k, filter, probe_shards)[0]
+
+
+def count_shard_values(metadatas, shard_by, page_range=DEFAULT_PAGE_RANGE):
+    """Returns a Counter of shard key values over an iterable of metadata dicts."""
+    return Counter(shard_value(metadata or {}, shard_by, page_range) for metadata in metadatas)
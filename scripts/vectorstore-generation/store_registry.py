@@ -0,0 +1,228 @@
+# This file keeps opened vector stores, retrievers and OpenAI clients alive
+# for the lifetime of the process, so repeated queries do not pay for
+# load_dotenv(), client construction and Chroma start-up on every call.
+# Personas are kept in an LRU registry keyed by (vectorstore_path, persona).
+
+import os
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from langchain_openai.embeddings import OpenAIEmbeddings
+from langchain_openai.chat_models.base import ChatOpenAI
+from langchain_chroma.vectorstores import Chroma
+from numpy_vectorstore import NumpyVectorStore
+from sharded_export import ShardedVectorStore
+from lexical_index import LexicalIndex
+from embedding_cache import CachedEmbeddings, QueryEmbeddingCache
+import tracing
+
+# Maximum number of personas kept open before the least recently used one is evicted.
+DEFAULT_MAX_OPEN_PERSONAS = int(os.getenv("MAX_OPEN_PERSONAS", "4"))
+
+_lock = threading.RLock()
+_personas = OrderedDict()
+_max_open_personas = DEFAULT_MAX_OPEN_PERSONAS
+_environment_loaded = False
+_embeddings = None
+_chat_models = {}
+
+# Set QUERY_EMBEDDING_CACHE=off to send every query to the embedding API.
+_query_cache_bypass = os.getenv("QUERY_EMBEDDING_CACHE", "on").lower() in ("off", "0", "false")
+
+
+def load_environment():
+    """Loads .env once per process."""
+    global _environment_loaded
+    with _lock:
+        if not _environment_loaded:
+            with tracing.span("load_dotenv"):
+                load_dotenv()
+            _environment_loaded = True
+
+
+def get_embeddings():
+    """
+    Returns the process-wide OpenAIEmbeddings client, wrapped in CachedEmbeddings
+    so query embeddings are served from the disk-backed cache (see embedding_cache.py).
+    """
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            load_environment()
+            _embeddings = CachedEmbeddings(
+                OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL")),
+                QueryEmbeddingCache(),
+                bypass=_query_cache_bypass
+                )
+        return _embeddings
+
+
+def set_openai_base_url(base_url):
+    """
+    Points every OpenAI client at base_url, e.g. the local stand-in server
+    (see local_openai_server.py), and drops clients created for the previous URL.
+    """
+    load_environment()
+    os.environ["OPENAI_BASE_URL"] = base_url
+    # The stand-in server accepts any key, but the OpenAI client refuses to start without one.
+    os.environ.setdefault("OPENAI_API_KEY", "sk-local")
+    clear()
+
+
+def bypass_query_cache(bypass=True):
+    """Turns the query embedding cache off (or back on) for this process."""
+    global _query_cache_bypass
+    with _lock:
+        _query_cache_bypass = bypass
+        if _embeddings is not None:
+            _embeddings.bypass = bypass
+
+
+def get_chat_model(model_name="gpt-4o-mini", temperature=0.7, max_tokens=500):
+    """Returns a ChatOpenAI client, created once per distinct set of parameters."""
+    key = (model_name, temperature, max_tokens)
+    with _lock:
+        if key not in _chat_models:
+            load_environment()
+            _chat_models[key] = ChatOpenAI(
+                model_name=model_name,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL")
+                )
+        return _chat_models[key]
+
+
+class PersonaHandle:
+    """
+    Lazily opened resources for one persona's vector store.
+
+    Parameters:
+    vectorstore_path (str): The path to the Chroma vector store.
+    persona (str): The persona name (Chroma collection).
+    """
+
+    def __init__(self, vectorstore_path, persona):
+        self.vectorstore_path = vectorstore_path
+        self.persona = persona
+        self._vectorstore = None
+        self._retrievers = {}
+        self._numpy_stores = {}
+        self._lexical_index = None
+        self._lexical_index_loaded = False
+        self._lock = threading.RLock()
+
+    @property
+    def vectorstore(self):
+        """The opened Chroma vector store."""
+        with self._lock:
+            if self._vectorstore is None:
+                embedding_function = get_embeddings()
+                with tracing.span("open_store", persona=self.persona, backend="chroma"):
+                    self._vectorstore = Chroma(
+                        persist_directory=self.vectorstore_path,
+                        collection_name=self.persona,
+                        embedding_function=embedding_function
+                        )
+            return self._vectorstore
+
+    def retriever(self, character="None", k=5):
+        """Returns a similarity retriever, optionally filtered by character."""
+        key = (character, k)
+        with self._lock:
+            if key not in self._retrievers:
+                search_kwargs = {"k": k}
+                if character != "None":
+                    search_kwargs["filter"] = {"character": character}
+                self._retrievers[key] = self.vectorstore.as_retriever(
+                    search_type="similarity",
+                    search_kwargs=search_kwargs
+                )
+            return self._retrievers[key]
+
+    def numpy_store(self, export_path, quantization=None):
+        """Returns the NumpyVectorStore loaded from export_path, optionally from its "int8" or "pq" codes."""
+        key = (export_path, quantization)
+        with self._lock:
+            if key not in self._numpy_stores:
+                with tracing.span("open_store", persona=self.persona, backend=quantization or "numpy"):
+                    self._numpy_stores[key] = NumpyVectorStore.from_export(export_path, quantization=quantization)
+            return self._numpy_stores[key]
+
+    def lexical_index(self):
+        """The persona's LexicalIndex (see lexical_index.py), or None if the vector store has none."""
+        with self._lock:
+            if not self._lexical_index_loaded:
+                with tracing.span("open_store", persona=self.persona, backend="lexical"):
+                    self._lexical_index = LexicalIndex.load(self.vectorstore_path)
+                self._lexical_index_loaded = True
+            return self._lexical_index
+
+    def export_store(self, export_path, backend="numpy"):
+        """
+        Returns the in-process store of an export for a numpy backend: "numpy", "int8" or "pq"
+        (see numpy_store()), or "sharded" for a ShardedVectorStore over a shards directory.
+        """
+        if backend != "sharded":
+            return self.numpy_store(export_path, None if backend == "numpy" else backend)
+        key = (export_path, backend)
+        with self._lock:
+            if key not in self._numpy_stores:
+                with tracing.span("open_store", persona=self.persona, backend=backend):
+                    self._numpy_stores[key] = ShardedVectorStore(export_path)
+            return self._numpy_stores[key]
+
+
+def _key(vectorstore_path, persona):
+    return (os.path.abspath(vectorstore_path), persona)
+
+
+def get_persona(vectorstore_path, persona):
+    """
+    Returns the PersonaHandle for (vectorstore_path, persona), opening it if needed.
+    The least recently used personas are evicted beyond the configured maximum.
+    """
+    key = _key(vectorstore_path, persona)
+    with _lock:
+        handle = _personas.get(key)
+        if handle is None:
+            handle = PersonaHandle(vectorstore_path, persona)
+            _personas[key] = handle
+        _personas.move_to_end(key)
+        while len(_personas) > _max_open_personas:
+            evicted_key, _ = _personas.popitem(last=False)
+            print(f"🧹 Evicted persona '{evicted_key[1]}' ({evicted_key[0]}) from the store registry.")
+        return handle
+
+
+def invalidate(vectorstore_path, persona=None):
+    """
+    Drops cached handles for a vector store after it has been rebuilt or deleted.
+    If persona is None, every persona stored under vectorstore_path is dropped.
+    """
+    path = os.path.abspath(vectorstore_path)
+    with _lock:
+        for key in list(_personas):
+            if key[0] == path and (persona is None or key[1] == persona):
+                del _personas[key]
+
+
+def set_max_open_personas(max_open_personas):
+    """Sets the maximum number of open personas and evicts any excess immediately."""
+    global _max_open_personas
+    if max_open_personas < 1:
+        raise ValueError("max_open_personas must be at least 1.")
+    with _lock:
+        _max_open_personas = max_open_personas
+        while len(_personas) > _max_open_personas:
+            _personas.popitem(last=False)
+
+
+def clear():
+    """Drops every cached persona and client."""
+    global _embeddings
+    with _lock:
+        _personas.clear()
+        _chat_models.clear()
+        _embeddings = None
@@ -0,0 +1,28 @@
+# The scripts in vectorstore-generation are run from their own directory and import
+# each other as top-level modules, so the tests put that directory on sys.path.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def offline_tiktoken(monkeypatch):
+    """
+    tiktoken downloads its encodings on first use. Without network access (and no
+    TIKTOKEN_CACHE_DIR), encodings are replaced by a byte-level one so chunking and
+    OpenAIEmbeddings still tokenize (token counts are then higher than the real ones).
+    """
+    import tiktoken
+    try:
+        tiktoken.get_encoding("cl100k_base")
+        return
+    except Exception:
+        pass
+    encoding = tiktoken.Encoding("bytes", pat_str=r"\S+|\s+", mergeable_ranks={bytes([i]): i for i in range(256)},
+                                 special_tokens={"<|endoftext|>": 256})
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: encoding)
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model_name: encoding)
@@ -0,0 +1,40 @@
+# Checks that batch answering tracks records by line number and reports malformed records per record.
+
+import io
+import json
+import asyncio
+from types import SimpleNamespace
+
+import batch_answer_questions
+
+
+class EchoLLM:
+    async def ainvoke(self, prompt_value):
+        return SimpleNamespace(content=prompt_value.to_string())
+
+
+def test_duplicate_ids_and_malformed_records(tmp_path, monkeypatch):
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text("\n".join([
+        json.dumps({"id": "q", "question": "first?", "persona": "homer", "vectorstore_path": str(tmp_path)}),
+        json.dumps({"id": "q", "question": "second?", "persona": "homer", "vectorstore_path": str(tmp_path)}),
+        json.dumps({"question": "no persona?"}),
+        "{not json",
+    ]) + "\n")
+
+    def fake_batch(questions, path, persona, character, backend, k):
+        return [[SimpleNamespace(page_content=f"context for {question}")] for question in questions]
+
+    monkeypatch.setattr(batch_answer_questions, "query_vectorstore_batch", fake_batch)
+    monkeypatch.setattr(batch_answer_questions, "get_llm", EchoLLM)
+
+    records = batch_answer_questions.read_questions(str(questions))
+    output = io.StringIO()
+    summary = asyncio.run(batch_answer_questions.answer_questions(records, output))
+
+    results = {result["line"]: result for result in map(json.loads, output.getvalue().splitlines())}
+    assert summary == {"answered": 2, "failed": 2}
+    assert "context for first?" in results[1]["answer"] and "context for second?" in results[2]["answer"]
+    assert results[1]["id"] == results[2]["id"] == "q"
+    assert results[3]["error"] == "missing persona"
+    assert results[4]["error"].startswith("invalid JSON")
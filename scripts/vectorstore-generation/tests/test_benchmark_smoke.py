@@ -0,0 +1,59 @@
+# Smoke test of the benchmark harness: one small iteration of every stage, embedding
+# through the local OpenAI stand-in server selected with store_registry.set_openai_base_url.
+
+import json
+import os
+
+import pytest
+
+import store_registry
+from benchmark_pipeline import STAGES, generate_corpora, run_benchmarks
+from local_openai_server import start_server
+
+DIMENSIONS = 64
+
+
+@pytest.fixture
+def openai_stand_in(monkeypatch):
+    server = start_server(port=0)
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-local")
+    store_registry.set_openai_base_url(server.base_url)
+    yield server
+    server.shutdown()
+    store_registry.clear()
+
+
+def test_benchmark_iteration_through_stand_in(tmp_path, openai_stand_in):
+    config = {
+        "pages": 2,
+        "verses": 40,
+        "rows": 40,
+        "queries": 5,
+        "repeat": 1,
+        "workers": 2,
+        "dimensions": DIMENSIONS,
+        "seed": 0,
+        "openai_base_url": os.environ["OPENAI_BASE_URL"],
+        "corpora": generate_corpora(str(tmp_path / "corpora"), pages=2, verses=40, rows=40),
+        "work_directory": str(tmp_path)
+    }
+
+    results = run_benchmarks(config)
+
+    assert list(results) == STAGES
+    for stage, result in results.items():
+        assert "error" not in result, f"{stage}: {result.get('error')}"
+        assert result["items"] > 0
+        assert result["samples"] == (config["queries"] if result["unit"] == "query" else config["repeat"])
+        assert result["seconds"] > 0 and result["throughput"] > 0
+        assert 0 < result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+        assert result["peak_rss_mb"] > 0
+    assert results["ingest"]["items"] == results["parse_pdf"]["items"] + 80
+
+    # Every vector came from the stand-in, at the requested dimension.
+    assert openai_stand_in.stats["embeddings"] > 0
+    with open(tmp_path / "chroma" / "embeddings" / "manifest.json") as f:
+        manifest = json.load(f)
+    assert manifest["count"] == results["ingest"]["items"]
+    assert manifest["dimension"] == DIMENSIONS
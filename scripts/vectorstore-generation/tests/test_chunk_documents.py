@@ -0,0 +1,31 @@
+# Checks that chunking keeps scene headings and empty documents as documents of their own,
+# unless dropping the empty ones is asked for.
+
+from langchain_core.documents import Document
+
+from chunk_documents import chunk_documents
+
+
+def screenplay():
+    rows = [("scene_heading", None, "INT. DREAMHOUSE - DAY"), ("dialogue", "Barbie", "Hi Barbie!"),
+            ("dialogue", "Barbie", "What a day."), ("dialogue", "Ken", ""), ("scene_heading", None, "EXT. BEACH - DAY"),
+            ("dialogue", "Barbie", "Hi Ken!")]
+    return [Document(page_content=text, metadata={"doc_id": i, "type": kind, "character": character})
+            for i, (kind, character, text) in enumerate(rows)]
+
+
+def test_scene_headings_and_empty_documents_are_kept():
+    docs = chunk_documents(screenplay(), encoding=None)
+
+    assert [doc.page_content for doc in docs] == ["INT. DREAMHOUSE - DAY", "Hi Barbie!\nWhat a day.", "",
+                                                  "EXT. BEACH - DAY", "Hi Ken!"]
+    assert docs[1].metadata["source_doc_ids"] == "1,2"
+    assert docs[1].metadata["scene"] == "INT. DREAMHOUSE - DAY"
+    assert docs[4].metadata["scene"] == "EXT. BEACH - DAY"
+
+
+def test_empty_documents_are_dropped_on_request():
+    docs = chunk_documents(screenplay(), encoding=None, drop_empty=True)
+
+    assert [doc.page_content for doc in docs] == ["INT. DREAMHOUSE - DAY", "Hi Barbie!\nWhat a day.",
+                                                  "EXT. BEACH - DAY", "Hi Ken!"]
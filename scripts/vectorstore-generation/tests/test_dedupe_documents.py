@@ -0,0 +1,36 @@
+# Checks the occurrence metadata that deduplication records on the kept documents.
+
+from langchain_core.documents import Document
+
+from dedupe_documents import dedupe_documents
+
+
+def lines(*rows):
+    return [Document(page_content=text, metadata={"doc_id": i, "character": character, "type": "dialogue"})
+            for i, (character, text) in enumerate(rows)]
+
+
+def test_characters_are_not_repeated_within_character_scope():
+    docs = dedupe_documents(lines(("Homer", "D'oh!"), ("Homer", "d'oh"), ("Marge", "D'oh!")))
+
+    assert [doc.metadata["character"] for doc in docs] == ["Homer", "Marge"]
+    assert docs[0].metadata["occurrences"] == 2
+    assert docs[0].metadata["doc_ids"] == "0,1"
+    assert "characters" not in docs[0].metadata
+
+
+def test_characters_are_merged_across_characters():
+    docs = dedupe_documents(lines(("Homer", "D'oh!"), ("Marge", "D'oh!")), scope=("type",))
+
+    assert len(docs) == 1
+    assert docs[0].metadata["characters"] == "Homer,Marge"
+
+
+def test_doc_ids_of_chunked_windows_are_merged():
+    docs = dedupe_documents([
+        Document(page_content="D'oh!\nWoo-hoo!", metadata={"doc_id": 0, "source_doc_ids": "0,1", "character": "Homer"}),
+        Document(page_content="D'oh!\nWoo-hoo!", metadata={"doc_id": 7, "source_doc_ids": "7,8", "character": "Homer"}),
+    ])
+
+    assert len(docs) == 1
+    assert docs[0].metadata["doc_ids"] == "0,1,7,8"
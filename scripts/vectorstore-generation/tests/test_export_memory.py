@@ -0,0 +1,107 @@
+# Checks that export_json() and export_binary() stream the collection page by page:
+# a fake paged collection of ~100k vectors is exported while tracemalloc records the
+# peak allocation, which must stay bounded by the page size instead of the collection size.
+# An empty collection gives empty exports in both formats.
+
+import json
+import tracemalloc
+
+import numpy as np
+
+import export_vectorstore_json
+
+DIMENSION = 64
+PAGE_SIZE = 1000
+
+
+def expected_embeddings(start, stop):
+    """The deterministic vectors of rows start..stop, so the fake collection holds no data."""
+    rows = np.arange(start, stop, dtype=np.float32)[:, None]
+    return np.sin(rows * 0.001 + np.arange(DIMENSION, dtype=np.float32) * 0.1).astype(np.float32)
+
+
+class FakeCollection:
+    """A chromadb-like collection that generates each page on demand in get(limit, offset)."""
+
+    def __init__(self, count):
+        self._count = count
+
+    def count(self):
+        return self._count
+
+    def get(self, include=(), limit=None, offset=0):
+        stop = min(self._count, offset + (limit or self._count))
+        rows = range(offset, stop)
+        result = {"ids": [f"id-{row}" for row in rows]}
+        if "embeddings" in include:
+            result["embeddings"] = expected_embeddings(offset, stop)
+        if "documents" in include:
+            result["documents"] = [f"line {row}" for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [{"doc_id": row, "character": f"c{row % 7}"} for row in rows]
+        return result
+
+
+def peak_memory(exporter, tmp_path, monkeypatch, count, **kwargs):
+    """Runs an exporter on a fake collection of count vectors and returns (directory, result, peak bytes)."""
+    directory = tmp_path / str(count)
+    directory.mkdir()
+    monkeypatch.setattr(export_vectorstore_json, "load_collection", lambda path, persona: FakeCollection(count))
+    tracemalloc.start()
+    try:
+        result = exporter(str(directory), "test", page_size=PAGE_SIZE, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return directory, result, peak
+
+
+def assert_bounded(small_peak, large_peak):
+    collection_bytes = 100_000 * DIMENSION * 4
+    page_bytes = PAGE_SIZE * DIMENSION * 8
+    # Four times the collection must not mean four times the memory...
+    assert large_peak < 1.5 * small_peak + page_bytes
+    # ...and the peak is a few pages, far below the ~25 MB of float32 vectors.
+    assert large_peak < 16 * page_bytes
+    assert large_peak < collection_bytes / 4
+
+
+def test_export_json_streams_collection(tmp_path, monkeypatch):
+    _, _, small_peak = peak_memory(export_vectorstore_json.export_json, tmp_path, monkeypatch, 25_000)
+    directory, _, large_peak = peak_memory(export_vectorstore_json.export_json, tmp_path, monkeypatch, 100_000)
+    assert_bounded(small_peak, large_peak)
+
+    with open(directory / "embeddings.json") as f:
+        exported = json.load(f)
+    assert len(exported["texts"]) == 100_000
+    assert exported["texts"][12345] == "line 12345"
+    assert exported["metadata"][99_999] == {"doc_id": 99_999, "character": "c4"}
+    embeddings = np.asarray(exported["embeddings"], dtype=np.float32)
+    assert embeddings.shape == (100_000, DIMENSION)
+    np.testing.assert_allclose(embeddings, expected_embeddings(0, 100_000), atol=2e-3)
+
+
+def test_export_binary_streams_collection(tmp_path, monkeypatch):
+    _, _, small_peak = peak_memory(export_vectorstore_json.export_binary, tmp_path, monkeypatch, 25_000)
+    _, output_directory, large_peak = peak_memory(export_vectorstore_json.export_binary, tmp_path, monkeypatch, 100_000)
+    assert_bounded(small_peak, large_peak)
+
+    matrix, texts, metadatas, manifest = export_vectorstore_json.load_binary_export(output_directory, verify=True)
+    assert manifest["count"] == 100_000
+    assert manifest["dimension"] == DIMENSION
+    assert manifest["dtype"] == "float16"
+    assert matrix.shape == (100_000, DIMENSION)
+    assert texts[0] == "line 0" and texts[-1] == "line 99999"
+    assert metadatas[42] == {"doc_id": 42, "character": "c0"}
+    np.testing.assert_allclose(np.asarray(matrix, dtype=np.float32), expected_embeddings(0, 100_000), atol=1e-3)
+
+
+def test_empty_collection_gives_empty_exports(tmp_path, monkeypatch):
+    directory, _, _ = peak_memory(export_vectorstore_json.export_json, tmp_path, monkeypatch, 0)
+    with open(directory / "embeddings.json") as f:
+        assert json.load(f) == {"embeddings": [], "texts": [], "metadata": []}
+
+    output_directory = export_vectorstore_json.export_binary(str(directory), "test")
+    matrix, texts, metadatas, manifest = export_vectorstore_json.load_binary_export(output_directory, verify=True)
+    assert manifest["count"] == 0
+    assert matrix.shape == (0, 0) and texts == [] and metadatas == []
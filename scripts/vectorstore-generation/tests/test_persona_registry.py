@@ -0,0 +1,30 @@
+# Checks that the persona registry and its paths are found from any working directory and that
+# unknown personas get the generic prompt instead of an error.
+
+import os
+
+import persona_registry
+
+
+def test_registry_does_not_depend_on_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert "homer" in persona_registry.names()
+    assert "{context}" in persona_registry.get("homer").prompt
+
+
+def test_persona_paths_are_resolved_against_script_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    persona = persona_registry.PersonaConfig({"name": "test", "source": "source-files/test.csv",
+                                              "vectorstore_path": "./vector-store/test_chroma_db",
+                                              "collection_schema": "collection-properties/homer_collection.json"})
+    assert persona.source == os.path.join(persona_registry.BASE_DIRECTORY, "source-files", "test.csv")
+    assert persona.vectorstore_path == os.path.join(persona_registry.BASE_DIRECTORY, "vector-store", "test_chroma_db")
+    assert persona.to_dict()["vectorstore_path"] == persona.vectorstore_path
+    assert persona.collection_schema is not None
+
+
+def test_unknown_persona_falls_back_to_generic_prompt():
+    persona = persona_registry.get_or_fallback("no-such-persona")
+    prompt = persona.prompt_template.invoke({"question": "Why?", "context": "Because."}).to_string()
+    assert "Because." in prompt and "Why?" in prompt
+    assert persona_registry.get_or_fallback("homer") is persona_registry.get("homer")
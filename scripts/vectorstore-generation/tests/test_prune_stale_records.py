@@ -0,0 +1,21 @@
+# Checks that rebuilding a store from a shrunken source deletes the records of the removed lines.
+
+import uuid
+
+import chromadb
+from langchain_core.documents import Document
+
+from generate_vectorstore_chroma import document_id, prune_stale_records
+
+
+def test_prune_stale_records_keeps_only_current_documents():
+    collection = chromadb.EphemeralClient().get_or_create_collection(f"prune-{uuid.uuid4().hex}")
+    docs = [Document(page_content=f"line {i}", metadata={"source": "test.csv", "doc_id": i}) for i in range(2500)]
+    collection.upsert(ids=[document_id(doc) for doc in docs], embeddings=[[float(i), 1.0] for i in range(len(docs))])
+
+    current = docs[:1000] + docs[2000:]
+    pruned = prune_stale_records(collection, (document_id(doc) for doc in current), page_size=300)
+
+    assert pruned == 1000
+    assert collection.count() == len(current)
+    assert set(collection.get(include=[])["ids"]) == {document_id(doc) for doc in current}
@@ -0,0 +1,66 @@
+# Checks that the query daemon rejects store paths that do not exist instead of
+# opening (and creating) an empty store, skips unbuilt personas when pre-warming,
+# and drops cached handles when another process invalidates a store.
+
+import threading
+
+import pytest
+
+import daemon_client
+import persona_registry
+import query_daemon
+import store_registry
+from query_daemon import QueryDaemon
+
+
+@pytest.fixture
+def daemon_url():
+    server = QueryDaemon(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("path, payload_key", [("/query", "vectorstore_path"), ("/answer", "vs_directory")])
+def test_missing_store_path_is_rejected(daemon_url, tmp_path, path, payload_key):
+    missing = tmp_path / "no-such-store"
+    payload = {"query": "Why?", "question": "Why?", "persona": "homer", payload_key: str(missing)}
+
+    with pytest.raises(RuntimeError, match="does not exist"):
+        daemon_client.request(path, payload, url=daemon_url)
+    assert not missing.exists()
+
+
+def test_missing_export_path_is_rejected(daemon_url, tmp_path):
+    payload = {"query": "Why?", "persona": "homer", "vectorstore_path": str(tmp_path),
+               "backend": "numpy", "export_path": str(tmp_path / "no-such-export")}
+
+    with pytest.raises(RuntimeError, match="export_path"):
+        daemon_client.request("/query", payload, url=daemon_url)
+
+
+def test_prewarm_skips_personas_without_store(tmp_path, monkeypatch):
+    missing = tmp_path / "no-such-store"
+    persona = persona_registry.PersonaConfig({"name": "test", "source": None, "vectorstore_path": str(missing)})
+    monkeypatch.setattr(persona_registry, "get", lambda name: persona)
+    monkeypatch.setattr(query_daemon, "get_llm", lambda: None)
+    monkeypatch.setattr(store_registry, "get_embeddings", lambda: None)
+
+    server = QueryDaemon(("127.0.0.1", 0))
+    try:
+        server.prewarm(["test"])
+    finally:
+        server.server_close()
+    assert server.warm_personas == []
+    assert not missing.exists()
+
+
+def test_invalidate_drops_cached_handles(daemon_url, tmp_path):
+    handle = store_registry.get_persona(str(tmp_path), "test")
+    try:
+        assert daemon_client.invalidate(str(tmp_path), "test", url=daemon_url) == {"status": "invalidated"}
+        assert store_registry.get_persona(str(tmp_path), "test") is not handle
+    finally:
+        store_registry.invalidate(str(tmp_path))
+    assert daemon_client.invalidate(str(tmp_path), url="http://127.0.0.1:9") is None
@@ -0,0 +1,54 @@
+# Checks that rebuilding a store in place with different --chunk / --dedupe settings
+# leaves only the records of the current settings, using the local OpenAI stand-in.
+
+import csv
+
+import chromadb
+import pytest
+
+import store_registry
+from local_openai_server import start_server
+from generate_vectorstore_chroma import generate_vectorstore
+
+
+@pytest.fixture
+def openai_stand_in(monkeypatch, offline_tiktoken):
+    server = start_server(port=0)
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-local")
+    store_registry.set_openai_base_url(server.base_url)
+    yield server
+    server.shutdown()
+    store_registry.clear()
+
+
+def stored_documents(directory, collection_name):
+    collection = chromadb.PersistentClient(path=str(directory)).get_collection(collection_name)
+    return collection.get(include=["documents"])["documents"]
+
+
+def test_changing_chunk_and_dedupe_settings_replaces_records(tmp_path, openai_stand_in):
+    source = tmp_path / "lines.csv"
+    with open(source, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["character", "dialogue"])
+        for i in range(60):
+            writer.writerow(["Homer" if i % 2 else "Marge", "D'oh!" if i % 3 == 0 else f"Line number {i}."])
+    store = tmp_path / "store"
+
+    def build(**kwargs):
+        generate_vectorstore(str(source), "homer", str(store), "None", use_embedding_cache=False, workers=2, **kwargs)
+        return stored_documents(store, "homer")
+
+    one_line = build()
+    assert len(one_line) == 60
+
+    chunked = build(chunk=True)
+    assert len(chunked) < 60
+    assert all("Line number" not in text or "\n" in text for text in chunked if text != "D'oh!")
+
+    deduped = build(dedupe=True, near_threshold=None)
+    # Marge and Homer both say "D'oh!", which is kept once per character.
+    assert sorted(deduped) == sorted([text for text in one_line if text != "D'oh!"] + ["D'oh!"] * 2)
+
+    assert sorted(build()) == sorted(one_line)
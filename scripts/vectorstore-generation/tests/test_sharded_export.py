@@ -0,0 +1,25 @@
+# Checks that a filter on a derived shard key (the book of a verse) also selects the
+# matching records of a multi-value "other" shard, not only of single-value shards.
+
+import numpy as np
+
+from sharded_export import ShardWriter, ShardedVectorStore, count_shard_values, plan_metadata_shards, shard_value
+
+METADATAS = [{"verse": "Genesis 1:1"}, {"verse": "Genesis 1:2"}, {"verse": "Genesis 1:3"},
+             {"verse": "John 3:16"}, {"verse": "Jude 1:2"}]
+
+
+def test_book_filter_matches_records_of_other_shard(tmp_path):
+    plan = plan_metadata_shards(count_shard_values(METADATAS, "book"), max_shards=2)
+    assert plan == {"Genesis": "Genesis", "John": "other", "Jude": "other"}
+
+    writer = ShardWriter(str(tmp_path / "shards"))
+    vectors = np.eye(len(METADATAS), dtype=np.float32)
+    for vector, metadata in zip(vectors, METADATAS):
+        value = shard_value(metadata, "book")
+        writer.add(plan[value], vector, metadata["verse"], metadata, value)
+    writer.finish("jesus", "book")
+
+    store = ShardedVectorStore(str(tmp_path / "shards"))
+    assert [doc.page_content for doc in store.search(vectors[3], k=5, filter={"book": "John"})] == ["John 3:16"]
+    assert len(store.search(vectors[0], k=5, filter={"book": "Genesis"})) == 3
@@ -0,0 +1,45 @@
+# Checks that spans nest per asyncio task and that closing a span removes that span itself.
+
+import asyncio
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture
+def histogram():
+    sink = tracing.add_sink(tracing.HistogramSink())
+    yield sink
+    tracing.remove_sink(sink)
+
+
+def test_spans_nest_per_asyncio_task(histogram):
+    parents = {}
+
+    async def request(name):
+        with tracing.span(name) as outer:
+            await asyncio.sleep(0)
+            with tracing.span(f"{name}.inner") as inner:
+                await asyncio.sleep(0)
+                parents[name] = (outer, inner)
+
+    async def main():
+        await asyncio.gather(request("a"), request("b"))
+
+    asyncio.run(main())
+    for outer, inner in parents.values():
+        assert outer.parent_id is None
+        assert inner.parent_id == outer.span_id and inner.trace_id == outer.trace_id
+    assert parents["a"][0].trace_id != parents["b"][0].trace_id
+
+
+def test_exit_out_of_order_removes_the_exiting_span(histogram):
+    first = tracing.span("first").__enter__()
+    second = tracing.span("second").__enter__()
+    first.__exit__(None, None, None)
+    with tracing.span("child") as child:
+        assert child.parent_id == second.span_id
+    second.__exit__(None, None, None)
+    with tracing.span("root") as root:
+        assert root.parent_id is None
@@ -0,0 +1,344 @@
+# This file contains a lightweight tracing layer for the RAG request path.
+# Named spans time each stage (dotenv loading, store opening, query embedding,
+# similarity search, prompt formatting, LLM call) and nest per thread and per asyncio
+# task (the open spans are a contextvars stack), so every span knows its trace and parent. Finished spans go to pluggable sinks:
+# - JsonLinesSink: one JSON object per span appended to a file.
+# - PrometheusSink: a duration histogram per span in the Prometheus text format,
+#   optionally served on a localhost /metrics endpoint.
+# - HistogramSink: in-memory samples per span with p50/p95/p99.
+# With no sink configured, span() returns a shared no-op object, so the
+# overhead of disabled tracing is one function call and a list check.
+# It only imports the standard library (NumPy is loaded for summaries), so it
+# adds nothing to the start-up time of the thin clients.
+# Sinks are configured with a spec string, from the RAG_TRACE environment variable
+# or the --trace flag of the query scripts, e.g.
+# RAG_TRACE="jsonl:traces.jsonl,histogram,prometheus:9464"
+
+import os
+import json
+import time
+import uuid
+import functools
+import threading
+import contextvars
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_sinks = []
+# The open spans of the current thread or asyncio task, innermost last. Tuples are never
+# mutated, so a context copied into a task or executor keeps its own stack.
+_stack = contextvars.ContextVar("tracing_stack", default=())
+
+# Upper bounds (seconds) of the Prometheus histogram buckets.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _NoopSpan:
+    """Returned by span() while tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    A timed, named stage of a request. Use as a context manager.
+
+    Parameters:
+    name (str): The stage name, e.g. "embed_query".
+    attributes (dict): Extra fields recorded with the span (persona, backend, ...).
+    """
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "timestamp", "start", "duration", "error")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        """Adds attributes to the span while it is running."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = _stack.get()
+        parent = stack[-1] if stack else None
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = uuid.uuid4().hex[:16]
+        _stack.set(stack + (self,))
+        self.timestamp = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        self.error = exc_type.__name__ if exc_type else None
+        # Remove this span itself, not the innermost one, so a span closed out of order
+        # (e.g. by an interleaved generator) cannot pop another span off the stack.
+        stack = _stack.get()
+        if self in stack:
+            _stack.set(tuple(open_span for open_span in stack if open_span is not self))
+        for sink in list(_sinks):
+            sink.record(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+def span(name, **attributes):
+    """Returns a Span for name, or the shared no-op span if tracing is disabled."""
+    if not _sinks:
+        return NOOP_SPAN
+    return Span(name, attributes)
+
+
+def traced(name):
+    """Decorator that runs a function inside span(name)."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return function(*args, **kwargs)
+            with Span(name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enabled():
+    """Returns True if at least one sink is configured."""
+    return bool(_sinks)
+
+
+def add_sink(sink):
+    _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def clear_sinks():
+    """Removes every sink, disabling tracing."""
+    for sink in list(_sinks):
+        sink.close()
+    _sinks.clear()
+
+
+class JsonLinesSink:
+    """
+    Appends one JSON object per finished span to a file.
+
+    Parameters:
+    path (str): The JSON Lines file.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class HistogramSink:
+    """
+    Keeps the most recent durations of every span name in memory.
+
+    Parameters:
+    max_samples (int): Samples kept per span name.
+    """
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            samples = self._samples.get(span.name)
+            if samples is None:
+                samples = self._samples[span.name] = deque(maxlen=self.max_samples)
+            samples.append(span.duration)
+
+    def summary(self):
+        """
+        Returns:
+        dict: span name -> {count, mean_ms, p50_ms, p95_ms, p99_ms}.
+        """
+        import numpy as np
+        with self._lock:
+            snapshot = {name: np.asarray(samples) for name, samples in self._samples.items()}
+        result = {}
+        for name, samples in snapshot.items():
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+            result[name] = {
+                "count": len(samples),
+                "mean_ms": round(float(samples.mean()) * 1000, 3),
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3)
+            }
+        return result
+
+    def report(self):
+        """Prints the summary as a table."""
+        print(f"{'span':<24} {'count':>7} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+        for name, stats in self.summary().items():
+            print(f"{name:<24} {stats['count']:>7} {stats['mean_ms']:>10} {stats['p50_ms']:>10} "
+                  f"{stats['p95_ms']:>10} {stats['p99_ms']:>10}")
+
+    def close(self):
+        pass
+
+
+class PrometheusSink:
+    """
+    Aggregates span durations into Prometheus histograms (rag_span_duration_seconds{span="..."}).
+
+    Parameters:
+    buckets (tuple): Upper bounds of the histogram buckets in seconds.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def record(self, span):
+        with self._lock:
+            metric = self._metrics.get(span.name)
+            if metric is None:
+                metric = self._metrics[span.name] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0, "errors": 0}
+            for index, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    metric["buckets"][index] += 1
+            metric["sum"] += span.duration
+            metric["count"] += 1
+            if span.error:
+                metric["errors"] += 1
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = [
+            "# HELP rag_span_duration_seconds Duration of RAG request stages.",
+            "# TYPE rag_span_duration_seconds histogram"
+        ]
+        with self._lock:
+            metrics = {name: dict(metric, buckets=list(metric["buckets"])) for name, metric in self._metrics.items()}
+        for name, metric in sorted(metrics.items()):
+            for bound, count in zip(self.buckets, metric["buckets"]):
+                lines.append(f'rag_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines.append(f'rag_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {metric["count"]}')
+            lines.append(f'rag_span_duration_seconds_sum{{span="{name}"}} {metric["sum"]:.6f}')
+            lines.append(f'rag_span_duration_seconds_count{{span="{name}"}} {metric["count"]}')
+        lines.append("# HELP rag_span_errors_total RAG request stages that raised an exception.")
+        lines.append("# TYPE rag_span_errors_total counter")
+        for name, metric in sorted(metrics.items()):
+            lines.append(f'rag_span_errors_total{{span="{name}"}} {metric["errors"]}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves render() at http://host:port/metrics from a background thread."""
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📈 Serving trace metrics at http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def configure(spec):
+    """
+    Adds the sinks described by a comma separated spec string:
+    "jsonl:<path>", "histogram" and "prometheus[:<port>]".
+
+    Returns:
+    list: The sinks that were added.
+    """
+    added = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, argument = item.partition(":")
+        if kind == "jsonl":
+            added.append(add_sink(JsonLinesSink(argument or "traces.jsonl")))
+        elif kind == "histogram":
+            added.append(add_sink(HistogramSink()))
+        elif kind == "prometheus":
+            sink = add_sink(PrometheusSink())
+            if argument:
+                sink.serve(int(argument))
+            added.append(sink)
+        else:
+            raise ValueError(f"❌ Unknown trace sink '{kind}'. Use jsonl:<path>, histogram or prometheus[:<port>].")
+    return added
+
+
+def report():
+    """Prints the summary of every configured HistogramSink."""
+    for sink in _sinks:
+        if isinstance(sink, HistogramSink):
+            sink.report()
+
+
+# Configure sinks from the environment when the module is first imported.
+if os.getenv("RAG_TRACE"):
+    configure(os.getenv("RAG_TRACE"))
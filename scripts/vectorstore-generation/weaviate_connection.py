@@ -1,7 +1,10 @@
 # This file contains operations for connecting to Weaviate.
+# Set WEAVIATE_LOCAL_HOST (and optionally WEAVIATE_LOCAL_PORT / WEAVIATE_LOCAL_GRPC_PORT)
+# to connect to a local Weaviate instead of Weaviate Cloud, and OPENAI_BASE_URL to have
+# Weaviate's OpenAI vectorizer call another endpoint (e.g. local_openai_server.py).
 
 def connect_to_weaviate():
-    """Connects to Weaviate using the REST API."""
+    """Connects to Weaviate Cloud, or to a local Weaviate if WEAVIATE_LOCAL_HOST is set."""
 
     import os
     from dotenv import load_dotenv
@@ -18,6 +21,21 @@ def connect_to_weaviate():
         "X-OpenAI-Api-Key": openai_api_key,
     }
 
+    # Weaviate appends /v1/embeddings itself, so the base URL is passed without /v1.
+    openai_base_url = os.getenv("OPENAI_BASE_URL")
+    if openai_base_url:
+        headers["X-OpenAI-Baseurl"] = openai_base_url.rstrip("/").removesuffix("/v1")
+
+    # Connect to a local Weaviate (e.g. Docker) for offline load testing.
+    weaviate_local_host = os.getenv("WEAVIATE_LOCAL_HOST")
+    if weaviate_local_host:
+        return weaviate.connect_to_local(
+            host=weaviate_local_host,
+            port=int(os.getenv("WEAVIATE_LOCAL_PORT", "8080")),
+            grpc_port=int(os.getenv("WEAVIATE_LOCAL_GRPC_PORT", "50051")),
+            headers=headers
+        )
+
     # Connect to Weaviate using the REST API.
     client = weaviate.connect_to_weaviate_cloud(
         cluster_url=weaviate_rest_endpoint,
@@ -0,0 +1,203 @@
+# This file incrementally syncs Document objects to an existing Weaviate Collection.
+# It keeps a local manifest of uuid -> content hash for every uploaded object,
+# diffs it against freshly parsed documents, uploads only inserted and updated
+# objects and issues batched deletes for removed objects.
+# Re-syncing an unchanged source file makes no upload (and no vectorization) calls.
+# With --chunk, lines are merged into windows (see chunk_documents.py), and with
+# --dedupe, duplicates are collapsed before the diff (see dedupe_documents.py).
+# Example Usage:
+# python3 weaviate_sync_vectorstore.py source-files/bible.txt Jesus
+
+import os
+import json
+import time
+import hashlib
+import argparse
+from tqdm import tqdm
+from weaviate.classes.query import Filter
+from weaviate_connection import connect_to_weaviate
+from weaviate_upload_to_vectorstore import create_doc_objects, obj_iter, send_batch
+from chunk_documents import chunk_documents, DEFAULT_MAX_TOKENS
+from dedupe_documents import dedupe_documents, DEFAULT_NEAR_THRESHOLD
+
+# Manifests are local build state like the embedding caches, so they live under the git-ignored .cache/.
+MANIFEST_DIRECTORY = os.getenv("SYNC_MANIFEST_DIRECTORY", ".cache/sync-manifests")
+BATCH_SIZE = 50
+DELETE_BATCH_SIZE = 1000
+MAX_RETRIES = 5
+
+
+def object_hash(properties):
+    """Returns the sha256 of an object's properties, used to detect changed objects."""
+    encoded = json.dumps(properties, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def manifest_path(collection_name, manifest_directory=MANIFEST_DIRECTORY):
+    return os.path.join(manifest_directory, f"{collection_name}.json")
+
+
+def load_manifest(collection_name, manifest_directory=MANIFEST_DIRECTORY):
+    """Returns the saved uuid -> hash mapping for a Collection, or None if it has never been synced."""
+    path = manifest_path(collection_name, manifest_directory)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)["objects"]
+
+
+def save_manifest(collection_name, objects, manifest_directory=MANIFEST_DIRECTORY):
+    """Writes the uuid -> hash mapping for a Collection."""
+    os.makedirs(manifest_directory, exist_ok=True)
+    path = manifest_path(collection_name, manifest_directory)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"collection": collection_name, "objects": objects}, f)
+    os.replace(path + ".tmp", path)
+
+
+def remote_uuids(collection):
+    """Returns the uuids of every object currently stored in a Collection."""
+    return {str(obj.uuid) for obj in collection.iterator(include_vector=False, return_properties=[])}
+
+
+def diff_objects(objects, previous):
+    """
+    Compares freshly parsed objects against the previous manifest.
+
+    Parameters:
+    objects (dict): uuid -> object dict with "uuid", "properties" and "hash".
+    previous (dict): uuid -> hash from the last sync.
+
+    Returns:
+    tuple: (inserts, updates, deletes) where inserts and updates are lists of
+    object dicts and deletes is a list of uuids.
+    """
+    inserts = [obj for uuid, obj in objects.items() if uuid not in previous]
+    updates = [obj for uuid, obj in objects.items() if uuid in previous and previous[uuid] != obj["hash"]]
+    deletes = [uuid for uuid in previous if uuid not in objects]
+    return inserts, updates, deletes
+
+
+def upload_objects(collection, objs, batch_size=BATCH_SIZE):
+    """
+    Uploads objects in batches, retrying failures with backoff.
+    Objects with an existing uuid are replaced.
+
+    Returns:
+    set: The uuids that could not be uploaded.
+    """
+    failed_uuids = set()
+    with tqdm(total=len(objs), desc="Uploading changed documents") as pbar:
+        for i in range(0, len(objs), batch_size):
+            chunk = objs[i:i + batch_size]
+            failed = send_batch(collection, chunk, batch_size)
+            attempt = 0
+            while failed and attempt < MAX_RETRIES:
+                time.sleep(2 ** attempt)
+                failed = send_batch(collection, failed, batch_size)
+                attempt += 1
+            pbar.update(len(chunk))
+            failed_uuids.update(str(obj["uuid"]) for obj in failed)
+    return failed_uuids
+
+
+def delete_objects(collection, uuids, batch_size=DELETE_BATCH_SIZE):
+    """Deletes objects by uuid in batches. Returns the number of objects deleted."""
+    deleted = 0
+    for i in range(0, len(uuids), batch_size):
+        chunk = uuids[i:i + batch_size]
+        result = collection.data.delete_many(where=Filter.by_id().contains_any(chunk))
+        deleted += result.successful
+    return deleted
+
+
+def sync_vectorstore(file_path, collection_name, dry_run=False, manifest_directory=MANIFEST_DIRECTORY,
+                     dedupe=False, near_threshold=DEFAULT_NEAR_THRESHOLD, chunk=False, max_tokens=DEFAULT_MAX_TOKENS):
+    """
+    Syncs the Document objects parsed from file_path to a Weaviate Collection.
+
+    Parameters:
+    file_path (str): Path to file of source documents.
+    collection_name (str): The Collection in Weaviate to sync the Document objects to.
+    dry_run (bool): Only report the planned inserts, updates and deletes.
+    manifest_directory (str): Directory holding the uuid -> hash manifests.
+    dedupe (bool): Collapse exact and near-duplicate documents before syncing.
+    near_threshold (float): Minimum similarity of near duplicates, or None for exact duplicates only.
+    chunk (bool): Merge adjacent lines into windows of up to max_tokens tokens before syncing.
+    max_tokens (int): Maximum tokens per window.
+
+    Returns:
+    dict: Counts of inserted, updated, deleted and unchanged objects.
+    """
+    # 1. Generate Document objects and hash their properties.
+    documents = create_doc_objects(file_path)
+    if chunk:
+        documents = chunk_documents(documents, max_tokens)
+    if dedupe:
+        documents = dedupe_documents(documents, near_threshold)
+    objects = {}
+    for obj in obj_iter(documents):
+        obj["hash"] = object_hash(obj["properties"])
+        objects[obj["uuid"]] = obj
+
+    # 2. Connect to Weaviate and get the Collection.
+    client = connect_to_weaviate()
+    try:
+        collection = client.collections.get(collection_name)
+
+        # 3. Diff against the manifest. Without a manifest, every object is uploaded
+        # and objects that exist remotely but are no longer in the source are deleted.
+        previous = load_manifest(collection_name, manifest_directory)
+        if previous is None:
+            print(f"⚠️ No sync manifest for '{collection_name}', uploading every object...")
+            previous = {uuid: None for uuid in remote_uuids(collection)}
+        inserts, updates, deletes = diff_objects(objects, previous)
+        summary = {
+            "inserted": len(inserts),
+            "updated": len(updates),
+            "deleted": len(deletes),
+            "unchanged": len(objects) - len(inserts) - len(updates)
+        }
+        print(f"🔍 Sync plan for '{collection_name}': {summary}")
+        if dry_run:
+            return summary
+
+        # 4. Upload inserts and updates, then delete removed objects.
+        failed_uuids = set()
+        changed = inserts + updates
+        if changed:
+            failed_uuids = upload_objects(collection, [{"uuid": o["uuid"], "properties": o["properties"]} for o in changed])
+        if deletes:
+            deleted = delete_objects(collection, deletes)
+            print(f"🗑️ Deleted {deleted} removed objects.")
+
+        # 5. Save the manifest. Failed uploads keep their previous hash so they are retried next sync.
+        manifest = {uuid: obj["hash"] for uuid, obj in objects.items() if uuid not in failed_uuids}
+        manifest.update({uuid: previous[uuid] for uuid in failed_uuids if previous.get(uuid)})
+        save_manifest(collection_name, manifest, manifest_directory)
+        if failed_uuids:
+            print(f"⚠️ {len(failed_uuids)} objects failed to upload and will be retried on the next sync.")
+        summary["failed"] = len(failed_uuids)
+        return summary
+    finally:
+        client.close()
+        print("✅ Weaviate client connection closed successfully.")
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_path", type=str, help="The path to the document(s) to be processed (PDF, TXT, or CSV).")
+    parser.add_argument("collection_name", type=str, help="The name of the Collection in Weaviate.")
+    parser.add_argument("--dry_run", action="store_true", help="Only report the planned changes.")
+    parser.add_argument("--manifest_directory", type=str, default=MANIFEST_DIRECTORY, help="Directory holding sync manifests.")
+    parser.add_argument("--chunk", action="store_true", help="Merge adjacent lines into token-bounded windows before syncing.")
+    parser.add_argument("--max_tokens", type=int, default=DEFAULT_MAX_TOKENS, help="Maximum tokens per window (with --chunk).")
+    parser.add_argument("--dedupe", action="store_true", help="Collapse exact and near-duplicate documents before syncing.")
+    parser.add_argument("--near_threshold", type=float, default=DEFAULT_NEAR_THRESHOLD, help="Minimum similarity of near duplicates (with --dedupe).")
+    args = parser.parse_args()
+
+    result = sync_vectorstore(args.file_path, args.collection_name, args.dry_run, args.manifest_directory,
+                              args.dedupe, args.near_threshold, args.chunk, args.max_tokens)
+
+    print(f"✅ Sync of Weaviate Collection '{args.collection_name}' complete: {result}")
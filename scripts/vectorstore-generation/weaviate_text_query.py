@@ -1,19 +1,46 @@
 # This file allows you to query a Collection in Weaviate,
 # By asking it to search for relevant documents based on a query.
 # For a specific persona (Collection) and character (character filter).
+# If the query daemon is running (see query_daemon.py) the CLI asks it instead,
+# reusing its open Weaviate connection, otherwise it connects in-process.
 # Example Usage:
-# python3 weaviate_get_similar_docs.py "What is the capital of France?" Homer "Homer Simpson"
+# python3 weaviate_text_query.py Homer "What is the capital of France?" --character_filter "Homer Simpson"
 
 import argparse
 import json
 import warnings
-warnings.filterwarnings(
-    "ignore",
-    message="Protobuf gencode version .* is exactly one major version older.*"
-)
-import weaviate
-import weaviate.classes as wvc
-from weaviate_connection import connect_to_weaviate
+import daemon_client
+
+
+def near_text_objects(client, collection_name, query, character_filter, num_objects=5):
+    """
+    Sends a nearText similarity search to Weaviate with an open client.
+
+    Args:
+        client (WeaviateClient): An open Weaviate client.
+        collection_name (str): The name of the Weaviate collection/class.
+        query (str): The search text for similarity matching.
+        character_filter (str): The character string to filter by.
+        num_objects (int): The number of objects to return.
+
+    Returns:
+        list: The properties of each matching object.
+    """
+    import weaviate.classes as wvc
+
+    collection = client.collections.get(collection_name)
+
+    if character_filter == "None":
+        filters = None
+    else:
+        filters = wvc.query.Filter.by_property("character").equal(character_filter)
+
+    results = collection.query.near_text(
+        query = query,
+        filters = filters,
+        limit = num_objects
+    )
+    return [obj.properties for obj in results.objects]
 
 
 def weaviate_text_query(collection_name: str, query: str, character_filter: str):
@@ -30,27 +57,22 @@ def weaviate_text_query(collection_name: str, query: str, character_filter: str)
     """
     num_objects = 5
 
+    warnings.filterwarnings(
+        "ignore",
+        message="Protobuf gencode version .* is exactly one major version older.*"
+    )
+    from weaviate_connection import connect_to_weaviate
+
     client = connect_to_weaviate()
 
     try:
-        collection = client.collections.get(collection_name)
-
-        if character_filter == "None":
-            filters = None
-        else:
-            filters = wvc.query.Filter.by_property("character").equal(character_filter)
-
-        results = collection.query.near_text(
-            query = query,
-            filters = filters,
-            limit = num_objects
-        )
+        objects = near_text_objects(client, collection_name, query, character_filter, num_objects)
 
         print(f"✅ Successfully retrieved {num_objects} Document objects...")
         print(f"For user query: {query}...")
 
-        for obj in results.objects:
-            print(json.dumps(obj.properties, indent=2))
+        for properties in objects:
+            print(json.dumps(properties, indent=2))
             print("")
 
         client.close()  # Free up resources
@@ -69,9 +91,24 @@ if __name__ == "__main__":
     parser.add_argument("persona", type=str, help="The persona being simulated.")
     parser.add_argument("query", type=str, help="An example user query for similarity matching.")
     parser.add_argument("--character_filter", type=str, default="None", help="The character for filtering.")
+    parser.add_argument("--no_daemon", action="store_true", help="Always query in-process, even if the query daemon is running.")
     args = parser.parse_args()
 
-    response = weaviate_text_query(args.persona, args.query, args.character_filter)
+    result = None
+    if not args.no_daemon:
+        result = daemon_client.request("/weaviate_query", {
+            "collection_name": args.persona,
+            "query": args.query,
+            "character_filter": args.character_filter
+        })
+    if result is not None:
+        print(f"⚡ Answered by the query daemon at {daemon_client.DEFAULT_DAEMON_URL}")
+        for properties in result["objects"]:
+            print(json.dumps(properties, indent=2))
+            print("")
+        response = f"✅ Query for Collection: {args.persona}, for character: {args.character_filter} successfully completed."
+    else:
+        response = weaviate_text_query(args.persona, args.query, args.character_filter)
 
     print(response)
 
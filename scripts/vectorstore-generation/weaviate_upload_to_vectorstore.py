@@ -1,6 +1,11 @@
 # This file creates Document objects by calling generate_document_objects.py
 # and then creates a connection to Weaviate and batch uploads the Document objects.
+# Documents are parsed lazily and streamed through batching and upload, so only a
+# bounded window of objects is in memory at any time.
 # Weaviate handles the vectorization on their end.
+# With --chunk, adjacent lines are merged into token-bounded windows (see chunk_documents.py), and
+# with --dedupe, exact and near-duplicate documents are collapsed before upload (see dedupe_documents.py).
+# Both need every document in memory, so the upload is no longer streamed.
 
 import os
 import argparse
@@ -13,7 +18,15 @@ from weaviate.collections import Collection
 from weaviate_connection import connect_to_weaviate
 from generate_document_objects import (generate_docs_from_csv,
                                        generate_docs_from_pdf,
-                                       generate_docs_from_txt)
+                                       generate_docs_from_txt,
+                                       iter_docs,
+                                       ReadProgress)
+from chunk_documents import chunk_documents, DEFAULT_MAX_TOKENS
+from dedupe_documents import dedupe_documents, DEFAULT_NEAR_THRESHOLD
+
+# Define module variables.
+BATCH_START = 50
+MAX_RETRIES = 5
 
 
 def create_doc_objects(file_path):
@@ -53,8 +66,8 @@ def make_id(meta, content):
     return str(uuid5(NAMESPACE_URL, f"{meta.get('source')}:{meta.get('doc_id')}"))
 
 
-def send_batch(objs, batch_size):
-    """Send one batch, return list of failed objects (as dicts)."""
+def send_batch(collection, objs, batch_size):
+    """Send one batch to collection, return list of failed objects (as dicts)."""
     failed = []
     with collection.batch.fixed_size(batch_size=batch_size) as b:
         for o in objs:
@@ -75,7 +88,8 @@ def send_batch(objs, batch_size):
     return failed
 
 
-# Prepare an iterator of objects with deterministic UUIDs
+# Prepare an iterator of objects with deterministic UUIDs.
+# docs can be a list or a lazy generator, objects are built one at a time.
 def obj_iter(docs):
     for doc in docs:
         props = dict(doc.metadata)
@@ -86,58 +100,49 @@ def obj_iter(docs):
         }
 
 
-if __name__ == "__main__":
-    # Parse command line arguments
-    parser = argparse.ArgumentParser()
-    parser.add_argument("file_path", type=str, help="The path to the document(s) to be processed (PDF, TXT, or CSV).")
-    parser.add_argument("collection_name", type=str, help="The name of the Collection in Weaviate.")
-    args = parser.parse_args()
-
-    # Define local variables.
-    BATCH_START = 50
-    MAX_RETRIES = 5
-
-    # 1. Connect to Weaviate Client.
-    print("Connecting to Weaviate client...")
-    try:
-        client = connect_to_weaviate()
-        print("✅ Successfully connected to Weaviate client...")
-    except Exception as e:
-        print(f"❌ Could not connect to Weaviate Client. Exception error: {e}")
-
-    # 2. Generate a Collection object for Document objects to be uploaded to.
-    try:
-        collection = client.collections.get(args.collection_name)
-        print(f"✅ Collection {args.collection_name} exists, proceeding with batch upload...")
-    except Exception as e:
-        print(f"❌ Collection does not exist. Please create Collection first. Error: {e}")
+def upload_documents(collection, documents, progress=None, batch_start=BATCH_START, max_retries=MAX_RETRIES):
+    """
+    Streams Document objects into a Weaviate Collection in batches.
+    Only one batch (plus any objects being retried) is held in memory at a time,
+    so documents can be a lazy generator over a source file larger than RAM.
 
-    # 3. Generate Document objects to be uploaded.
-    try:
-        documents = create_doc_objects(args.file_path)
-        total_docs = len(documents)  # if streaming, compute/estimate total upfront or omit total
-        print(f"✅ {total_docs} Document objects generated...")
-    except Exception as e:
-        print(f"❌ Unable to generate Document objects from {args.file_path}. Aborting process. Error: {e}")
+    Parameters:
+    collection (Collection): The Weaviate Collection to upload to.
+    documents (iterable): Document objects, e.g. from generate_document_objects.iter_docs().
+    progress (ReadProgress): Optional, when given the progress bar shows bytes of the source file read.
+    batch_start (int): Initial batch size, halved (down to 10) while retries keep failing.
+    max_retries (int): Retry attempts for failed objects before they are skipped.
 
-    # 4. Batch upload the Document objects with unique ids (uuid).
-    batch_size = BATCH_START
+    Returns:
+    int: The number of objects uploaded successfully.
+    """
+    batch_size = batch_start
     buffer = []
     sent = 0
 
-    print(f"📥 Uploading {total_docs} to Weaviate in batches of {BATCH_START}...")
-    with tqdm(total=total_docs, desc="Uploading documents") as pbar:
+    if progress is not None:
+        pbar = tqdm(total=progress.total_bytes, unit="B", unit_scale=True, desc="Uploading documents")
+    else:
+        pbar = tqdm(desc="Uploading documents", unit="doc")
+
+    def update_progress(uploaded):
+        if progress is not None:
+            pbar.update(progress.bytes_read - pbar.n)
+        else:
+            pbar.update(uploaded)
+
+    with pbar:
         for obj in obj_iter(documents):
             buffer.append(obj)
             if len(buffer) >= batch_size:
-                failed = send_batch(buffer, batch_size)
+                failed = send_batch(collection, buffer, batch_size)
                 sent += len(buffer) - len(failed)
-                pbar.update(len(buffer) - len(failed))
+                update_progress(len(buffer) - len(failed))
                 buffer = failed  # retry only what failed
 
                 # Retry loop with backoff + adaptive batch size
                 attempt = 0
-                while buffer and attempt < MAX_RETRIES:
+                while buffer and attempt < max_retries:
                     time.sleep(2 ** attempt)
                     # If we saw a big failure, try smaller batches
                     if attempt > 0 and batch_size > 10:
@@ -146,27 +151,77 @@ if __name__ == "__main__":
                     # resend buffer in chunks of current batch_size
                     for i in range(0, len(buffer), batch_size):
                         chunk = buffer[i:i+batch_size]
-                        failed += send_batch(chunk, batch_size)
-                        pbar.update(len(chunk) - len(failed))  # update only successes in this chunk
+                        chunk_failed = send_batch(collection, chunk, batch_size)
+                        failed += chunk_failed
+                        update_progress(len(chunk) - len(chunk_failed))  # update only successes in this chunk
                     sent += len(buffer) - len(failed)
                     buffer = failed
                     attempt += 1
 
                 if buffer:
                     # Couldn’t clear failures after retries; log and continue
-                    print(f"⚠️ Still failing {len(buffer)} objects after {MAX_RETRIES} retries; will continue.")
+                    print(f"⚠️ Still failing {len(buffer)} objects after {max_retries} retries; will continue.")
                     buffer.clear()
 
         # Flush any tail smaller than batch_size
         if buffer:
-            _ = send_batch(buffer, batch_size)
-            pbar.update(len(buffer))
+            failed = send_batch(collection, buffer, batch_size)
+            sent += len(buffer) - len(failed)
+            update_progress(len(buffer) - len(failed))
             buffer.clear()
 
-    print("✅ Upload loop finished.")
-    print(f"✅ Upload to Weaviate Collection '{args.collection_name}' complete.")
+    return sent
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_path", type=str, help="The path to the document(s) to be processed (PDF, TXT, or CSV).")
+    parser.add_argument("collection_name", type=str, help="The name of the Collection in Weaviate.")
+    parser.add_argument("--chunk", action="store_true", help="Merge adjacent lines into token-bounded windows before upload.")
+    parser.add_argument("--max_tokens", type=int, default=DEFAULT_MAX_TOKENS, help="Maximum tokens per window (with --chunk).")
+    parser.add_argument("--dedupe", action="store_true", help="Collapse exact and near-duplicate documents before upload.")
+    parser.add_argument("--near_threshold", type=float, default=DEFAULT_NEAR_THRESHOLD, help="Minimum similarity of near duplicates (with --dedupe).")
+    args = parser.parse_args()
 
-    # 5. Close connection to Weaviate client.
-    client.close()
-    print("✅ Weaviate client connection closed successfully.")
+    # 1. Check the source file exists.
+    if not os.path.exists(args.file_path):
+        raise FileNotFoundError(f"The file at directory {args.file_path} does not exist.")
+
+    # 2. Connect to Weaviate Client.
+    print("Connecting to Weaviate client...")
+    try:
+        client = connect_to_weaviate()
+        print("✅ Successfully connected to Weaviate client...")
+    except Exception as e:
+        print(f"❌ Could not connect to Weaviate Client. Exception error: {e}")
+        raise
+
+    # 3. Generate a Collection object for Document objects to be uploaded to.
+    try:
+        collection = client.collections.get(args.collection_name)
+        print(f"✅ Collection {args.collection_name} exists, proceeding with batch upload...")
+    except Exception as e:
+        print(f"❌ Collection does not exist. Please create Collection first. Error: {e}")
+        client.close()
+        raise
+
+    # 4. Stream Document objects from the source file and batch upload them with unique ids (uuid).
+    # Documents are parsed lazily, so progress is reported in bytes of the source file read.
+    print(f">> START: Streaming Document objects from '{args.file_path}' to Weaviate in batches of {BATCH_START}...")
+    progress = ReadProgress(args.file_path)
+    documents = iter_docs(args.file_path, progress)
+    if args.chunk:
+        documents, progress = chunk_documents(documents, args.max_tokens), None
+    if args.dedupe:
+        documents, progress = dedupe_documents(documents, args.near_threshold), None
+    try:
+        sent = upload_documents(collection, documents, progress)
+    finally:
+        # 5. Close connection to Weaviate client.
+        client.close()
+        print("✅ Weaviate client connection closed successfully.")
+
+    print("✅ Upload loop finished.")
+    print(f"✅ Uploaded {sent} Document objects to Weaviate Collection '{args.collection_name}'.")
     print("--- END OF UPLOAD PROCESS ---")